@@ -0,0 +1,213 @@
+"""
+Measure the performance of the indexator end to end on a synthetic
+corpus (see synthetic_corpus.py). The corpus, its settings and all
+files produced by the indexator are kept in a separate working
+directory, so the settings and the data of the real corpus are not
+affected. The bulk actions can go to one of the following sinks:
+    null    serialize the actions and discard them (no Elasticsearch
+            needed; measures the Python side of the indexator only);
+    memory  keep the documents in memory (no Elasticsearch needed);
+    file    write them to compressed NDJSON files, like --export;
+    es      send them to the Elasticsearch server (the corpus is called
+            tsakorpus_benchmark; its indices are deleted afterwards).
+The results (tokens per second, peak memory, time spent at each stage)
+are appended to benchmark_results.jsonl in the working directory (or to
+the file given with --results) and compared to the previous run with
+the same parameters.
+Usage (from the indexator directory):
+    python3 benchmark_indexing.py --docs 500 --languages 2 --parallel --sink null --workers 2
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import subprocess
+import tempfile
+import multiprocessing
+from synthetic_corpus import add_corpus_arguments
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+CORPUS_NAME = 'tsakorpus_benchmark'
+CORPUS_PARAMETERS = ['docs', 'sentences', 'words', 'languages', 'vocabulary',
+                     'ambiguity', 'analyses', 'parallel', 'gzip', 'seed']
+
+
+def prepare_work_dir(workDir, args):
+    """
+    Generate the corpus in the working directory, unless a corpus with
+    the same parameters is already there, and copy the modules of the
+    web app needed for generating full-text HTML.
+    """
+    params = {k: getattr(args, k) for k in CORPUS_PARAMETERS}
+    fnameParams = os.path.join(workDir, 'corpus_parameters.json')
+    if os.path.exists(fnameParams):
+        with open(fnameParams, 'r', encoding='utf-8') as fIn:
+            if json.load(fIn) == params:
+                print('Using the corpus generated earlier in ' + workDir + '.')
+                return
+    for dirName in ('conf', 'corpus'):
+        shutil.rmtree(os.path.join(workDir, dirName), ignore_errors=True)
+    print('Generating the corpus in ' + workDir + '...')
+    cmd = [sys.executable, os.path.join(SRC_DIR, 'synthetic_corpus.py'), workDir, '--name', CORPUS_NAME]
+    for k in CORPUS_PARAMETERS:
+        if type(params[k]) is bool:
+            if params[k]:
+                cmd.append('--' + k)
+        else:
+            cmd += ['--' + k, str(params[k])]
+    subprocess.run(cmd, check=True)
+    webAppDir = os.path.join(SRC_DIR, '..', 'search', 'web_app')
+    workWebAppDir = os.path.join(workDir, 'search', 'web_app')
+    os.makedirs(workWebAppDir, exist_ok=True)
+    for fname in os.listdir(webAppDir):
+        if fname.endswith('.py'):
+            shutil.copy2(os.path.join(webAppDir, fname), workWebAppDir)
+    # The templates are needed for the full-text HTML
+    shutil.rmtree(os.path.join(workWebAppDir, 'templates'), ignore_errors=True)
+    shutil.copytree(os.path.join(webAppDir, 'templates'), os.path.join(workWebAppDir, 'templates'),
+                    ignore=shutil.ignore_patterns('dictionaries'))
+    with open(fnameParams, 'w', encoding='utf-8') as fOut:
+        json.dump(params, fOut)
+
+
+def run_indexator(workDir, args):
+    """
+    Index the corpus in the working directory. The telemetry report
+    is written to telemetry.json there.
+    """
+    os.makedirs(os.path.join(workDir, 'indexator'), exist_ok=True)
+    os.chdir(os.path.join(workDir, 'indexator'))
+    sys.path.insert(0, SRC_DIR)
+    import indexator
+    exportDir = None
+    if args.sink == 'file':
+        exportDir = os.path.join(workDir, 'export')
+        shutil.rmtree(exportDir, ignore_errors=True)
+    for dirName in ('index_state', os.path.join('search', 'corpus_html'),
+                    os.path.join('search', 'web_app', 'templates', 'dictionaries')):
+        shutil.rmtree(os.path.join(workDir, dirName), ignore_errors=True)
+    fnameTelemetry = os.path.join(workDir, 'telemetry.json')
+    x = indexator.Indexator(overwrite=True, workers=args.workers, fulltextWorkers=args.fulltext_workers,
+                            exportDir=exportDir, checkpointMinutes=0, telemetryFile=fnameTelemetry,
+                            sink=args.sink)
+    if args.sink == 'file':
+        x.export_corpus()
+        return
+    x.load_corpus()
+    if args.sink == 'es':
+        for index in x.versioned_indices():
+            x.loader.delete_index(index)
+
+
+def git_commit():
+    """
+    Return the current commit, with "-dirty" appended if the code
+    that was measured has uncommitted changes.
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SRC_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        if subprocess.run(['git', 'diff', '--quiet', 'HEAD', '--', '.'], cwd=SRC_DIR).returncode != 0:
+            commit += '-dirty'
+        return commit
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def summarize(report, args):
+    """
+    Return the result of the run as a dictionary.
+    """
+    info = report['info']
+    wallTime = report['total']['wall_seconds']
+    sentStages = [s for s in report['stages'] if s['stage'] == 'sentences']
+    return {
+        'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'commit': git_commit(),
+        'label': args.label,
+        'sink': args.sink,
+        'workers': args.workers,
+        'fulltext_workers': args.fulltext_workers,
+        'corpus': {k: getattr(args, k) for k in CORPUS_PARAMETERS},
+        'docs': info['docs'],
+        'tokens': info['tokens'],
+        'wall_seconds': wallTime,
+        'tokens_per_second': round(info['tokens'] / max(wallTime, 1e-6), 1),
+        'sentence_stage_tokens_per_second': sentStages[0]['tokens_per_second'] if len(sentStages) > 0 else None,
+        'peak_rss_mb': report['total']['peak_rss_mb'],
+        'children_peak_rss_mb': report['total']['children_peak_rss_mb'],
+        'stages': {s['stage']: s['wall_seconds'] for s in report['stages']}
+    }
+
+
+def same_setup(r1, r2):
+    return all(r1[k] == r2[k] for k in ('sink', 'workers', 'fulltext_workers', 'corpus'))
+
+
+def track_result(result, fnameResults):
+    """
+    Append the result to the results file and compare it with
+    the previous result obtained with the same parameters.
+    """
+    previous = None
+    if os.path.exists(fnameResults):
+        with open(fnameResults, 'r', encoding='utf-8') as fIn:
+            for line in fIn:
+                if len(line.strip()) > 0:
+                    r = json.loads(line)
+                    if same_setup(r, result):
+                        previous = r
+    with open(fnameResults, 'a', encoding='utf-8') as fOut:
+        fOut.write(json.dumps(result, ensure_ascii=False) + '\n')
+    print('{0} tokens in {1:.1f} seconds: {2:.1f} tokens/s, peak memory {3} MB '
+          '(worker processes: {4} MB).'.format(result['tokens'], result['wall_seconds'],
+                                               result['tokens_per_second'], result['peak_rss_mb'],
+                                               result['children_peak_rss_mb']))
+    if previous is None:
+        return
+    print('Previous run with the same parameters ({0}, commit {1}): {2:.1f} tokens/s, '
+          'peak memory {3} MB.'.format(previous['date'], previous['commit'],
+                                       previous['tokens_per_second'], previous['peak_rss_mb']))
+    print('Speed: {0:+.1f}%, peak memory: {1:+.1f}%.'.format(
+        (result['tokens_per_second'] / max(previous['tokens_per_second'], 1e-6) - 1) * 100,
+        (result['peak_rss_mb'] / max(previous['peak_rss_mb'], 1e-6) - 1) * 100))
+    for stage, wallTime in result['stages'].items():
+        if stage in previous['stages']:
+            print('  {0}: {1:.2f} s (was {2:.2f} s)'.format(stage, wallTime, previous['stages'][stage]))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the indexator on a synthetic corpus.')
+    add_corpus_arguments(parser)
+    parser.add_argument('--sink', choices=['null', 'memory', 'file', 'es'], default='null',
+                        help='where the bulk actions go')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of processes that read and process the documents')
+    parser.add_argument('--fulltext-workers', type=int, default=0,
+                        help='number of processes that generate the HTML for full-text view')
+    parser.add_argument('--work-dir', default=os.path.join(tempfile.gettempdir(), 'tsakorpus_benchmark'),
+                        help='directory for the corpus and the files produced by the indexator')
+    parser.add_argument('--results',
+                        help='file where the results are appended '
+                             '(by default, benchmark_results.jsonl in the working directory)')
+    parser.add_argument('--label', default='', help='description of the run stored with the results')
+    args = parser.parse_args()
+    workDir = os.path.abspath(args.work_dir)
+    if args.results is None:
+        fnameResults = os.path.join(workDir, 'benchmark_results.jsonl')
+    else:
+        fnameResults = os.path.abspath(args.results)
+    os.makedirs(workDir, exist_ok=True)
+    prepare_work_dir(workDir, args)
+    # The indexator is run in a new process, so that the memory used
+    # by this one and by the corpus generator is not counted
+    p = multiprocessing.get_context('spawn').Process(target=run_indexator, args=(workDir, args))
+    p.start()
+    p.join()
+    if p.exitcode != 0:
+        sys.exit('Indexation failed.')
+    with open(os.path.join(workDir, 'telemetry.json'), 'r', encoding='utf-8') as fIn:
+        report = json.load(fIn)
+    track_result(summarize(report, args), fnameResults)
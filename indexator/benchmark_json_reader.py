@@ -0,0 +1,147 @@
+"""
+Compare the ways the indexator can read sentences: parsing the whole
+JSON file with json.load (the default), reading the sentences one by one
+with ijson (stream_json in corpus.json) and reading the binary format
+(input_format "msgpack", see msgpack_doc_reader.py) if msgpack is
+installed. The same sentences are also converted to the tab-separated
+EANC format (prs) and read with eanc_doc_reader.py. Files of several
+sizes are generated with synthetic_corpus.py, and each of them is read
+in a separate process, so that the peak memory of each run can be
+measured.
+Usage (from the indexator directory):
+    python3 benchmark_json_reader.py --sizes 100 10000 200000
+The sizes are numbers of sentences in one document.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import multiprocessing
+from telemetry import Telemetry
+from json_doc_reader import JSONDocReader
+from synthetic_corpus import SyntheticCorpus
+from eanc_doc_reader import EANCDocReader
+from msgpack_doc_reader import msgpack, write_msgpack_doc
+
+
+def write_doc(fname, nSents, gzipped):
+    """
+    Write a document with nSents sentences, unless it already exists.
+    """
+    if os.path.exists(fname):
+        return
+    corpus = SyntheticCorpus(nDocs=1, sentsPerDoc=nSents, gzipped=gzipped, seed=nSents)
+    dirName = os.path.dirname(fname)
+    corpus.write(dirName)
+    # SyntheticCorpus puts the documents in subdirectories
+    os.replace(os.path.join(dirName, 'corpus', corpus.corpusName, 'part0',
+                            'doc0.json' + ('.gz' if gzipped else '')), fname)
+
+
+def write_prs_doc(fnameIn, fmt, fnameOut):
+    """
+    Convert a JSON document to the EANC format: one line for each
+    analysis of each word, punctuation in the punctr column of the
+    preceding word.
+    """
+    columns = ['sentno', 'wordno', 'lang', 'graph', 'word', 'indexword', 'nvars', 'nlems',
+               'nvar', 'lem', 'trans', 'trans_ru', 'lex', 'gram', 'flex', 'punctl', 'punctr', 'sent_pos']
+    reader = JSONDocReader(fmt, {'stream_json': True})
+    with open(fnameOut, 'w', encoding='utf-8') as fOut:
+        fOut.write('\t'.join('#' + c for c in columns) + '\n')
+        for iSent, (s, bLast) in enumerate(reader.get_sentences(fnameIn)):
+            words = []
+            for word in s['words']:
+                if word['wtype'] == 'punct' and len(words) > 0:
+                    words[-1][1] += word['wf'].strip()
+                elif word['wtype'] == 'word':
+                    words.append([word, ''])
+            for iWord, (word, punctr) in enumerate(words):
+                anas = word.get('ana', [])
+                for iAna, ana in enumerate(anas if len(anas) > 0 else [{}]):
+                    gram = ','.join(v for k, v in sorted(ana.items()) if k.startswith('gr.'))
+                    line = [iSent, iWord + 1, 'lang', word['wf'].lower(), word['wf'], word['wf'].lower(),
+                            len(anas), len(anas), iAna, ana.get('lex', ''), ana.get('trans', ''), '',
+                            ana.get('lex', ''), gram, '', '', punctr, 'bos' if iWord == 0 else '']
+                    fOut.write('\t'.join(str(v) for v in line) + '\n')
+
+
+def read_doc(fname, fmt, streaming, queue):
+    """
+    Read all sentences of a file and put the results in the queue.
+    """
+    from msgpack_doc_reader import MsgpackDocReader
+    telemetry = Telemetry()
+    if fmt == 'msgpack':
+        reader = MsgpackDocReader(fmt, {})
+    elif fmt == 'eanc':
+        reader = EANCDocReader()
+    else:
+        reader = JSONDocReader(fmt, {'stream_json': streaming})
+    rssStart = telemetry.read_proc_status('VmRSS')
+    telemetry.reset_peak_rss()
+    tStart = time.time()
+    nSents = 0
+    nWords = 0
+    for s, bLast in reader.get_sentences(fname):
+        nSents += 1
+        nWords += len(s['words'])
+    tSpent = time.time() - tStart
+    peak = telemetry.peak_rss()
+    queue.put({
+        'sentences': nSents,
+        'words': nWords,
+        'seconds': round(tSpent, 3),
+        'sentences_per_second': round(nSents / max(tSpent, 1e-6), 1),
+        'peak_rss_mb': Telemetry.mb(peak),
+        'peak_rss_growth_mb': Telemetry.mb(max(peak - rssStart, 0)) if None not in (peak, rssStart) else None
+    })
+
+
+def run(fname, fmt, streaming):
+    queue = multiprocessing.Queue()
+    p = multiprocessing.Process(target=read_doc, args=(fname, fmt, streaming, queue))
+    p.start()
+    result = queue.get()
+    p.join()
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare the ways of reading corpus files.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 10000, 100000],
+                        help='numbers of sentences in the test documents')
+    parser.add_argument('--gzip', action='store_true', help='use gzipped files')
+    parser.add_argument('--work-dir', default=os.path.join(tempfile.gettempdir(), 'tsakorpus_json_benchmark'),
+                        help='directory where the test documents are kept')
+    args = parser.parse_args()
+    import ijson
+    print('ijson backend:', ijson.backend)
+    fmt = 'json-gzip' if args.gzip else 'json'
+    results = []
+    for nSents in args.sizes:
+        fname = os.path.join(os.path.abspath(args.work_dir), str(nSents), 'doc.' + fmt.replace('-gzip', '.gz'))
+        write_doc(fname, nSents, args.gzip)
+        readers = [('json.load', fname, fmt, False), ('ijson', fname, fmt, True)]
+        if msgpack is not None:
+            fnameBinary = os.path.join(os.path.dirname(fname), 'doc.msgpack')
+            if not os.path.exists(fnameBinary):
+                with JSONDocReader(fmt, {}).open_file(fname) as fIn:
+                    write_msgpack_doc(fnameBinary, json.load(fIn))
+            readers.append(('msgpack', fnameBinary, 'msgpack', False))
+        fnamePrs = os.path.join(os.path.dirname(fname), 'doc.prs')
+        if not os.path.exists(fnamePrs):
+            write_prs_doc(fname, fmt, fnamePrs)
+        readers.append(('eanc', fnamePrs, 'eanc', False))
+        for readerName, fnameRead, fmtRead, streaming in readers:
+            result = run(fnameRead, fmtRead, streaming)
+            result['file_mb'] = Telemetry.mb(os.path.getsize(fnameRead))
+            result['reader'] = readerName
+            results.append(result)
+            print('{0} sentences ({1} MB), {2}: {3:.2f} s ({4:.0f} sentences/s), '
+                  'peak memory +{5} MB.'.format(nSents, result['file_mb'], result['reader'], result['seconds'],
+                                                result['sentences_per_second'], result['peak_rss_growth_mb']))
+    json.dump(results, sys.stdout, indent=1)
+    print()
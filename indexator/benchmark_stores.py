@@ -0,0 +1,90 @@
+"""
+Compare the stores that can be used for the per-document word
+frequencies: DBDict (an in-memory dictionary that spills over to
+sqlite) and PostingsStore (columnar sorted runs on disk). N pairs
+(item, dID) -> frequency are added in the order in which the
+indexator adds them (document after document), and then read
+back in the order of item IDs, like in Indexator.iterate_wfs().
+Usage (from the indexator directory):
+    python3 benchmark_stores.py 1000000 10000000
+"""
+import os
+import sys
+import time
+import random
+from indexator import DBDict
+from postings import PostingsStore, PostingsReader
+
+
+def generate_pairs(n, wordsPerDoc=200, nItems=None):
+    """
+    Generate n pairs ((item, dID), freq), document after document.
+    """
+    if nItems is None:
+        nItems = max(1000, n // 50)
+    rand = random.Random(42)
+    dID = 0
+    i = 0
+    while i < n:
+        for item in rand.sample(range(nItems), min(wordsPerDoc, n - i)):
+            yield (item, dID), rand.randint(1, 10)
+            i += 1
+        dID += 1
+
+
+def bench_dbdict(n, maxCount):
+    d = DBDict(maxCount=maxCount, dbName='bench_dbdict', pickleKeys=True)
+    t1 = time.time()
+    items = {}
+    for k, v in generate_pairs(n):
+        d[k] = v
+        # The old indexator also kept a set of document IDs for each item
+        try:
+            items[k[0]].add(k[1])
+        except KeyError:
+            items[k[0]] = {k[1]}
+    t2 = time.time()
+    s = 0
+    for item in sorted(items):
+        for dID in sorted(items[item]):
+            s += d[(item, dID)]
+    t3 = time.time()
+    if d.db is not None:
+        d.db.close()
+    if os.path.exists('bench_dbdict.sqlite'):
+        os.remove('bench_dbdict.sqlite')
+    return t2 - t1, t3 - t2, s
+
+
+def bench_postings(n, maxCount):
+    store = PostingsStore(maxCount=maxCount, dbName='bench_postings')
+    t1 = time.time()
+    nItems = 0
+    for k, v in generate_pairs(n):
+        store.add(k[0], k[1], v)
+        nItems = max(nItems, k[0] + 1)
+    t2 = time.time()
+    s = 0
+    reader = PostingsReader(store)
+    for item in range(nItems):
+        for dID, freq in reader.get(item):
+            s += freq
+    t3 = time.time()
+    store.clear()
+    return t2 - t1, t3 - t2, s
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]]
+    if len(sizes) <= 0:
+        sizes = [1000000]
+    maxCount = 100000
+    for n in sizes:
+        print('N =', n)
+        for name, f in (('PostingsStore', bench_postings), ('DBDict', bench_dbdict)):
+            tWrite, tRead, checksum = f(n, maxCount)
+            print('{0}: write {1:.1f} s, read {2:.1f} s, checksum {3}'.format(name, tWrite, tRead, checksum))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+import os
+import json
+import gzip
+import time
+from bulk_sinks import BulkSink, ActionSizes
+
+
+class BulkArchiveWriter(BulkSink):
+    """
+    Writes bulk actions to a directory instead of sending them to
+    Elasticsearch. The actions are serialized exactly as they would be
+    in a bulk request and stored as gzip-compressed NDJSON shards,
+    one subdirectory per index: <dirName>/<index>/<N>.ndjson.gz, where
+    <index> is the name of the index without the corpus name (e.g.
+    "sentences" or "sentences.2"). The index names are not stored in
+    the actions, so that the shards can be loaded into indices with
+    any names (see BulkLoader.load_shards()). The operations on indices
+    are only emulated (see BulkSink).
+    """
+    MANIFEST = 'indices.json'
+
+    def __init__(self, dirName, indexPrefix, maxShardActions=100000,
+                 maxShardBytes=256 * 1024 * 1024, compressLevel=3):
+        super().__init__()
+        self.dirName = dirName
+        self.indexPrefix = indexPrefix      # part of the index names that is not stored
+        self.maxShardActions = maxShardActions
+        self.maxShardBytes = maxShardBytes  # uncompressed size of one shard
+        self.compressLevel = compressLevel
+        self.shards = {}    # index name without the corpus name -> [open file, number of actions, bytes]
+        self.nShards = {}   # index name without the corpus name -> number of shards written
+        os.makedirs(self.dirName, exist_ok=True)
+
+    @staticmethod
+    def serialize_action(action):
+        """
+        Return the lines of the bulk request body for one action
+        as bytes, leaving out the index name.
+        """
+        action = {k: v for k, v in action.items() if k != '_index'}
+        return BulkSink.serialize_action(action)
+
+    def index_name(self, action):
+        """
+        Return the name of the index without the corpus name,
+        e.g. "sentences.2" for "corpus.sentences.2".
+        """
+        return action['_index'][len(self.indexPrefix) + 1:]
+
+    def new_shard(self, index):
+        """
+        Close the current shard for the index, if any, and open a new one.
+        """
+        self.close_shard(index)
+        dirIndex = os.path.join(self.dirName, index)
+        os.makedirs(dirIndex, exist_ok=True)
+        if index not in self.nShards:
+            self.nShards[index] = 0
+        self.nShards[index] += 1
+        fname = os.path.join(dirIndex, '{0:06d}.ndjson.gz'.format(self.nShards[index]))
+        self.shards[index] = [gzip.open(fname, 'wb', compresslevel=self.compressLevel), 0, 0]
+
+    def close_shard(self, index):
+        if index in self.shards:
+            self.shards[index][0].close()
+            del self.shards[index]
+
+    def load(self, actions, verbose=True):
+        """
+        Write all actions from an iterator to the shards. Return the
+        number of actions written.
+        """
+        tStart = time.time()
+        curSizes = {}
+        for action in actions:
+            index = self.index_name(action)
+            line = self.serialize_action(action)
+            if (index not in self.shards
+                    or self.shards[index][1] >= self.maxShardActions
+                    or self.shards[index][2] + len(line) > self.maxShardBytes):
+                self.new_shard(index)
+            shard = self.shards[index]
+            shard[0].write(line)
+            shard[1] += 1
+            shard[2] += len(line)
+            key = self.stats_key(action)
+            if key not in curSizes:
+                curSizes[key] = ActionSizes()
+            curSizes[key].add(len(line))
+        # Each load() call is a stage (e.g. sentences and documents, then words),
+        # so all shards are complete after it
+        for index in list(self.shards):
+            self.close_shard(index)
+        return self.add_stats(curSizes, time.time() - tStart, verbose=verbose)
+
+    def delete_by_query(self, index, query):
+        # The archive only contains actions to be loaded into new indices
+        raise ValueError('Documents cannot be deleted from an export.')
+
+    def write_manifest(self, corpusName, mappings):
+        """
+        Write the description of the archive: the name of the corpus
+        and the mappings and settings of each index.
+        """
+        manifest = {
+            'corpus_name': corpusName,
+            'indices': mappings,
+            'n_shards': self.nShards
+        }
+        with open(os.path.join(self.dirName, self.MANIFEST), 'w', encoding='utf-8') as fOut:
+            json.dump(manifest, fOut, ensure_ascii=False, indent=1)
+
+    @staticmethod
+    def read_manifest(dirName):
+        with open(os.path.join(dirName, BulkArchiveWriter.MANIFEST), 'r', encoding='utf-8') as fIn:
+            return json.load(fIn)
+
+    @staticmethod
+    def list_shards(dirName):
+        """
+        Return a list of (index name without the corpus name, shard filename)
+        tuples for all shards in the archive, sorted by filename.
+        """
+        shards = []
+        for index in sorted(os.listdir(dirName)):
+            dirIndex = os.path.join(dirName, index)
+            if not os.path.isdir(dirIndex):
+                continue
+            for fname in sorted(os.listdir(dirIndex)):
+                if fname.endswith('.ndjson.gz'):
+                    shards.append((index, os.path.join(dirIndex, fname)))
+        return shards
+
+    @staticmethod
+    def iterate_shard(fname):
+        """
+        Iterate over the actions stored in a shard. Each action is
+        returned as bytes containing one or two lines of NDJSON.
+        """
+        with gzip.open(fname, 'rb') as fIn:
+            for line in fIn:
+                if line.startswith(b'{"delete"'):
+                    yield line
+                else:
+                    yield line + fIn.readline()
@@ -0,0 +1,235 @@
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import elasticsearch
+from elasticsearch.client import IndicesClient
+from elasticsearch.helpers import BulkIndexError
+from bulk_sinks import BulkSink, ActionSizes
+ESVersion = elasticsearch.__version__[0]
+
+
+class BulkLoader(BulkSink):
+    """
+    Sends actions (in the format accepted by elasticsearch.helpers.bulk)
+    to Elasticsearch with bulk requests. Actions are taken from the
+    iterator and serialized in the calling thread, so any side effects
+    of the iterator stay in that thread. Requests are split by the number
+    of actions and by their size in bytes, and up to nThreads of them
+    are sent concurrently, so that Elasticsearch does not have to wait
+    while the next request is being prepared. If Elasticsearch rejects
+    a request or some of its actions because it is overloaded (HTTP 429),
+    they are sent again after a pause, which doubles with each attempt.
+    For each index, the number of actions, the number of bytes, the
+    time spent and the distribution of action sizes are collected and
+    can be printed. The duration of each request is stored in latencies.
+    The operations on indices (see BulkSink) are performed in
+    Elasticsearch.
+    """
+    def __init__(self, es, nThreads=2, chunkSize=1000, maxChunkBytes=10 * 1024 * 1024,
+                 maxRetries=5, initialBackoff=2, maxBackoff=120, requestTimeout=120):
+        super().__init__()
+        self.es = es
+        self.es_ic = IndicesClient(es)
+        self.nThreads = nThreads
+        self.chunkSize = chunkSize              # maximum number of actions in one request
+        self.maxChunkBytes = maxChunkBytes      # maximum size of one request in bytes
+        self.maxRetries = maxRetries
+        self.initialBackoff = initialBackoff    # pause before the first retry, in seconds
+        self.maxBackoff = maxBackoff
+        self.requestTimeout = requestTimeout
+        self.latencies = []     # duration of each bulk request in seconds
+
+    def send_request(self, body, index=None):
+        """
+        Send one bulk request and return the response as a dictionary.
+        If index is given, it is used for the actions that do not
+        specify their index.
+        """
+        if ESVersion == 7:
+            return self.es.bulk(body=body, index=index, request_timeout=self.requestTimeout)
+        return self.es.options(request_timeout=self.requestTimeout).bulk(operations=body, index=index).body
+
+    def send_chunk(self, chunk, index=None):
+        """
+        Send serialized actions, retrying the rejected ones. Return the
+        list of errors for the actions that could not be indexed.
+        """
+        backoff = self.initialBackoff
+        for attempt in range(self.maxRetries + 1):
+            tRequest = time.time()
+            try:
+                response = self.send_request(b''.join(chunk), index=index)
+            except Exception as err:
+                if getattr(err, 'status_code', None) != 429 or attempt >= self.maxRetries:
+                    raise
+                time.sleep(backoff)
+                backoff = min(backoff * 2, self.maxBackoff)
+                continue
+            self.latencies.append(time.time() - tRequest)
+            if not response.get('errors', False):
+                return []
+            rejected = []
+            errors = []
+            for action, item in zip(chunk, response['items']):
+                opType, result = next(iter(item.items()))
+                if 200 <= result.get('status', 500) < 300:
+                    continue
+                if result.get('status') == 429 and attempt < self.maxRetries:
+                    rejected.append(action)
+                else:
+                    errors.append({opType: result})
+            if len(rejected) <= 0:
+                return errors
+            time.sleep(backoff)
+            backoff = min(backoff * 2, self.maxBackoff)
+            chunk = rejected
+        return []
+
+    def load(self, actions, verbose=True):
+        """
+        Send all actions from an iterator to Elasticsearch. Raise
+        BulkIndexError if some of them could not be indexed.
+        """
+        tStart = time.time()
+        curSizes = {}
+        errors = []
+        inFlight = threading.BoundedSemaphore(self.nThreads * 2)
+        futures = []
+
+        def collect_finished(wait=False):
+            for future in [f for f in futures if wait or f.done()]:
+                errors.extend(future.result())
+                futures.remove(future)
+
+        with ThreadPoolExecutor(max_workers=self.nThreads) as executor:
+            chunk = []
+            chunkBytes = 0
+            for action in actions:
+                line = self.serialize_action(action)
+                key = self.stats_key(action)
+                if key not in curSizes:
+                    curSizes[key] = ActionSizes()
+                curSizes[key].add(len(line))
+                if len(chunk) > 0 and (len(chunk) >= self.chunkSize
+                                       or chunkBytes + len(line) > self.maxChunkBytes):
+                    inFlight.acquire()
+                    future = executor.submit(self.send_chunk, chunk)
+                    future.add_done_callback(lambda f: inFlight.release())
+                    futures.append(future)
+                    collect_finished()
+                    chunk = []
+                    chunkBytes = 0
+                chunk.append(line)
+                chunkBytes += len(line)
+            if len(chunk) > 0:
+                futures.append(executor.submit(self.send_chunk, chunk))
+            collect_finished(wait=True)
+
+        nActions = self.add_stats(curSizes, time.time() - tStart, verbose=verbose)
+        if len(errors) > 0:
+            raise BulkIndexError(str(len(errors)) + ' document(s) failed to index.', errors)
+        return nActions
+
+    def send_shard(self, index, fname, readShard):
+        """
+        Send all serialized actions from one shard file to an index.
+        Return a tuple (errors, sizes of the actions).
+        """
+        errors = []
+        sizes = ActionSizes()
+        chunk = []
+        chunkBytes = 0
+        for line in readShard(fname):
+            if len(chunk) > 0 and (len(chunk) >= self.chunkSize
+                                   or chunkBytes + len(line) > self.maxChunkBytes):
+                errors += self.send_chunk(chunk, index=index)
+                chunk = []
+                chunkBytes = 0
+            chunk.append(line)
+            chunkBytes += len(line)
+            sizes.add(len(line))
+        if len(chunk) > 0:
+            errors += self.send_chunk(chunk, index=index)
+        return errors, sizes
+
+    def load_shards(self, shards, readShard, verbose=True):
+        """
+        Send actions that have already been serialized and stored in shard
+        files. shards is a list of (index name, filename) tuples, readShard
+        is a function that iterates over the serialized actions in a file.
+        Up to nThreads shards are read and sent concurrently. Raise
+        BulkIndexError if some of the actions could not be indexed.
+        """
+        tStart = time.time()
+        curSizes = {}
+        errors = []
+        with ThreadPoolExecutor(max_workers=self.nThreads) as executor:
+            futures = [(index, executor.submit(self.send_shard, index, fname, readShard))
+                       for index, fname in shards]
+            for index, future in futures:
+                shardErrors, sizes = future.result()
+                errors += shardErrors
+                key = self.stats_key({'_index': index})
+                if key not in curSizes:
+                    curSizes[key] = ActionSizes()
+                curSizes[key].merge(sizes)
+        nActions = self.add_stats(curSizes, time.time() - tStart, verbose=verbose)
+        if len(errors) > 0:
+            raise BulkIndexError(str(len(errors)) + ' document(s) failed to index.', errors)
+        return nActions
+
+    def index_exists(self, index):
+        return self.es_ic.exists(index=index)
+
+    def alias_exists(self, name):
+        return self.es_ic.exists_alias(name=name)
+
+    def get_indices(self, pattern, ignoreUnavailable=False):
+        return dict(self.es_ic.get(index=pattern, ignore_unavailable=ignoreUnavailable))
+
+    def create_index(self, index, mappings, settings):
+        self.es_ic.create(index=index, mappings=mappings, settings=settings)
+
+    def delete_index(self, index):
+        self.es_ic.delete(index=index)
+
+    def get_index_settings(self, index):
+        return self.es_ic.get_settings(index=index, flat_settings=True)[index]['settings']
+
+    def put_index_settings(self, index, settings):
+        if ESVersion == 7:
+            self.es_ic.put_settings(index=index, body=settings)
+        else:
+            self.es_ic.put_settings(index=index, settings=settings)
+
+    def refresh(self, index):
+        self.es_ic.refresh(index=index)
+
+    def count_segments(self, index):
+        segments = self.es_ic.segments(index=index)
+        nSegments = 0
+        for shardCopies in segments['indices'][index]['shards'].values():
+            for shardCopy in shardCopies:
+                if shardCopy['routing']['primary']:
+                    nSegments += len(shardCopy['segments'])
+        return nSegments
+
+    def forcemerge(self, index, maxSegments):
+        if ESVersion == 7:
+            self.es_ic.forcemerge(index=index, max_num_segments=maxSegments, request_timeout=3600)
+        else:
+            self.es.options(request_timeout=3600).indices.forcemerge(index=index, max_num_segments=maxSegments)
+
+    def update_aliases(self, aliasActions):
+        if ESVersion == 7:
+            self.es_ic.update_aliases(body={'actions': aliasActions})
+        else:
+            self.es_ic.update_aliases(actions=aliasActions)
+
+    def search(self, index, query):
+        if ESVersion == 7:
+            return self.es.search(index=index, body=query, request_timeout=self.requestTimeout)
+        return self.es.options(request_timeout=self.requestTimeout).search(index=index, body=query)
+
+    def delete_by_query(self, index, query):
+        self.es.delete_by_query(index=index, body=query, conflicts='proceed', request_timeout=600)
@@ -0,0 +1,451 @@
+import re
+import abc
+import json
+import time
+import fnmatch
+
+
+class ActionSizes:
+    """
+    Distribution of the sizes of serialized bulk actions for one index:
+    their number, total size, minimum and maximum, and a histogram from
+    which approximate percentiles are calculated without storing every
+    size. Each power of two is divided into four buckets, so the
+    percentiles are accurate to 25%.
+    """
+    def __init__(self):
+        self.n = 0
+        self.nBytes = 0
+        self.min = None
+        self.max = 0
+        self.histogram = []     # bucket number -> number of actions
+
+    @staticmethod
+    def bucket(size):
+        """
+        Return the number of the histogram bucket for a size: the sizes
+        below 8 have their own buckets, the others are grouped by their
+        number of binary digits and the two digits after the leading one.
+        """
+        nBits = size.bit_length()
+        if nBits <= 3:
+            return size
+        return (nBits - 2) * 4 + ((size >> (nBits - 3)) & 3)
+
+    @staticmethod
+    def bucket_max(bucket):
+        """
+        Return the largest size that falls into a bucket.
+        """
+        if bucket < 8:
+            return bucket
+        nBits = bucket // 4 + 2
+        return ((5 + bucket % 4) << (nBits - 3)) - 1
+
+    def add(self, size):
+        self.n += 1
+        self.nBytes += size
+        if self.min is None or size < self.min:
+            self.min = size
+        if size > self.max:
+            self.max = size
+        bucket = self.bucket(size)
+        while len(self.histogram) <= bucket:
+            self.histogram.append(0)
+        self.histogram[bucket] += 1
+
+    def merge(self, other):
+        self.n += other.n
+        self.nBytes += other.nBytes
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        self.max = max(self.max, other.max)
+        while len(self.histogram) < len(other.histogram):
+            self.histogram.append(0)
+        for bucket, n in enumerate(other.histogram):
+            self.histogram[bucket] += n
+
+    def percentile(self, p):
+        """
+        Return the upper bound of the bucket where the p-th percentile
+        of the sizes is, but not more than the maximum size.
+        """
+        threshold = self.n * p / 100
+        nSeen = 0
+        for bucket, n in enumerate(self.histogram):
+            nSeen += n
+            if n > 0 and nSeen >= threshold:
+                return min(self.bucket_max(bucket), self.max)
+        return self.max
+
+    def summary(self):
+        if self.n <= 0:
+            return None
+        return {
+            'mean_bytes': round(self.nBytes / self.n, 1),
+            'min_bytes': self.min,
+            'p50_bytes': self.percentile(50),
+            'p90_bytes': self.percentile(90),
+            'p99_bytes': self.percentile(99),
+            'max_bytes': self.max
+        }
+
+
+class BulkSink(abc.ABC):
+    """
+    Base class for the objects the indexator sends its data to: bulk
+    actions (in the format accepted by elasticsearch.helpers.bulk) and
+    operations on indices, such as creating them, changing their settings
+    or switching aliases. Subclasses implement load() and delete_by_query().
+    For each index, the number of actions, the number of bytes, the time
+    spent and the distribution of action sizes are collected.
+    The operations on indices are only emulated here: the indices, their
+    settings and aliases are kept in memory, so that the entire indexation,
+    including switching the aliases, can run without Elasticsearch.
+    BulkLoader performs them in Elasticsearch instead.
+    """
+    def __init__(self):
+        self.stats = {}         # index name without the corpus name -> [number of actions, bytes, seconds]
+        self.actionSizes = {}   # index name without the corpus name -> ActionSizes
+        self.indices = {}       # index name -> {'aliases': {alias: {}}, 'mappings': ..., 'settings': flat settings}
+
+    @staticmethod
+    def serialize_action(action):
+        """
+        Return the lines of the bulk request body for one action as bytes.
+        """
+        opType = action.get('_op_type', 'index')
+        meta = {}
+        for k in ('_index', '_id'):
+            if k in action:
+                meta[k] = action[k]
+        if '_routing' in action:
+            meta['routing'] = action['_routing']
+        lines = json.dumps({opType: meta}, ensure_ascii=False, separators=(',', ':')) + '\n'
+        if opType != 'delete':
+            lines += json.dumps(action['_source'], ensure_ascii=False, separators=(',', ':')) + '\n'
+        return lines.encode('utf-8')
+
+    @staticmethod
+    def deserialize_action(lines, index=None):
+        """
+        Turn the lines of the bulk request body for one action back
+        into an action. If index is given, it is used when the action
+        does not specify its index.
+        """
+        lines = lines.decode('utf-8').split('\n')
+        opType, meta = next(iter(json.loads(lines[0]).items()))
+        action = {'_op_type': opType}
+        if index is not None:
+            action['_index'] = index
+        for k, v in meta.items():
+            if k == 'routing':
+                action['_routing'] = v
+            else:
+                action[k] = v
+        if opType != 'delete':
+            action['_source'] = json.loads(lines[1])
+        return action
+
+    rxVersion = re.compile('^v[0-9]+$')
+
+    @staticmethod
+    def stats_key(action):
+        """
+        Return the name of the index without the corpus name, the version
+        and the partition number, e.g. "sentences" for "corpus.v17.sentences.2".
+        """
+        indexParts = action['_index'].split('.')
+        if len(indexParts) > 2 and BulkSink.rxVersion.search(indexParts[1]) is not None:
+            return indexParts[2]
+        if len(indexParts) > 1:
+            return indexParts[1]
+        return indexParts[0]
+
+    @abc.abstractmethod
+    def load(self, actions, verbose=True):
+        """
+        Take all actions from an iterator. Return the number of actions.
+        """
+
+    def load_shards(self, shards, readShard, verbose=True):
+        """
+        Take actions that have already been serialized and stored in shard
+        files. shards is a list of (index name, filename) tuples, readShard
+        is a function that iterates over the serialized actions in a file.
+        """
+        return self.load((self.deserialize_action(line, index=index)
+                          for index, fname in shards
+                          for line in readShard(fname)),
+                         verbose=verbose)
+
+    def add_stats(self, curSizes, tSpent, verbose=True):
+        """
+        Add the sizes of the actions taken by one load() call to the
+        statistics and print them if needed. Return the number of actions.
+        """
+        for key, sizes in curSizes.items():
+            if key not in self.stats:
+                self.stats[key] = [0, 0, 0]
+                self.actionSizes[key] = ActionSizes()
+            self.stats[key][0] += sizes.n
+            self.stats[key][1] += sizes.nBytes
+            self.stats[key][2] += tSpent
+            self.actionSizes[key].merge(sizes)
+            if verbose:
+                self.print_stats(key, sizes.n, sizes.nBytes, tSpent)
+        return sum(sizes.n for sizes in curSizes.values())
+
+    @staticmethod
+    def print_stats(key, nActions, nBytes, tSpent):
+        tSpent = max(tSpent, 1e-6)
+        print('{0}: {1} actions, {2:.1f} MB in {3:.1f} seconds '
+              '({4:.1f} docs/s, {5:.2f} MB/s).'.format(key, nActions, nBytes / 1048576, tSpent,
+                                                       nActions / tSpent, nBytes / 1048576 / tSpent))
+
+    def print_action_sizes(self):
+        """
+        Print the distribution of action sizes for each index.
+        """
+        for key in sorted(self.actionSizes):
+            summary = self.actionSizes[key].summary()
+            if summary is None:
+                continue
+            print('{0}: actions of {1} to {2} bytes, {3:.1f} on average, '
+                  '90% at most {4}, 99% at most {5}.'.format(key, summary['min_bytes'], summary['max_bytes'],
+                                                            summary['mean_bytes'], summary['p90_bytes'],
+                                                            summary['p99_bytes']))
+
+    def matching_indices(self, pattern):
+        """
+        Return the names of the indices that match a comma-separated
+        list of names, aliases or wildcard patterns.
+        """
+        result = set()
+        for curPattern in pattern.split(','):
+            for index, indexData in self.indices.items():
+                if (fnmatch.fnmatchcase(index, curPattern)
+                        or any(fnmatch.fnmatchcase(alias, curPattern) for alias in indexData['aliases'])):
+                    result.add(index)
+        return sorted(result)
+
+    def index_exists(self, index):
+        return len(self.matching_indices(index)) > 0
+
+    def alias_exists(self, name):
+        return any(name in indexData['aliases'] for indexData in self.indices.values())
+
+    def get_indices(self, pattern, ignoreUnavailable=False):
+        """
+        Return a dictionary whose keys are the names of the indices
+        matching the pattern and whose values contain their aliases.
+        """
+        return {index: {'aliases': dict(self.indices[index]['aliases'])}
+                for index in self.matching_indices(pattern)}
+
+    def create_index(self, index, mappings, settings):
+        self.indices[index] = {'aliases': {}, 'mappings': mappings, 'settings': {}}
+
+    def delete_index(self, index):
+        if index in self.indices:
+            del self.indices[index]
+
+    def get_index_settings(self, index):
+        """
+        Return the settings of an index that were set explicitly,
+        with flat names (e.g. "index.refresh_interval").
+        """
+        return dict(self.indices[index]['settings'])
+
+    def put_index_settings(self, index, settings):
+        """
+        Change the settings of an index. The settings whose values
+        are None are restored to their defaults.
+        """
+        for k, v in settings.items():
+            if not k.startswith('index.'):
+                k = 'index.' + k
+            if v is None:
+                self.indices[index]['settings'].pop(k, None)
+            else:
+                self.indices[index]['settings'][k] = v
+
+    def refresh(self, index):
+        pass
+
+    def count_segments(self, index):
+        """
+        Return the number of segments in the primary shards of an index.
+        """
+        return 0
+
+    def forcemerge(self, index, maxSegments):
+        pass
+
+    def update_aliases(self, aliasActions):
+        """
+        Add and remove aliases and indices. aliasActions is a list in the
+        format accepted by the update aliases API of Elasticsearch.
+        """
+        for aliasAction in aliasActions:
+            opType, params = next(iter(aliasAction.items()))
+            if opType == 'add':
+                self.indices[params['index']]['aliases'][params['alias']] = {}
+            elif opType == 'remove':
+                self.indices[params['index']]['aliases'].pop(params['alias'], None)
+            elif opType == 'remove_index':
+                self.delete_index(params['index'])
+
+    def search(self, index, query):
+        return None
+
+    @abc.abstractmethod
+    def delete_by_query(self, index, query):
+        """
+        Delete the documents that match a query from the indices
+        that match a name, an alias or a wildcard pattern.
+        """
+
+
+class NullSink(BulkSink):
+    """
+    Takes bulk actions and discards them after serializing them in the
+    same way as BulkLoader does. Useful for measuring how fast the
+    indexator prepares the data, without Elasticsearch.
+    """
+    def load(self, actions, verbose=True):
+        tStart = time.time()
+        curSizes = {}
+        for action in actions:
+            line = self.serialize_action(action)
+            key = self.stats_key(action)
+            if key not in curSizes:
+                curSizes[key] = ActionSizes()
+            curSizes[key].add(len(line))
+        return self.add_stats(curSizes, time.time() - tStart, verbose=verbose)
+
+    def delete_by_query(self, index, query):
+        # Nothing has been stored, so there is nothing to delete
+        pass
+
+
+class MemorySink(BulkSink):
+    """
+    Keeps the documents in memory, as Elasticsearch would store them:
+    index name -> {document ID -> source}. The actions are serialized
+    and read back, so the documents are exactly what would be sent to
+    Elasticsearch. Intended for tests and for small corpora.
+    """
+    def __init__(self):
+        super().__init__()
+        self.docs = {}      # index name -> {document ID -> source}
+        self.nAutoIDs = 0
+
+    def write_index(self, name):
+        """
+        Return the name of the index where the documents addressed to an
+        index or an alias go. Like Elasticsearch, refuse to write through
+        an alias that points to several indices. Documents addressed to
+        an index that does not exist create it.
+        """
+        indices = self.matching_indices(name)
+        if len(indices) > 1:
+            raise ValueError('The alias ' + name + ' points to more than one index.')
+        if len(indices) == 1:
+            return indices[0]
+        return name
+
+    def load(self, actions, verbose=True):
+        tStart = time.time()
+        curSizes = {}
+        writeIndices = {}   # index or alias in the actions -> index where the documents go
+        for action in actions:
+            line = self.serialize_action(action)
+            key = self.stats_key(action)
+            if key not in curSizes:
+                curSizes[key] = ActionSizes()
+            curSizes[key].add(len(line))
+            action = self.deserialize_action(line)
+            if action['_index'] not in writeIndices:
+                writeIndices[action['_index']] = self.write_index(action['_index'])
+            index = writeIndices[action['_index']]
+            if index not in self.docs:
+                self.docs[index] = {}
+            if action['_op_type'] == 'delete':
+                self.docs[index].pop(action['_id'], None)
+                continue
+            if '_id' not in action:
+                self.nAutoIDs += 1
+                action['_id'] = 'auto' + str(self.nAutoIDs)
+            self.docs[index][action['_id']] = action['_source']
+        return self.add_stats(curSizes, time.time() - tStart, verbose=verbose)
+
+    def delete_index(self, index):
+        super().delete_index(index)
+        if index in self.docs:
+            del self.docs[index]
+
+    @staticmethod
+    def field_values(source, field):
+        """
+        Return the list of values of a field (possibly with a dotted name)
+        in a document.
+        """
+        values = [source]
+        for part in field.split('.'):
+            nextValues = []
+            for value in values:
+                if type(value) is dict and part in value:
+                    if type(value[part]) is list:
+                        nextValues += value[part]
+                    else:
+                        nextValues.append(value[part])
+            values = nextValues
+        return values
+
+    def query_matches(self, query, source):
+        """
+        Check if a document matches a query. Only the queries the indexator
+        sends are supported: match_all, term, terms and bool queries
+        combining them.
+        """
+        queryType, params = next(iter(query.items()))
+        if queryType == 'match_all':
+            return True
+        if queryType == 'term':
+            field, value = next(iter(params.items()))
+            if type(value) is dict:
+                value = value['value']
+            return value in self.field_values(source, field)
+        if queryType == 'terms':
+            field, values = next(iter(params.items()))
+            return any(value in values for value in self.field_values(source, field))
+        if queryType == 'bool':
+            for clauseType in params:
+                if clauseType not in ('must', 'filter', 'must_not'):
+                    raise ValueError('Unsupported bool clause: ' + clauseType)
+            clauses = {k: v if type(v) is list else [v] for k, v in params.items()}
+            return (all(self.query_matches(q, source)
+                        for clauseType in ('must', 'filter') for q in clauses.get(clauseType, []))
+                    and not any(self.query_matches(q, source) for q in clauses.get('must_not', [])))
+        raise ValueError('Unsupported query: ' + queryType)
+
+    def delete_by_query(self, index, query):
+        indices = set(self.matching_indices(index)) | set(fnmatch.filter(self.docs, index))
+        for curIndex in indices:
+            if curIndex not in self.docs:
+                continue
+            self.docs[curIndex] = {docID: source for docID, source in self.docs[curIndex].items()
+                                   if not self.query_matches(query['query'], source)}
+
+    def documents(self, name):
+        """
+        Return the documents of all indices that match a name, an alias
+        or a wildcard pattern, as a dictionary {document ID -> source}.
+        """
+        result = {}
+        indices = set(self.matching_indices(name)) | set(fnmatch.filter(self.docs, name))
+        for index in sorted(indices):
+            if index in self.docs:
+                result.update(self.docs[index])
+        return result
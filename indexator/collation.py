@@ -0,0 +1,103 @@
+import re
+
+
+class Collation:
+    """
+    Alphabetical order of a language, as defined by the list of letters
+    in lang_props.lexicographic_order in corpus.json. Letters can be
+    multicharacter sequences (digraphs etc.). Each string is converted
+    to a byte string sort key once: every letter becomes three bytes
+    encoding its position in the alphabet, and characters that are not
+    in the alphabet go after all letters, in the order of their code
+    points. Comparing such keys gives the same order as comparing lists
+    of (position, letter) tuples, which is how the strings were sorted
+    before, but the keys take much less memory and time to compare.
+    Without lexicographic_order, strings are sorted as they are.
+    """
+    def __init__(self, lexOrder=None):
+        self.lexOrder = lexOrder
+        self.rxChars = re.compile('.')
+        self.letterKeys = {}    # letter -> its part of the sort key
+        self.cache = {}         # lowercase string -> its sort key
+        if lexOrder is None:
+            return
+        # The last occurrence of a letter determines its position
+        letterPositions = {lexOrder[i]: i for i in range(len(lexOrder))}
+        # If a letter is listed twice, positions go beyond the number
+        # of letters, so other characters start after the last position
+        self.maxPosition = len(lexOrder)
+        self.letterKeys = {c: self.encode(i) for c, i in letterPositions.items()}
+        rxChars = '(' + '|'.join(re.escape(c.lower())
+                                 for c in sorted(lexOrder, key=lambda x: (-len(x), x))
+                                 if len(c) > 1)
+        if len(rxChars) > 1:
+            rxChars += '|'
+        rxChars += '.)'
+        self.rxChars = re.compile(rxChars)
+
+    @staticmethod
+    def encode(n):
+        return bytes((n >> 16, (n >> 8) & 255, n & 255))
+
+    def letter_key(self, c):
+        """
+        Return the part of the sort key for a letter or a character
+        that is not in the alphabet.
+        """
+        try:
+            return self.letterKeys[c]
+        except KeyError:
+            pass
+        # A multicharacter sequence can only get here if it is listed
+        # in the alphabet with capital letters
+        cKey = b''.join(self.encode(self.maxPosition + ord(ch)) for ch in c)
+        self.letterKeys[c] = cKey
+        return cKey
+
+    def key(self, s):
+        """
+        Return the sort key for a string.
+        """
+        if self.lexOrder is None:
+            return s
+        letterKeys = self.letterKeys
+        return b''.join([letterKeys[c] if c in letterKeys else self.letter_key(c)
+                         for c in self.rxChars.findall(s.lower())])
+
+    def cached_key(self, s):
+        """
+        Return the sort key for the string in lower case, which is computed
+        only once for the strings sorted with sort(..., cache=True).
+        """
+        s = s.lower()
+        if self.lexOrder is None:
+            return s
+        try:
+            return self.cache[s]
+        except KeyError:
+            sKey = self.key(s)
+            self.cache[s] = sKey
+            return sKey
+
+    def sort(self, strings, cache=False):
+        """
+        Return a sorted list of strings. If cache is True, remember
+        their sort keys for later use with cached_key().
+        """
+        if self.lexOrder is None:
+            return sorted(strings)
+        if not cache:
+            return sorted(strings, key=self.key)
+        return sorted(strings, key=self.cached_key)
+
+
+def sort_words_worker(task):
+    """
+    Sort word forms and lemmata according to one alphabetical order
+    (possibly in a worker process). task is a tuple (lexicographic
+    order or None, word forms, lemmata). Return a tuple (sorted word
+    forms, sorted lemmata, sort keys of the lemmata).
+    """
+    lexOrder, wfs, lemmata = task
+    collation = Collation(lexOrder)
+    return collation.sort(wfs), collation.sort(lemmata, cache=True), collation.cache
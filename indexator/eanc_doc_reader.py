@@ -10,62 +10,102 @@ class EANCDocReader:
         self.filesize_limit = -1
         self.meta = {}
         self.sentences = []
+        self.head = []
+
+    def read_head(self, line):
+        """
+        Reads the header (the first line of the file), which contains
+        the names of the columns.
+        """
+        # first 2 elements are cut off, bc they are about id,
+        # the last bc the information is redundant
+        self.head = line.replace('#', '').split('\t')[2:-1]
+
+    def token_lines(self, f):
+        """
+        Iterates through the lines of an open prs file that describe
+        tokens, skipping the header, the metadata and empty lines.
+        The file is read line by line.
+        """
+        for iLine, line in enumerate(f):
+            line = line.rstrip('\n')
+            if iLine == 0:
+                self.read_head(line)
+            if line.startswith('#') or line == '':
+                continue
+            yield line
+
+    def iterate_sentences(self, lines):
+        """
+        Takes an iterator of unprocessed tokens from prs corpus and
+        yields the sentences one by one. A sentence is built as soon
+        as its last line has been read, and its lines are discarded
+        after that, so that only one sentence is kept in memory.
+        """
+        sentLines = []
+        nSents = 0
+        for word in lines:
+            num, content = tuple(word.split('\t', 1))
+            if int(num) == nSents - 1:
+                sentLines.append(content)
+                continue
+            if nSents > 0:
+                yield Sentence(nSents - 1, sentLines, self.head).content
+            sentLines = [content]
+            nSents += 1
+        if nSents > 0:
+            yield Sentence(nSents - 1, sentLines, self.head).content
 
     def process_text(self):
         """
-        Reads the file with the corpus, reads header separates sentences
-        from metadata. Calls extract_sentences.
+        Reads the whole file with the corpus and stores all its
+        sentences in self.sentences. get_sentences() does the same
+        without keeping all of them in memory.
         """
         with open(self.fname, 'r', encoding='utf-8-sig') as f:
-            text = f.read().split('\n') 
-
-        # first 2 elements are cut off, bc they are about id,
-        # the last bc the information is redundant 
-        self.head = text[0].replace('#', '').split('\t')[2:-1] 
-        sentences = [li for li in text if not li.startswith('#') and li != '']
-        self.extract_sentences(sentences)
+            self.extract_sentences(self.token_lines(f))
 
     def extract_sentences(self, sentences):
         """
         Takes a list of unprocessed tokens from prs corpus
         """
-        for word in sentences:
-            num, content = tuple(word.split('\t', 1))
-            if int(num) == len(self.sentences) - 1:
-                self.sentences[int(num)] += [content]
-            else:
-                self.sentences.append([content])
-        print('head: ' + str(self.head))
-
-        for i in range(len(self.sentences)):
-            sent = Sentence(i, self.sentences[i], self.head)
-            self.sentences[i] = sent.content
+        self.sentences = list(self.iterate_sentences(sentences))
 
     def get_sentences(self, fname):
         """
         If the file is not too large, iterate through its
-        sentences.
+        sentences. The file is read line by line, and each sentence
+        is yielded as soon as all its tokens have been read.
         """
         if os.stat(fname).st_size > self.filesize_limit > 0:
             return None
         self.fname = fname
-        self.process_text()
-        for i in range(len(self.sentences)):
-            isFinal = i == len(self.sentences) - 1
-            yield self.sentences[i], isFinal
+        with open(self.fname, 'r', encoding='utf-8-sig') as f:
+            prevSentence = None
+            for sentence in self.iterate_sentences(self.token_lines(f)):
+                if prevSentence is not None:
+                    yield prevSentence, False
+                prevSentence = sentence
+            if prevSentence is not None:
+                yield prevSentence, True
 
     def get_meta(self, fname):
+        """
+        Reads the metadata lines, which follow the header. The rest
+        of the file is not read.
+        """
         self.fname = fname
-        with open(self.fname, 'r', encoding='utf-8-sig') as f:
-            text = f.read().split('\n')[1:]
         meta = {}
-        for line in text:
-            if line.startswith('#meta.'):
-                attr_name, value = tuple(line.split('\t'))
-                attr_name = attr_name.split('.')[1]
-                meta[attr_name] = value
-            else:
-                break
+        with open(self.fname, 'r', encoding='utf-8-sig') as f:
+            f.readline()
+            for line in f:
+                line = line.rstrip('\n')
+                if line.startswith('#meta.'):
+                    attr_name, value = tuple(line.split('\t'))
+                    attr_name = attr_name.split('.')[1]
+                    meta[attr_name] = value
+                else:
+                    break
         return meta
 
 
@@ -0,0 +1,219 @@
+import heapq
+from array import array
+from bisect import bisect_left
+from operator import itemgetter
+
+
+class FreqArray:
+    """
+    A table of frequencies of words or lemmata indexed by their
+    integer IDs. The frequencies are stored in a growable array of
+    unsigned integers, which takes 4 bytes per ID instead of about
+    100 bytes per entry in a dictionary. Zero frequency means that
+    there is no such item.
+    """
+    def __init__(self):
+        self.freqs = array('I')
+        self.l = 0      # number of items with non-zero frequency
+
+    def grow(self, i):
+        """
+        Make sure the array has an element with index i.
+        """
+        newSize = max(i + 1, 2 * len(self.freqs))
+        self.freqs.frombytes(bytes(self.freqs.itemsize * (newSize - len(self.freqs))))
+
+    def add(self, i, n=1):
+        """
+        Add n (which can be negative) to the frequency of the item i.
+        """
+        if i >= len(self.freqs):
+            self.grow(i)
+        prevFreq = self.freqs[i]
+        self.freqs[i] = prevFreq + n
+        if prevFreq == 0:
+            self.l += 1
+        elif prevFreq + n == 0:
+            self.l -= 1
+
+    def __len__(self):
+        return self.l
+
+    def __getitem__(self, i):
+        if i >= len(self.freqs):
+            return 0
+        return self.freqs[i]
+
+    def __setitem__(self, i, freq):
+        self.add(i, freq - self[i])
+
+    def __delitem__(self, i):
+        self[i] = 0
+
+    def __contains__(self, i):
+        return self[i] > 0
+
+    def __iter__(self):
+        for i in range(len(self.freqs)):
+            if self.freqs[i] > 0:
+                yield i
+
+    def items(self):
+        for i in range(len(self.freqs)):
+            if self.freqs[i] > 0:
+                yield i, self.freqs[i]
+
+    def values(self):
+        for freq in self.freqs:
+            if freq > 0:
+                yield freq
+
+
+class ScratchCounter:
+    """
+    A reusable buffer for counting words or lemmata in one document.
+    The counts are stored in an array indexed by integer IDs, and the
+    IDs that have been counted are listed separately, so that the
+    buffer can be cleared without reallocating or scanning the array.
+    """
+    def __init__(self):
+        self.counts = array('I')
+        self.ids = []       # IDs with non-zero counts in the order of their first occurrence
+
+    def add(self, i, n=1):
+        if i >= len(self.counts):
+            newSize = max(i + 1, 2 * len(self.counts))
+            self.counts.frombytes(bytes(self.counts.itemsize * (newSize - len(self.counts))))
+        if self.counts[i] == 0:
+            self.ids.append(i)
+        self.counts[i] += n
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, i):
+        if i >= len(self.counts):
+            return 0
+        return self.counts[i]
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def items(self):
+        for i in self.ids:
+            yield i, self.counts[i]
+
+    def clear(self):
+        for i in self.ids:
+            self.counts[i] = 0
+        self.ids = []
+
+
+class PairCounter:
+    """
+    Sparse counts for pairs of integers (row, column), where the number
+    of columns is small, e.g. frequencies of lemmata (rows) with certain
+    grammatical values (columns). Each non-zero count is stored as a key
+    (row * nColumns + column) in a sorted array and a value in a parallel
+    array, which takes 12 bytes instead of an entry in nested dictionaries.
+    New counts are appended to a buffer, which is merged into the sorted
+    arrays when it becomes as large as they are and before the counts
+    are read.
+    """
+    SORT_CHUNK = 65536
+
+    def __init__(self, nColumns, minBufferSize=100000):
+        self.nColumns = nColumns
+        self.minBufferSize = minBufferSize
+        self.keys = array('Q')      # sorted and unique
+        self.counts = array('I')
+        self.newKeys = array('Q')
+        self.newCounts = array('I')
+
+    def add(self, row, column, n=1):
+        if n <= 0:
+            return
+        self.newKeys.append(row * self.nColumns + column)
+        self.newCounts.append(n)
+        if len(self.newKeys) >= max(self.minBufferSize, len(self.keys)):
+            self.merge()
+
+    def merge(self):
+        """
+        Add the counts from the buffer to the sorted arrays.
+        """
+        if len(self.newKeys) <= 0:
+            return
+        newKeys, newCounts = self.newKeys, self.newCounts
+        self.newKeys = array('Q')
+        self.newCounts = array('I')
+        # The buffer is sorted in small chunks, starting from the end,
+        # so that it can be shrunk as the sorted runs grow
+        runs = []
+        for iStart in range((len(newKeys) - 1) // self.SORT_CHUNK * self.SORT_CHUNK, -1, -self.SORT_CHUNK):
+            chunkKeys = newKeys[iStart:]
+            chunkCounts = newCounts[iStart:]
+            del newKeys[iStart:]
+            del newCounts[iStart:]
+            order = sorted(range(len(chunkKeys)), key=chunkKeys.__getitem__)
+            runs.append(zip(array('Q', [chunkKeys[i] for i in order]),
+                            array('I', [chunkCounts[i] for i in order])))
+        keys = array('Q')
+        counts = array('I')
+        for k, n in heapq.merge(zip(self.keys, self.counts), *runs, key=itemgetter(0)):
+            if len(keys) > 0 and keys[-1] == k:
+                counts[-1] += n
+            else:
+                keys.append(k)
+                counts.append(n)
+        self.keys, self.counts = keys, counts
+
+    def row(self, row):
+        """
+        Return a list of (column, count) pairs for the row.
+        """
+        self.merge()
+        iStart = bisect_left(self.keys, row * self.nColumns)
+        iEnd = bisect_left(self.keys, (row + 1) * self.nColumns, lo=iStart)
+        return [(self.keys[i] - row * self.nColumns, self.counts[i]) for i in range(iStart, iEnd)]
+
+    def clear(self):
+        self.keys = array('Q')
+        self.counts = array('I')
+        self.newKeys = array('Q')
+        self.newCounts = array('I')
+
+
+class RowArray:
+    """
+    Rows of a fixed number of non-negative integers indexed by integer
+    IDs, e.g. the positions and ranks of words or lemmata when they
+    were last indexed. All rows are stored in one growable array of
+    unsigned integers. Rows that have not been set consist of MISSING.
+    """
+    MISSING = 0xFFFFFFFF
+
+    def __init__(self, nColumns):
+        self.nColumns = nColumns
+        self.values = array('I')
+
+    def row(self, i):
+        """
+        Return the row i as a tuple, or None if it has not been set.
+        """
+        iStart = i * self.nColumns
+        if iStart >= len(self.values) or self.values[iStart] == self.MISSING:
+            return None
+        return tuple(self.values[iStart:iStart + self.nColumns])
+
+    def __setitem__(self, i, row):
+        iStart = i * self.nColumns
+        if iStart >= len(self.values):
+            newSize = max(iStart + self.nColumns, 2 * len(self.values))
+            self.values.extend(array('I', [self.MISSING]) * (newSize - len(self.values)))
+        self.values[iStart:iStart + self.nColumns] = array('I', row)
+
+    def __delitem__(self, i):
+        iStart = i * self.nColumns
+        if iStart < len(self.values):
+            self.values[iStart:iStart + self.nColumns] = array('I', [self.MISSING]) * self.nColumns
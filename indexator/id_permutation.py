@@ -0,0 +1,60 @@
+import random
+
+
+class IDPermutation:
+    """
+    A seedable permutation of non-negative integers used for randomizing
+    sentence IDs. It is computed from the ID and the seed only, so it needs
+    no memory and gives the same result in every run that uses the same seed
+    (incremental updates, resumed runs). At the moment, it is only applied
+    in the main process (see Indexator.randomize_id()).
+    IDs are permuted within blocks of 2^31 (i.e. within the entire corpus,
+    unless it has more than two billion sentences), so that randomized IDs
+    of the first block still fit in an Elasticsearch integer field.
+    ID 0 is special and does not change.
+    Inside a block, the ID goes through a sequence of steps that are each
+    bijective modulo 2^31: adding a constant, multiplying by an odd number
+    and XORing with a right shift of itself (as in hash finalizers).
+    """
+    BLOCK_BITS = 31
+    BLOCK_MASK = (1 << BLOCK_BITS) - 1
+
+    def __init__(self, seed):
+        self.seed = seed
+        rnd = random.Random(seed)
+        self.add1 = rnd.getrandbits(self.BLOCK_BITS)
+        self.add2 = rnd.getrandbits(self.BLOCK_BITS)
+        # Multipliers must be odd to be invertible modulo 2^31
+        self.mult1 = rnd.getrandbits(self.BLOCK_BITS) | 1
+        self.mult2 = rnd.getrandbits(self.BLOCK_BITS) | 1
+
+    def permute_block(self, n):
+        """
+        Permute a number between 0 and 2^31 - 1.
+        """
+        n = (n + self.add1) & self.BLOCK_MASK
+        n ^= n >> 16
+        n = (n * self.mult1) & self.BLOCK_MASK
+        n ^= n >> 13
+        n = (n + self.add2) & self.BLOCK_MASK
+        n = (n * self.mult2) & self.BLOCK_MASK
+        n ^= n >> 16
+        return n
+
+    def permute(self, realID):
+        """
+        Return the randomized version of a non-negative ID.
+        """
+        if realID <= 0:
+            return realID
+        idStart, idEnd = realID >> self.BLOCK_BITS, realID & self.BLOCK_MASK
+        if idEnd == 0:
+            # The first ID of every block but the first one stays in place,
+            # just like 0 in the first block
+            return realID
+        # The permutation of 1..2^31-1 is obtained by skipping 0
+        # in the cycle of the full permutation (cycle walking)
+        idEnd = self.permute_block(idEnd)
+        while idEnd == 0:
+            idEnd = self.permute_block(idEnd)
+        return (idStart << self.BLOCK_BITS) + idEnd
@@ -7,8 +7,6 @@ import elasticsearch
 ESVersion = elasticsearch.__version__[0]   # Should be 7 or 9 (or use 8 at your own risk, I didn't test it)
 
 from elasticsearch import Elasticsearch
-from elasticsearch.client import IndicesClient
-from elasticsearch.helpers import bulk
 from elasticsearch.exceptions import RequestError
 import json
 import ijson
@@ -21,11 +19,24 @@ import random
 import sys
 import subprocess
 import argparse
+import multiprocessing
+import queue
+import traceback
 from prepare_data import PrepareData
 from json_doc_reader import JSONDocReader
+from msgpack_doc_reader import MsgpackDocReader
 from json2html import JSON2HTML
 from sqlitedict import SqliteDict
+from postings import PostingsStore, PostingsReader
+from bulk_loader import BulkLoader
+from bulk_archive import BulkArchiveWriter
+from bulk_sinks import NullSink, MemorySink
+from freq_arrays import FreqArray, ScratchCounter, PairCounter, RowArray
+from collation import Collation, sort_words_worker
+from id_permutation import IDPermutation
+from telemetry import Telemetry
 import pickle
+import hashlib
 
 DEBUG = False
 if DEBUG:
@@ -45,12 +56,14 @@ class DBDict:
     until it has maxCount keys. After that, it creates an sqlite database in
     the current working directory and puts all the rest there.
     No methods for sorting or deleting items are implemented. No removal of
-    no-longer-needed databases is performed.
+    no-longer-needed databases is performed. If telemetry is given, the
+    moment when the database is created is recorded there.
     """
-    def __init__(self, maxCount=1000000, dbName='tmp', pickleKeys=False):
+    def __init__(self, maxCount=1000000, dbName='tmp', pickleKeys=False, telemetry=None):
         self.d = {}
         self.maxCount = maxCount
         self.pickleKeys = pickleKeys
+        self.telemetry = telemetry
         self.db = None
         self.dbName = dbName + '.sqlite'
         self.l = 0
@@ -83,6 +96,8 @@ class DBDict:
             return
         if self.db is None:
             self.db = SqliteDict(self.dbName, outer_stack=False)
+            if self.telemetry is not None:
+                self.telemetry.event('table_moved_to_disk', table=self.dbName, items=self.maxCount)
         self.db[key] = value
 
     def __iter__(self):
@@ -116,6 +131,27 @@ class DBDict:
             return True
         return False
 
+    def commit(self):
+        """
+        Write the pending changes to the database, so that they
+        are visible to other connections.
+        """
+        if self.db is not None:
+            self.db.commit()
+
+    def reopen(self):
+        """
+        Open a new read-only connection to the database. This has to be done
+        in a forked process, where the connection of the parent process
+        cannot be used.
+        """
+        if self.db is None:
+            return
+        # The old connection must not be closed (or garbage collected),
+        # because it waits for a thread that only exists in the parent
+        self.parentDb = self.db
+        self.db = SqliteDict(self.dbName, flag='r', outer_stack=False)
+
 
 class Indexator:
     """
@@ -123,20 +159,65 @@ class Indexator:
     database.
     """
     SETTINGS_DIR = '../conf'
+    # Queries sent to the new indices before they replace the old ones
+    DEFAULT_WARMUP_QUERIES = [
+        {'index': 'sentences', 'query': {'query': {'match_all': {}}, 'size': 20}},
+        {'index': 'words', 'query': {'query': {'match_all': {}}, 'size': 20}},
+        {'index': 'docs', 'query': {'query': {'match_all': {}}, 'size': 20}}
+    ]
+    # Index settings used while the corpus is being loaded
+    BULK_LOAD_SETTINGS = {
+        'refresh_interval': '-1',
+        'number_of_replicas': 0,
+        'translog.durability': 'async',
+        'translog.flush_threshold_size': '1gb'
+    }
     MAX_MEM_DICT_SIZE = 100000
+    MAX_MEM_POSTINGS = 4000000      # number of (item, document, frequency) postings kept in memory
+    DICT_PAGE_SIZE = 1000           # maximum number of lemmata in one page of the HTML dictionary
+    DICT_DIR = '../search/web_app/templates/dictionaries'
     rxBadFileName = re.compile('[^\\w_.-]*', flags=re.DOTALL)
 
-    def __init__(self, overwrite=False):
+    def __init__(self, overwrite=False, workers=1, isWorker=False, incremental=False,
+                 bulkOptions=None, fulltextWorkers=0, maxSegments=1, warmupQueries=None,
+                 exportDir=None, checkpointMinutes=0, resume=False, telemetryFile=None, sink='es'):
         random.seed(datetime.now().timestamp())
+        self.telemetry = Telemetry()
+        self.telemetryFile = telemetryFile  # where the telemetry report is written (None = default location)
         self.fulltextDir = '../search/corpus_html'
         self.overwrite = overwrite  # whether to overwrite an existing index without asking
+        self.workers = workers      # number of processes that read and process documents
+        self.isWorker = isWorker    # whether this instance processes documents in a worker process
+        self.incremental = incremental  # whether to keep the state between runs and only index new/changed files
+        if bulkOptions is None:
+            bulkOptions = {}
+        self.bulkOptions = bulkOptions  # keyword arguments for BulkLoader
+        self.fulltextWorkers = fulltextWorkers  # number of processes that generate full-text HTML (0 = main process)
+        self.fulltextPool = None
+        self.fulltextResults = []
+        self.maxSegments = maxSegments  # number of segments each index is force-merged to after loading (0 = no merge)
+        self.querySettings = {}         # index name -> settings to restore after bulk load
+        if warmupQueries is None:
+            warmupQueries = self.DEFAULT_WARMUP_QUERIES
+        self.warmupQueries = warmupQueries  # queries sent to new indices before they replace the old ones
+        self.exportDir = exportDir          # directory where bulk actions are written instead of Elasticsearch
+        self.sinkType = sink                # where the data goes: es, null or memory (see init_sink())
+        if self.exportDir is not None:
+            self.sinkType = 'file'
+        self.checkpointInterval = checkpointMinutes * 60  # seconds between checkpoints (0 = no checkpoints)
+        self.resume = resume                # whether to continue an interrupted indexation from the last checkpoint
         with open(os.path.join(self.SETTINGS_DIR, 'corpus.json'),
                   'r', encoding='utf-8') as fSettings:
             self.settings = json.load(fSettings)
-        if not self.check_elastic_version():
+        if self.sinkType == 'es' and not self.check_elastic_version():
             return
         self.j2h = JSON2HTML(settings=self.settings)
         self.name = self.settings['corpus_name']
+        # Names of all indices start with this prefix. When the corpus is
+        # indexed from scratch, it is "<corpus_name>.v<N>", and the indices
+        # are available under their usual names through aliases after
+        # indexing is complete. Otherwise, it is the corpus name.
+        self.indexPrefix = self.name
         self.languages = self.settings['languages']
         if len(self.languages) <= 0:
             self.languages = [self.name]
@@ -152,6 +233,15 @@ class Indexator:
         if self.input_format in ['json', 'json-gzip']:
             self.iterSent = JSONDocReader(format=self.input_format,
                                           settings=self.settings)
+        elif self.input_format == 'msgpack':
+            self.iterSent = MsgpackDocReader(format=self.input_format,
+                                             settings=self.settings)
+        if self.iterSent is not None:
+            # The HTML generator uses the same reader, so that
+            # each file is parsed only once. It works with copies
+            # of the sentences, which are then indexed unchanged.
+            self.j2h.iterSent = self.iterSent
+            self.j2h.copySentences = True
 
         # Make sure only commonly used word fields and those listed
         # in corpus.json get into the words index.
@@ -189,12 +279,78 @@ class Indexator:
         self.goodWordFields += ['gr.' + v for lang in categories
                                 for v in categories[lang].values()]
         self.goodWordFields = set(self.goodWordFields)
-        self.characterRegexes = {}
+        self.collations = {}    # lexicographic order (tuple) or None -> Collation
+        self.sortedPositions = None     # (lexicographic order, word form -> position, lemma -> position)
+        self.freqRanks = None           # for each language, frequency ranks and quantiles (see calculate_freq_ranks())
+        self.wordFieldCache = {}    # field name -> whether it can get to the words index
 
         self.pd = PrepareData()
 
-        # Initialize Elasticsearch connection
+        # Initialize the Elasticsearch connection or another sink
         self.es = None
+        self.loader = None
+        if not self.isWorker:
+            self.init_sink()
+
+        self.idPermutation = IDPermutation(random.getrandbits(64))     # randomizes sentence IDs
+        self.init_word_tables()
+        self.lexProfiles = {}    # lang -> PairCounter: (lemma's integer ID, column) -> frequency
+        self.lexProfileColumns = {}     # lang -> {subcorpus -> {category -> {value -> column}}}
+        self.lexProfileColumnNames = {}     # lang -> list of (subcorpus, category, value) for each column
+        self.initialize_lex_profiles()
+        self.generateDictionary = ('generate_dictionary' in self.settings
+                                   and self.settings['generate_dictionary'])
+        self.dictFreqs = {}      # lemma's integer ID -> its frequency in the dictionary of the current language
+        self.dictLexemes = {}    # lemma's integer ID -> (lemma, grdic, additional fields) for the dictionary
+        self.wfs = set()           # set of word forms (for sorting)
+        self.lemmata = {''}        # set of lemmata (for sorting)
+        self.sID = 0          # current sentence ID for each language
+        self.dID = 0          # current document ID
+        self.wID = 0          # current word ID
+        self.numWords = 0     # number of words in current document
+        self.numSents = 0     # number of sentences in current document
+        self.numWordsLang = [0] * len(self.languages)    # number of words in each language in current document
+        self.numSentsLang = [0] * len(self.languages)    # number of sentences in each language in current document
+        self.totalNumWords = 0
+        self.sentID = 0
+        self.wordsByPartition = {}
+        if 'partitions' in self.settings and self.settings['partitions'] > 0:
+            self.wordsByPartition = {l: {p: 0 for p in range(int(self.settings['partitions']))}
+                                     for l in range(len(self.languages))}
+
+        self.filenames = []   # List of tuples (filename, filesize)
+        self.corpusSizeInBytes = 0
+
+        # Data used in incremental mode
+        self.stateDir = os.path.join('../index_state', self.name)
+        if self.sinkType in ('null', 'memory'):
+            # The data is not stored, so the state and the checkpoints
+            # must not be mixed with those of the real indexations
+            self.stateDir += '.' + self.sinkType
+        self.docStates = {}      # filename -> (size, modification time) of indexed files
+        # Positions in the sorted lists and frequency ranks of words (wf_order, l_order,
+        # rank_true, lemma_rank_true) and lemmata (l_order, rank_true) when they were last indexed
+        self.indexedWords = RowArray(4)
+        self.indexedLemmata = RowArray(2)
+        self.indexedQuantiles = None    # for each language, frequency quantiles of words and lemmata in the previous run
+        self.removedItems = [set() for i in range(len(self.languages))]  # IDs of words/lemmata no longer in the corpus
+        self.fDocLog = None      # file where per-document word frequencies are stored
+        self.touchedItems = set()  # IDs of words/lemmata that occur in added or removed documents
+
+        # Data used for checkpoints
+        self.processedFiles = set()     # files whose sentences and metadata have been sent
+        self.tLastCheckpoint = time.time()
+        self.checkpointDue = False
+        if self.isWorker:
+            return
+        for fname in os.listdir('.'):
+            if fname.lower().endswith(('.sqlite', '.sqlite-journal', '.postings')):
+                os.remove(fname)
+
+    def connect_elastic(self):
+        """
+        Initialize Elasticsearch connection.
+        """
         if ESVersion == 9:
             if 'elastic_pwd' not in self.settings:
                 if 'ELASTIC_PASSWORD' in os.environ:
@@ -228,63 +384,24 @@ class Indexator:
                     self.es = Elasticsearch("https://localhost:9200", request_timeout=60,
                                             basic_auth=(self.settings['elastic_user'], self.settings['elastic_pwd']),
                                             ca_certs=self.settings['elastic_cacert'])
-        self.es_ic = IndicesClient(self.es)
-
-        self.shuffled_ids = [i for i in range(1, 1000000)]
-        random.shuffle(self.shuffled_ids)
-        self.shuffled_ids.insert(0, 0)    # id=0 is special and should not change
-        self.tmpWordIDs = [DBDict(maxCount=math.ceil(self.MAX_MEM_DICT_SIZE / len(self.languages)),
-                                  dbName='tmpWordID_' + str(i))
-                           for i in range(len(self.languages))]       # word as JSON -> its integer ID
-        self.tmpLemmaIDs = [DBDict(maxCount=math.ceil(self.MAX_MEM_DICT_SIZE / len(self.languages)),
-                                   dbName='tmpLemmaID_' + str(i))
-                            for i in range(len(self.languages))]      # lemma as string -> its integer ID
 
-        self.tmpID2lemma = [DBDict(maxCount=math.ceil(self.MAX_MEM_DICT_SIZE / len(self.languages)),
-                                   dbName='tmpID2lemma_' + str(i))
-                            for i in range(len(self.languages))]      # lemma's integer ID -> lemma as string
-
-        # Apart from the two dictionaries above, words and lemmata
-        # have string IDs starting with 'w' or 'l' followed by an integer
-        self.word2lemma = [{} for i in range(len(self.languages))]    # word/lemma ID -> ID of its lemma (or -1, if none)
-        self.wordFreqs = [{} for i in range(len(self.languages))]     # word/lemma ID -> its frequency
-        self.wordFreqsSub = [{subcorpus: {} for subcorpus in self.subcorpora}
-                             for i in range(len(self.languages))]     # word/lemma ID -> its frequency in a subcorpus
-        self.wordSFreqs = [{} for i in range(len(self.languages))]    # word/lemma ID -> its number of sentences
-        self.wordDocFreqs = [DBDict(maxCount=math.ceil(self.MAX_MEM_DICT_SIZE / len(self.languages)),
-                                    dbName='wordDocFreqs_' + str(i), pickleKeys=True)
-                             for i in range(len(self.languages))]        # (word/lemma ID, dID) -> word frequency in the document
-        self.curWordDocFreqs = [{} for i in range(len(self.languages))]  # word/lemma ID -> word frequency in current document
-        self.wordDIDs = [DBDict(maxCount=math.ceil(self.MAX_MEM_DICT_SIZE / len(self.languages)),
-                                dbName='wordDIDs_' + str(i))
-                         for i in range(len(self.languages))]        # word/lemma ID -> set of document IDs
-        # self.wordSIDs = [{} for i in range(len(self.languages))]       # word's ID -> set of sentence IDs
-        # self.wordDIDs = [{} for i in range(len(self.languages))]         # word/lemma ID -> set of document IDs
-        self.lexProfiles = {}    # {lang -> {category -> {value -> {lemma ID -> frequency}}}}
-        self.initialize_lex_profiles()
-        self.wfs = set()           # set of word forms (for sorting)
-        self.lemmata = {''}        # set of lemmata (for sorting)
-        self.sID = 0          # current sentence ID for each language
-        self.dID = 0          # current document ID
-        self.wID = 0          # current word ID
-        self.wordFreqID = 0   # current word_freq ID for word/document frequencies
-        self.lemmaFreqID = 0  # current word_freq ID for lemma/document frequencies
-        self.numWords = 0     # number of words in current document
-        self.numSents = 0     # number of sentences in current document
-        self.numWordsLang = [0] * len(self.languages)    # number of words in each language in current document
-        self.numSentsLang = [0] * len(self.languages)    # number of sentences in each language in current document
-        self.totalNumWords = 0
-        self.sentID = 0
-        self.wordsByPartition = {}
-        if 'partitions' in self.settings and self.settings['partitions'] > 0:
-            self.wordsByPartition = {l: {p: 0 for p in range(int(self.settings['partitions']))}
-                                     for l in range(len(self.languages))}
-
-        self.filenames = []   # List of tuples (filename, filesize)
-        self.corpusSizeInBytes = 0
-        for fname in os.listdir('.'):
-            if fname.lower().endswith(('.sqlite', '.sqlite-journal')):
-                os.remove(fname)
+    def init_sink(self):
+        """
+        Create the object all data and operations on indices go to:
+        Elasticsearch (es), compressed files in the export directory
+        (file), nowhere (null, for measuring the speed of the indexator
+        itself) or memory (memory, for tests).
+        """
+        if self.sinkType == 'file':
+            self.loader = BulkArchiveWriter(self.exportDir, self.name)
+        elif self.sinkType == 'null':
+            self.loader = NullSink()
+        elif self.sinkType == 'memory':
+            self.loader = MemorySink()
+        else:
+            self.connect_elastic()
+            self.loader = BulkLoader(self.es, **self.bulkOptions)
+        self.telemetry.loader = self.loader
 
     def check_elastic_version(self):
         """
@@ -311,56 +428,197 @@ class Indexator:
                 self.settings['elastic_user'] = 'elastic'
         return True
 
+    def new_tmp_dict(self, dbName, pickleKeys=False):
+        """
+        Return a dictionary for storing (potentially large) temporary data.
+        In the main process, this is a DBDict that can be dumped to disk.
+        Worker processes only keep the data for one document at a time,
+        so they use simple dictionaries.
+        """
+        if self.isWorker:
+            return {}
+        return DBDict(maxCount=math.ceil(self.MAX_MEM_DICT_SIZE / len(self.languages)),
+                      dbName=dbName, pickleKeys=pickleKeys, telemetry=self.telemetry)
+
+    def new_postings_store(self, dbName):
+        """
+        Return a store for postings lists (document IDs and frequencies)
+        of words or lemmata. These are only needed in the order of item
+        IDs when the words are indexed, so they are written to disk
+        in compact sorted runs rather than to a database with random access.
+        """
+        return PostingsStore(maxCount=math.ceil(self.MAX_MEM_POSTINGS / (2 * len(self.languages))),
+                             dbName=dbName)
+
+    def init_word_tables(self):
+        """
+        Create empty tables where word/lemma IDs and frequencies
+        are collected during sentence indexing.
+        """
+        self.tmpWordIDs = [self.new_tmp_dict('tmpWordID_' + str(i))
+                           for i in range(len(self.languages))]       # word as JSON -> its integer ID
+        self.tmpLemmaIDs = [self.new_tmp_dict('tmpLemmaID_' + str(i))
+                            for i in range(len(self.languages))]      # lemma as string -> its integer ID
+
+        self.tmpID2lemma = [self.new_tmp_dict('tmpID2lemma_' + str(i))
+                            for i in range(len(self.languages))]      # lemma's integer ID -> lemma as string
+        self.nWordIDs = 0       # number of word IDs in all languages
+        self.nLemmaIDs = 0      # number of lemma IDs in all languages
+        self.wordCache = [{} for i in range(len(self.languages))]    # word signature -> result of assign_word_ids()
+
+        # Apart from the two dictionaries above, words and lemmata
+        # have string IDs starting with 'w' or 'l' followed by an integer
+        self.word2lemma = [{} for i in range(len(self.languages))]    # word/lemma ID -> ID of its lemma (or -1, if none)
+        # Frequency tables are indexed by integer IDs; lemma 0 stands for
+        # words without analyses
+        self.wordFreqs = [FreqArray() for i in range(len(self.languages))]     # word's integer ID -> its frequency
+        self.lemmaFreqs = [FreqArray() for i in range(len(self.languages))]    # lemma's integer ID -> its frequency
+        self.wordFreqsSub = [{subcorpus: FreqArray() for subcorpus in self.subcorpora}
+                             for i in range(len(self.languages))]     # word's integer ID -> its frequency in a subcorpus
+        self.lemmaFreqsSub = [{subcorpus: FreqArray() for subcorpus in self.subcorpora}
+                              for i in range(len(self.languages))]    # lemma's integer ID -> its frequency in a subcorpus
+        self.wordSFreqs = [FreqArray() for i in range(len(self.languages))]    # word's integer ID -> its number of sentences
+        self.lemmaSFreqs = [FreqArray() for i in range(len(self.languages))]   # lemma's integer ID -> its number of sentences
+        self.wordPostings = [self.new_postings_store('wordPostings_' + str(i))
+                             for i in range(len(self.languages))]        # word's integer ID -> dIDs and word frequencies in these documents
+        self.lemmaPostings = [self.new_postings_store('lemmaPostings_' + str(i))
+                              for i in range(len(self.languages))]       # lemma's integer ID -> dIDs and lemma frequencies in these documents
+        # Scratch buffers for the current document, reused for all documents
+        self.curWordDocFreqs = [ScratchCounter() for i in range(len(self.languages))]    # word's integer ID -> its frequency in current document
+        self.curWordDocSFreqs = [ScratchCounter() for i in range(len(self.languages))]   # word's integer ID -> number of sentences in current document
+        self.curLemmaDocFreqs = [ScratchCounter() for i in range(len(self.languages))]   # lemma's integer ID -> its frequency in current document
+        self.curLemmaDocSFreqs = [ScratchCounter() for i in range(len(self.languages))]  # lemma's integer ID -> number of sentences in current document
+        # self.wordSIDs = [{} for i in range(len(self.languages))]       # word's ID -> set of sentence IDs
+
     def initialize_lex_profiles(self):
+        """
+        For each language with lexical profile categories, number all
+        (subcorpus, category, value) combinations and create a counter
+        for their frequencies with each lemma.
+        """
         for lang in self.languages:
-            self.lexProfiles[lang] = {}
-            if lang in self.settings['lang_props'] and 'lex_profile_categories' in self.settings['lang_props'][lang]:
-                for sub in [s for s in self.subcorpora.keys()] + ['_all']:
-                    self.lexProfiles[lang][sub] = {}
-                    for c in self.settings['lang_props'][lang]['lex_profile_categories']:
-                        self.lexProfiles[lang][sub][c] = {'_other': {}}
-                        for v in self.settings['lang_props'][lang]['lex_profile_categories'][c]:
-                            self.lexProfiles[lang][sub][c][v] = {}  # lemma ID -> frequency
+            if not (lang in self.settings['lang_props']
+                    and 'lex_profile_categories' in self.settings['lang_props'][lang]):
+                continue
+            columns = {}
+            columnNames = []
+            for sub in [s for s in self.subcorpora.keys()] + ['_all']:
+                columns[sub] = {}
+                for c in self.settings['lang_props'][lang]['lex_profile_categories']:
+                    columns[sub][c] = {}
+                    for v in ['_other'] + self.settings['lang_props'][lang]['lex_profile_categories'][c]:
+                        if v not in columns[sub][c]:
+                            columns[sub][c][v] = len(columnNames)
+                            columnNames.append((sub, c, v))
+            self.lexProfileColumns[lang] = columns
+            self.lexProfileColumnNames[lang] = columnNames
+            self.lexProfiles[lang] = PairCounter(len(columnNames))
 
     def delete_indices(self):
         """
-        If there already exist indices with the same names,
-        ask the user if they want to overwrite them. If they
-        say yes, remove the indices and return True. Otherwise,
-        return False.
+        If there already exists a corpus with the same name,
+        ask the user if they want to overwrite it. If they
+        say no, return False. Otherwise, remove the versioned
+        indices left by unfinished indexations and return True.
+        The indices that are currently in use are not deleted
+        here: the corpus is indexed into new versioned indices,
+        and the old ones are only deleted after the aliases have
+        been switched to the new ones (see switch_aliases()).
         """
         if not self.overwrite:
-            if (self.es_ic.exists(index=self.name + '.docs')
-                    or self.es_ic.exists(index=self.name + '.words')
-                    or self.es_ic.exists(index=self.name + '.sentences')):
+            if (self.loader.index_exists(self.name + '.docs')
+                    or self.loader.index_exists(self.name + '.words')
+                    or self.loader.index_exists(self.name + '.sentences')):
                 print('It seems that a corpus named "' + self.name + '" already exists. '
                       + 'Do you want to overwrite it? [y/n]')
                 reply = input()
                 if reply.lower() != 'y':
                     print('Indexation aborted.')
                     return False
-        if self.es_ic.exists(index=self.name + '.docs'):
-            self.es_ic.delete(index=self.name + '.docs')
-        if self.es_ic.exists(index=self.name + '.words'):
-            self.es_ic.delete(index=self.name + '.words')
-        if self.es_ic.exists(index=self.name + '.lex_profiles'):
-            self.es_ic.delete(index=self.name + '.lex_profiles')
-        if self.es_ic.exists(index=self.name + '.sentences*'):
-            if self.es_ic.exists(index=self.name + '.sentences'):
-                self.es_ic.delete(index=self.name + '.sentences')
-            nPartitions = 100
-            if 'partitions' in self.settings and int(self.settings['partitions']) > 1:
-                nPartitions = max(100, int(self.settings['partitions']))
-            for i in range(nPartitions):
-                if self.es_ic.exists(index=self.name + '.sentences.' + str(i)):
-                    self.es_ic.delete(index=self.name + '.sentences.' + str(i))
-                else:
-                    break
-        # Obsolete index word_freq can be present in pre-2019 corpora
-        if self.es_ic.exists(index=self.name + '.word_freqs'):
-            self.es_ic.delete(index=self.name + '.word_freqs')
+        for index, indexData in self.versioned_indices().items():
+            if len(indexData['aliases']) <= 0:
+                print('Deleting ' + index + ' left by an unfinished indexation.')
+                self.loader.delete_index(index)
         return True
 
+    def versioned_indices(self):
+        """
+        Return a dictionary with all existing versioned indices of the corpus
+        ("<corpus_name>.v<N>.*"). The values contain their aliases.
+        """
+        return self.loader.get_indices(self.name + '.v*')
+
+    def new_index_version(self):
+        """
+        Choose a prefix for the names of new versioned indices, e.g. "corpus.v17",
+        where 17 is greater than the numbers of all existing versions.
+        """
+        rxVersion = re.compile('^' + re.escape(self.name) + '\\.v([0-9]+)\\.')
+        version = 0
+        for index in self.versioned_indices():
+            m = rxVersion.search(index)
+            if m is not None:
+                version = max(version, int(m.group(1)))
+        return self.name + '.v' + str(version + 1)
+
+    def alias_name(self, index):
+        """
+        Return the name under which a versioned index is available
+        after indexing, e.g. "corpus.sentences" for "corpus.v17.sentences".
+        """
+        return self.name + index[len(self.indexPrefix):]
+
+    def warm_up(self):
+        """
+        Send the warm-up queries to the new indices, so that their
+        caches are filled before they start serving real queries.
+        """
+        if self.indexPrefix == self.name or len(self.warmupQueries) <= 0:
+            return
+        print('Warming up the new indices...')
+        t1 = time.time()
+        for query in self.warmupQueries:
+            index = self.indexPrefix + '.' + query['index']
+            if query['index'] == 'sentences':
+                index += '*'    # all partitions
+            self.loader.search(index, query['query'])
+        print(len(self.warmupQueries), 'warm-up queries took', round(time.time() - t1, 1), 'seconds.')
+
+    def switch_aliases(self):
+        """
+        Atomically point the aliases used by the search engine
+        ("<corpus_name>.sentences" etc.) to the newly built indices
+        and delete the indices that were used before.
+        """
+        if self.indexPrefix == self.name:
+            return
+        aliasActions = []
+        oldIndices = set()
+        for index, indexData in self.versioned_indices().items():
+            if index.startswith(self.indexPrefix + '.'):
+                continue
+            oldIndices.add(index)
+            for alias in indexData['aliases']:
+                aliasActions.append({'remove': {'index': index, 'alias': alias}})
+        for index in self.corpus_indices():
+            alias = self.alias_name(index)
+            if self.loader.index_exists(alias) and not self.loader.alias_exists(alias):
+                # A concrete index created before versioned indices were introduced
+                aliasActions.append({'remove_index': {'index': alias}})
+            aliasActions.append({'add': {'index': index, 'alias': alias}})
+        self.loader.update_aliases(aliasActions)
+        print('The aliases now point to ' + self.indexPrefix + '.*')
+        # Old sentence partitions without aliases and obsolete indices
+        # (word_freqs can be present in pre-2019 corpora)
+        for index in self.loader.get_indices(self.name + '.sentences*,'
+                                             + self.name + '.lex_profiles,'
+                                             + self.name + '.word_freqs',
+                                             ignoreUnavailable=True):
+            if not index.startswith(self.name + '.v'):
+                oldIndices.add(index)
+        for index in sorted(oldIndices):
+            self.loader.delete_index(index)
+
     def create_indices(self):
         """
         Create empty elasticsearch indices for corpus data, using
@@ -371,32 +629,101 @@ class Indexator:
         self.docMapping = self.pd.generate_docs_mapping()
         self.sentMapping = self.pd.generate_sentences_mapping(self.sentWordMapping, self.docMapping,
                                                               corpusSizeInBytes=self.corpusSizeInBytes)
+        for index, mapping in self.index_mappings().items():
+            self.loader.create_index(self.indexPrefix + '.' + index,
+                                     mappings=mapping['mappings'],
+                                     settings=mapping['settings'])
 
-        self.es_ic.create(index=self.name + '.docs',
-                          mappings=self.docMapping['mappings'],
-                          settings=self.docMapping['settings'])
-        self.es_ic.create(index=self.name + '.words',
-                          mappings=self.wordMapping['mappings'],
-                          settings=self.wordMapping['settings'])
+    def index_mappings(self):
+        """
+        Return a dictionary with the mappings and settings of all indices,
+        whose keys are index names without the prefix (e.g. "sentences.2").
+        """
+        mappings = {
+            'docs': self.docMapping,
+            'words': self.wordMapping
+        }
         if 'partitions' in self.settings and self.settings['partitions'] > 1:
             for i in range(int(self.settings['partitions'])):
-                self.es_ic.create(index=self.name + '.sentences.' + str(i),
-                                  body=self.sentMapping)
+                mappings['sentences.' + str(i)] = self.sentMapping
         else:
-            self.es_ic.create(index=self.name + '.sentences',
-                          mappings=self.sentMapping['mappings'],
-                          settings=self.sentMapping['settings'])
+            mappings['sentences'] = self.sentMapping
+        return mappings
+
+    def corpus_indices(self):
+        """
+        Return the names of all indices where the corpus is loaded.
+        """
+        indices = [self.indexPrefix + '.docs', self.indexPrefix + '.words']
+        if 'partitions' in self.settings and self.settings['partitions'] > 1:
+            for i in range(int(self.settings['partitions'])):
+                indices.append(self.indexPrefix + '.sentences.' + str(i))
+        else:
+            indices.append(self.indexPrefix + '.sentences')
+        return indices
+
+    def start_bulk_load(self):
+        """
+        Switch the newly created indices to settings suitable for bulk
+        loading: no refresh, no replicas, and the translog is flushed
+        asynchronously and less often. Remember the query-time settings,
+        so that they can be restored by finish_bulk_load().
+        """
+        self.querySettings = {}
+        for index in self.corpus_indices():
+            curSettings = self.loader.get_index_settings(index)
+            # Settings that were not set explicitly are restored to their defaults (None)
+            self.querySettings[index] = {k: curSettings.get('index.' + k)
+                                         for k in self.BULK_LOAD_SETTINGS}
+            self.loader.put_index_settings(index, self.BULK_LOAD_SETTINGS)
+        self.tBulkLoadStart = time.time()
+
+    def finish_bulk_load(self):
+        """
+        Restore the query-time settings of the indices after bulk loading,
+        force-merge them and print the number of segments before and after
+        that, together with the load throughput.
+        """
+        if len(self.querySettings) <= 0:
+            return
+        tLoad = max(time.time() - self.tBulkLoadStart, 1e-6)
+        nActions = sum(v[0] for v in self.loader.stats.values())
+        nBytes = sum(v[1] for v in self.loader.stats.values())
+        print('Bulk load: {0} actions, {1:.1f} MB in {2:.1f} seconds '
+              '({3:.1f} docs/s, {4:.2f} MB/s).'.format(nActions, nBytes / 1048576, tLoad,
+                                                       nActions / tLoad, nBytes / 1048576 / tLoad))
+        for index, settings in self.querySettings.items():
+            self.loader.put_index_settings(index, settings)
+            self.loader.refresh(index)
+            nSegmentsBefore = self.loader.count_segments(index)
+            if self.maxSegments <= 0:
+                print(index + ':', nSegmentsBefore, 'segments.')
+                continue
+            t1 = time.time()
+            with self.telemetry.stage('force_merge_' + self.alias_name(index)):
+                self.loader.forcemerge(index, self.maxSegments)
+            print(index + ':', nSegmentsBefore, 'segments before force merge,',
+                  self.loader.count_segments(index), 'after;',
+                  'force merge took', round(time.time() - t1, 1), 'seconds.')
+        self.querySettings = {}
 
     def randomize_id(self, realID):
         """
         Return a (relatively) randomized sentence ID. This randomization
         is needed in context-aware word queries where the sentences
         are iterated in the order determined by their IDs.
-        """
-        if realID < 0:
+        The permutation only depends on its seed, which is kept
+        in the saved state, so that incremental updates and resumed
+        runs randomize the IDs in the same way.
+        Worker processes do not randomize IDs, and neither do they fill
+        in the final prev_id/next_id: a worker does not know how many
+        sentences the preceding documents have, so its sentence IDs
+        are local to the document. They are made global and randomized
+        when the document data is merged in the main process.
+        """
+        if self.isWorker:
             return realID
-        idStart, idEnd = realID // 1000000, realID % 1000000
-        return idStart * 1000000 + self.shuffled_ids[idEnd]
+        return self.idPermutation.permute(realID)
 
     def enhance_word(self, word):
         """
@@ -469,16 +796,133 @@ class Indexator:
             lClean[0].update(additionalFields)
         return wClean, lClean
 
-    def process_sentence_words(self, words, langID, subcorpora=None):
+    @staticmethod
+    def freeze_value(value):
+        """
+        Return a hashable version of a JSON value. Values that are
+        serialized differently by json.dumps() must get different
+        versions: lists and dictionaries are tagged, and scalars other
+        than strings are paired with their type, since True, 1 and 1.0
+        are equal in Python.
+        """
+        if type(value) is str:
+            return value
+        if type(value) is list:
+            return 'l', tuple(Indexator.freeze_value(v) for v in value)
+        if type(value) is dict:
+            return 'd', tuple(sorted((k, Indexator.freeze_value(v)) for k, v in value.items()))
+        return type(value), value
+
+    def is_word_field(self, field):
+        """
+        Check if a field of a word or an analysis can get to the words index.
+        """
+        try:
+            return self.wordFieldCache[field]
+        except KeyError:
+            isWordField = ((field in self.goodWordFields or field in self.additionalWordFields)
+                           or (field.endswith('_display')
+                               and (field[:-8] in self.goodWordFields or field[:-8] in self.additionalWordFields)))
+            self.wordFieldCache[field] = isWordField
+            return isWordField
+
+    def word_signature(self, w):
+        """
+        Return a hashable signature of a word that only depends on the
+        fields clean_word() takes into account. Words with equal signatures
+        get equal IDs, so the IDs only have to be found once per signature.
+        """
+        sig = tuple(sorted((field, self.freeze_value(value)) for field, value in w.items()
+                           if field != 'ana' and self.is_word_field(field)))
+        if 'ana' in w:
+            sig += (tuple(tuple(sorted((field, self.freeze_value(value)) for field, value in ana.items()
+                                       if self.is_word_field(field)))
+                          for ana in w['ana']),)
+        return sig
+
+    def new_word_id(self):
+        """
+        Return a new integer word ID. Word IDs are unique across languages.
+        """
+        wID = self.nWordIDs
+        self.nWordIDs += 1
+        return wID
+
+    def new_lemma_id(self):
+        """
+        Return a new integer lemma ID. Lemma IDs are unique across
+        languages and start with 1 (l0 means no lemma).
+        """
+        self.nLemmaIDs += 1
+        return self.nLemmaIDs
+
+    def assign_word_ids(self, w, langID):
+        """
+        Clean a word and find the IDs of the word and its lemmata,
+        adding new IDs if needed.
+        Return a tuple (wNum, wID, lNums, lIDs, anaLIDs, wf, lemmata), where
+        wNum and lNums are integer IDs of the word and its lemmata, anaLIDs
+        is a list of (analysis number, lemma ID) pairs, wf is the word form
+        and lemmata is a list of lemmata to be added to the global lists.
+        """
+        wClean, lClean = self.clean_word(w, langID)
+        anaLIDs = []
+
+        # Get lID
+        lIDs = 'l0'   # Default: no analysis
+        # lIDs can be str or list. If there is at most one analysis, then it is a string.
+        # If there are more *and* ambiguous_lemma_multiple_count is True, then it is a list.
+        for iLemma in range(len(lClean)):
+            if len(lClean[iLemma]['wf']) > 0:
+                lCleanTxt = json.dumps(lClean[iLemma], ensure_ascii=False, sort_keys=True)
+                try:
+                    lID = 'l' + str(self.tmpLemmaIDs[langID][lCleanTxt])
+                except KeyError:
+                    lID = self.new_lemma_id()
+                    self.tmpLemmaIDs[langID][lCleanTxt] = lID
+                    lID = 'l' + str(lID)
+                    self.tmpID2lemma[langID][lID] = lCleanTxt
+                if iLemma < len(w['ana']):
+                    # Should be the case
+                    anaLIDs.append((iLemma, lID))
+                if iLemma < len(wClean['ana']):
+                    # Should be the case
+                    wClean['ana'][iLemma]['l_id'] = lID
+                if lIDs == 'l0' or len(lIDs) <= 0:
+                    lIDs = lID
+                elif type(lIDs) is str and lIDs != lID:
+                    lIDs = [lIDs, lID]
+                elif type(lIDs) is list and lID not in lIDs:
+                   lIDs.append(lID)
+
+        # Get wID
+        wCleanTxt = json.dumps(wClean, ensure_ascii=False, sort_keys=True)
+        if wCleanTxt in self.tmpWordIDs[langID]:
+            wNum = self.tmpWordIDs[langID][wCleanTxt]
+        else:
+            wNum = self.new_word_id()
+            self.tmpWordIDs[langID][wCleanTxt] = wNum
+        wID = 'w' + str(wNum)
+        if type(lIDs) is str:
+            lNums = [int(lIDs[1:])]
+        else:
+            lNums = [int(lID[1:]) for lID in lIDs]
+        lemmata = []
+        if 'ana' in w and len(w['ana']) > 0:
+            lemmata = [l['wf'] for l in lClean]
+        return wNum, wID, lNums, lIDs, anaLIDs, wClean.get('wf'), lemmata
+
+    def process_sentence_words(self, words, langID):
         """
         Take words from a sentence, remove all non-searchable
-        fields from them and add them to self.words dictionary.
+        fields from them and count them in the current document.
         Add w_id and l_id properties to each word of the words list.
         Return the value of the 'sent_analyzed' meta field.
         """
-        if subcorpora is None:
-            subcorpora = []
-        sIDAdded = set()            # word IDs for which the current sentence ID has been counted
+        wordsAdded = set()          # word IDs for which the current sentence has been counted
+        lemmataAdded = set()        # lemma IDs for which the current sentence has been counted
+        docFreqs, docSFreqs = self.curWordDocFreqs[langID], self.curWordDocSFreqs[langID]
+        lemmaDocFreqs, lemmaDocSFreqs = self.curLemmaDocFreqs[langID], self.curLemmaDocSFreqs[langID]
         bFullyAnalyzed = True       # Whether each word in the sentence is analyzed
         bUniquelyAnalyzed = True    # Whether, in addition, each word has exactly one analysis
         for w in words:
@@ -495,152 +939,104 @@ class Indexator:
             elif len(w['ana']) > 1:
                 bUniquelyAnalyzed = False
 
-            wClean, lClean = self.clean_word(w, langID)
-
-            # Get lID
-            lIDs = 'l0'   # Default: no analysis
-            # lIDs can be str or list. If there is at most one analysis, then it is a string.
-            # If there are more *and* ambiguous_lemma_multiple_count is True, then it is a list.
-            for iLemma in range(len(lClean)):
-                if len(lClean[iLemma]['wf']) > 0:
-                    lCleanTxt = json.dumps(lClean[iLemma], ensure_ascii=False, sort_keys=True)
-                    try:
-                        lID = 'l' + str(self.tmpLemmaIDs[langID][lCleanTxt])
-                    except KeyError:
-                        lID = sum(len(self.tmpLemmaIDs[i])
-                                  for i in range(len(self.languages))) + 1
-                        self.tmpLemmaIDs[langID][lCleanTxt] = lID
-                        lID = 'l' + str(lID)
-                        self.tmpID2lemma[langID][lID] = lCleanTxt
-                    if iLemma < len(w['ana']):
-                        # Should be the case
-                        w['ana'][iLemma]['l_id'] = lID
-                    if iLemma < len(wClean['ana']):
-                        # Should be the case
-                        wClean['ana'][iLemma]['l_id'] = lID
-                    if lIDs == 'l0' or len(lIDs) <= 0:
-                        lIDs = lID
-                    elif type(lIDs) is str and lIDs != lID:
-                        lIDs = [lIDs, lID]
-                    elif type(lIDs) is list and lID not in lIDs:
-                       lIDs.append(lID)
-
-            # Get wID
-            wCleanTxt = json.dumps(wClean, ensure_ascii=False, sort_keys=True)
-            if wCleanTxt in self.tmpWordIDs[langID]:
-                wID = self.tmpWordIDs[langID][wCleanTxt]
-            else:
-                wID = sum(len(self.tmpWordIDs[i]) for i in range(len(self.languages)))
-                self.tmpWordIDs[langID][wCleanTxt] = wID
-            wID = 'w' + str(wID)
+            sig = self.word_signature(w)
+            try:
+                wordInfo = self.wordCache[langID][sig]
+            except KeyError:
+                wordInfo = self.assign_word_ids(w, langID)
+                if len(self.wordCache[langID]) >= self.MAX_MEM_DICT_SIZE:
+                    self.wordCache[langID] = {}
+                self.wordCache[langID][sig] = wordInfo
+            wNum, wID, lNums, lIDs, anaLIDs, wf, lemmata = wordInfo
+            if wf is not None:
+                self.wfs.add(wf)
+            for lemma in lemmata:
+                self.lemmata.add(lemma)
+            for iAna, lID in anaLIDs:
+                w['ana'][iAna]['l_id'] = lID
+            if type(lIDs) is list:
+                lIDs = lIDs[:]
             w['w_id'] = wID
 
             if lIDs != 'l0':
                 self.word2lemma[langID][wID] = lIDs
             w['l_id'] = lIDs
-            allIDs = [wID]
-            if type(lIDs) is str:
-                allIDs.append(lIDs)
-            else:
-                allIDs += lIDs
-            for itemID in allIDs:
-                try:
-                    self.wordFreqs[langID][itemID] += 1
-                except KeyError:
-                    self.wordFreqs[langID][itemID] = 1
-                for sub in subcorpora:
-                    try:
-                        self.wordFreqsSub[langID][sub][itemID] += 1
-                    except KeyError:
-                        self.wordFreqsSub[langID][sub][itemID] = 1
-                if itemID not in sIDAdded:
-                    sIDAdded.add(itemID)
-                    try:
-                        self.wordSFreqs[langID][itemID] += 1
-                    except KeyError:
-                        self.wordSFreqs[langID][itemID] = 1
-                try:
-                    self.curWordDocFreqs[langID][itemID] += 1
-                except KeyError:
-                    self.curWordDocFreqs[langID][itemID] = 1
+            # Corpus-wide frequencies are updated from these
+            # counters when the document is over
+            docFreqs.add(wNum)
+            if wNum not in wordsAdded:
+                wordsAdded.add(wNum)
+                docSFreqs.add(wNum)
+            for lNum in lNums:
+                lemmaDocFreqs.add(lNum)
+                if lNum not in lemmataAdded:
+                    lemmataAdded.add(lNum)
+                    lemmaDocSFreqs.add(lNum)
         if not bFullyAnalyzed:
             return 'incomplete'
         if not bUniquelyAnalyzed:
             return 'complete'
         return 'unique'
 
+    def collation(self, lang):
+        """
+        Return the Collation object for the alphabetical order of the
+        language. Languages with the same order share one object.
+        """
+        lexOrder = None
+        if lang in self.settings['lang_props'] and 'lexicographic_order' in self.settings['lang_props'][lang]:
+            lexOrder = tuple(self.settings['lang_props'][lang]['lexicographic_order'])
+        if lexOrder not in self.collations:
+            self.collations[lexOrder] = Collation(lexOrder)
+        return self.collations[lexOrder]
+
     def character_regex(self, lang):
         """
         Regex for splitting text into characters. Takes into account
         multicharacter sequences (digraphs etc.) defined in lang_props.lexicographic_order.
         """
-        if lang in self.characterRegexes:
-            return self.characterRegexes[lang]   # cache
-        if lang not in self.settings['lang_props'] or 'lexicographic_order' not in self.settings['lang_props'][lang]:
-            self.characterRegexes[lang] = re.compile('.')
-            return self.characterRegexes[lang]
-        rxChars = '(' + '|'.join(re.escape(c.lower())
-                                 for c in sorted(self.settings['lang_props'][lang]['lexicographic_order'],
-                                                 key=lambda x: (-len(x), x))
-                                 if len(c) > 1)
-        if len(rxChars) > 1:
-            rxChars += '|'
-        rxChars += '.)'
-        rxChars = re.compile(rxChars)
-        self.characterRegexes[lang] = rxChars
-        return rxChars
-
-    def make_sorting_function(self, lang):
-        """
-        Return a function that can be used for sorting tokens
-        in a list according to the alphabetical ordering specified
-        for the language lang.
-        """
-        sortingFunction = lambda x: x
-        if lang in self.settings['lang_props'] and 'lexicographic_order' in self.settings['lang_props'][lang]:
-            dictSort = {self.settings['lang_props'][lang]['lexicographic_order'][i]:
-                            (i, self.settings['lang_props'][lang]['lexicographic_order'][i])
-                        for i in range(len(self.settings['lang_props'][lang]['lexicographic_order']))}
-            maxIndex = len(dictSort)
-            rxChars = self.character_regex(lang)
-
-            def charReplaceFunction(c):
-                if c in dictSort:
-                    return dictSort[c]
-                return (maxIndex, c)
-
-            sortingFunction = lambda x: [charReplaceFunction(c) for c in rxChars.findall(x.lower())]
-        return sortingFunction
+        return self.collation(lang).rxChars
 
-    def make_sorting_function_lex(self, lang, lID2lex, lexFreqs):
-        sortingFunctionStr = self.make_sorting_function(lang)
-        def sortingFunction(lID):
-            lemma = sortingFunctionStr(lID2lex[lID][0].lower())
-            grdic = lID2lex[lID][1]
-            freq = lexFreqs[lID]
+    def make_sorting_function_lex(self, lang, lNum2lex, lexFreqs):
+        collation = self.collation(lang)
+        def sortingFunction(lNum):
+            lemma = collation.cached_key(lNum2lex[lNum][0])
+            grdic = lNum2lex[lNum][1]
+            freq = lexFreqs[lNum]
             return lemma, grdic, -freq
         return sortingFunction
 
-    def sort_words(self, lang):
-        """
-        Sort word forms and lemmata stored at earlier stages.
-        Return dictionaries with positions of word forms and
-        lemmata in the sorted list.
-        If there is a custom alphabetical order for the language,
-        use it. Otherwise, use standard lexicographic sorting.
-        """
-        wfsSorted = {}
-        iOrder = 0
-        sortingFunction = self.make_sorting_function(lang)
-        for wf in sorted(self.wfs, key=sortingFunction):
-            wfsSorted[wf] = iOrder
-            iOrder += 1
-        lemmataSorted = {}
-        iOrder = 0
-        for l in sorted(self.lemmata, key=sortingFunction):
-            lemmataSorted[l] = iOrder
-            iOrder += 1
-        return wfsSorted, lemmataSorted
+    def sort_words(self):
+        """
+        Sort word forms and lemmata stored at earlier stages according
+        to the alphabetical order of each language. If there is a custom
+        alphabetical order for the language, use it. Otherwise, use
+        standard lexicographic sorting. Each order is only sorted once,
+        even if several languages share it, and different orders are
+        sorted in parallel processes. The sort keys of the lemmata are
+        kept for the dictionary.
+        Return a dictionary {lexicographic order -> (sorted word forms,
+        sorted lemmata)}.
+        """
+        lexOrders = []
+        for lang in self.languages:
+            lexOrder = self.collation(lang).lexOrder
+            if lexOrder not in lexOrders:
+                lexOrders.append(lexOrder)
+        wfs = list(self.wfs)
+        lemmata = list(self.lemmata)
+        tasks = [(lexOrder, wfs, lemmata) for lexOrder in lexOrders]
+        nProcesses = min(len(tasks), os.cpu_count() or 1)
+        if nProcesses > 1:
+            with multiprocessing.Pool(processes=nProcesses) as pool:
+                results = pool.map(sort_words_worker, tasks)
+        else:
+            results = [sort_words_worker(task) for task in tasks]
+        sortedWords = {}
+        for lexOrder, (wfsSorted, lemmataSorted, lemmaKeys) in zip(lexOrders, results):
+            sortedWords[lexOrder] = (wfsSorted, lemmataSorted)
+            self.collations[lexOrder].cache = lemmaKeys
+        return sortedWords
 
     def get_freq_ranks(self, freqsSorted):
         """
@@ -670,6 +1066,39 @@ class Indexator:
                 quantiles[q] = 0
         return freqToRank, quantiles
 
+    def calculate_freq_ranks(self):
+        """
+        Calculate frequency ranks and quantiles of words and lemmata
+        for all languages before the words are indexed (see get_freq_ranks()).
+        Store them as a list of tuples (word frequency -> rank, word
+        quantiles, lemma frequency -> rank, lemma quantiles).
+        """
+        self.freqRanks = []
+        for langID in range(len(self.languages)):
+            langRanks = ()
+            for freqs in (self.wordFreqs[langID], self.lemmaFreqs[langID]):
+                freqsSorted = [freq for freq in freqs.values()]
+                freqsSorted.sort(reverse=True)
+                langRanks += self.get_freq_ranks(freqsSorted)
+            self.freqRanks.append(langRanks)
+
+    def unchanged_since_last_run(self, itemIDs, indexedItems, itemNum, row, freq, rank, quantiles, prevQuantiles):
+        """
+        Incremental mode: check if a word or lemma would be indexed exactly
+        as in the previous run, so that it can be skipped together with
+        its word_freq objects. This is the case if neither it nor its
+        lemmata (itemIDs) occur in added or removed documents, its positions
+        in the sorted lists and frequency ranks (row) have not changed
+        (see indexedItems), and neither has its rank label, which depends
+        on its frequency and rank and on the quantiles.
+        """
+        if prevQuantiles is None or any(itemID in self.touchedItems for itemID in itemIDs):
+            return False
+        if indexedItems.row(itemNum) != row:
+            return False
+        return (quantiles == prevQuantiles
+                or self.quantile_label(freq, rank, quantiles) == self.quantile_label(freq, rank, prevQuantiles))
+
     def quantile_label(self, freq, rank, quantiles):
         """
         Return a string label of the frequency rank (for frequent items)
@@ -811,25 +1240,23 @@ class Indexator:
         return gramm
 
     def get_lex_profile(self, lID, langID):
+        """
+        Return the lexical profile of a lemma as base64-encoded
+        JSON: {subcorpus -> {category -> {value -> frequency}}}.
+        """
         lang = self.languages[langID]
-        if lang not in self.lexProfiles:
-            return base64.b64encode('{}'.encode('utf-8')).decode('utf-8')
         curProfile = {}
-        for sub in self.lexProfiles[lang]:
-            curProfile[sub] = {}
-            for c in self.lexProfiles[lang][sub]:
-                for v in self.lexProfiles[lang][sub][c]:
-                    try:
-                        cvFreq = self.lexProfiles[lang][sub][c][v][lID]
-                    except KeyError:
-                        continue
-                    if cvFreq > 0:
-                        if c not in curProfile[sub]:
-                            curProfile[sub][c] = {}
-                        curProfile[sub][c][v] = cvFreq
+        if lang in self.lexProfiles:
+            curProfile = {sub: {} for sub in self.lexProfileColumns[lang]}
+            columnNames = self.lexProfileColumnNames[lang]
+            for column, cvFreq in self.lexProfiles[lang].row(int(lID[1:])):
+                sub, c, v = columnNames[column]
+                if c not in curProfile[sub]:
+                    curProfile[sub][c] = {}
+                curProfile[sub][c][v] = cvFreq
         return base64.b64encode(json.dumps(curProfile,
                                            ensure_ascii=False,
-                                           indent=-1,
+                                           separators=(',', ':'),
                                            sort_keys=True).encode('utf-8')).decode('utf-8')
 
     def word_to_lex_profile(self, w, langID):
@@ -837,6 +1264,8 @@ class Indexator:
         Add information from one word to the lexical profile of the corresponding lemma.
         """
         lang = self.languages[langID]
+        if lang not in self.lexProfiles:
+            return
         lIDs = w['l_id']
         if type(lIDs) is str:
             lIDs = [lIDs]
@@ -845,104 +1274,126 @@ class Indexator:
             k = 'freq_' + sub
             if k in w:
                 freq[sub] = w[k]
+        columns = self.lexProfileColumns[lang]
         for lID in lIDs:
             if lID == 'l0':
                 continue
-            for sub in self.lexProfiles[lang]:
-                for c in self.lexProfiles[lang][sub]:
-                    profileGramm = self.get_gramm(w, self.languages[langID], c, lID)
-                    if profileGramm in self.lexProfiles[lang][sub][c]:
-                        v = profileGramm
+            lNum = int(lID[1:])
+            for c in self.settings['lang_props'][lang]['lex_profile_categories']:
+                # The value does not depend on the subcorpus
+                profileGramm = self.get_gramm(w, lang, c, lID)
+                for sub in columns:
+                    if profileGramm in columns[sub][c]:
+                        column = columns[sub][c][profileGramm]
                     else:
-                        v = '_other'
-                    try:
-                        self.lexProfiles[lang][sub][c][v][lID] += freq[sub]
-                    except KeyError:
-                        self.lexProfiles[lang][sub][c][v][lID] = freq[sub]
+                        column = columns[sub][c]['_other']
+                    self.lexProfiles[lang].add(lNum, column, freq[sub])
 
     def iterate_lemmata(self, langID, lemmataSorted):
         """
         Iterate over all lemmata for one language collected at the
-        word iteration stage.
+        word iteration stage. In incremental mode, skip the lemmata
+        that have not changed since the previous run.
         """
-        lFreqsSorted = [self.wordFreqs[langID][itemID]
-                        for itemID in self.wordFreqs[langID]
-                        if itemID.startswith('l')]
-        lFreqsSorted.sort(reverse=True)
-        lemmaFreqToRank, quantiles = self.get_freq_ranks(lFreqsSorted)
+        lemmaFreqToRank, quantiles = self.freqRanks[langID][2:]
+        prevQuantiles = None
+        if self.indexedQuantiles is not None:
+            prevQuantiles = self.indexedQuantiles[langID][1]
         iLemma = 0
-        for l, lID in self.tmpLemmaIDs[langID].items():
-            lID = 'l' + str(lID)
+        postingsReader = PostingsReader(self.lemmaPostings[langID])
+        for l, lNum in self.tmpLemmaIDs[langID].items():
+            lID = 'l' + str(lNum)
+            lemmaFreq = self.lemmaFreqs[langID][lNum]
+            if lemmaFreq <= 0:
+                # Only possible in incremental mode if the lemma has been removed
+                continue
             if iLemma % 250 == 0:
                 print('indexing lemma', iLemma)
             lemmaJson = json.loads(l)
+            if lNum in self.dictFreqs:
+                self.add_dictionary_lemma(lemmaJson, lNum)
             lOrder = lemmataSorted[lemmaJson['wf']]
+            if self.incremental and self.unchanged_since_last_run(
+                    (lID,), self.indexedLemmata, lNum, (lOrder, lemmaFreqToRank[lemmaFreq]),
+                    lemmaFreq, lemmaFreqToRank[lemmaFreq], quantiles, prevQuantiles):
+                iLemma += 1
+                continue
+            postings = postingsReader.get(lNum)
             lemmaJson.update({
                 'wtype': 'lemma',
                 'l_order': lOrder,
-                'freq': self.wordFreqs[langID][lID],
-                'lemma_freq': self.wordFreqs[langID][lID],
-                'rank_true': lemmaFreqToRank[self.wordFreqs[langID][lID]],
-                'rank': self.quantile_label(self.wordFreqs[langID][lID],
-                                            lemmaFreqToRank[self.wordFreqs[langID][lID]],
+                'freq': lemmaFreq,
+                'lemma_freq': lemmaFreq,
+                'rank_true': lemmaFreqToRank[lemmaFreq],
+                'rank': self.quantile_label(lemmaFreq,
+                                            lemmaFreqToRank[lemmaFreq],
                                             quantiles),
-                'n_sents': self.wordSFreqs[langID][lID],
-                'n_docs': len(self.wordDIDs[langID][lID]),
+                'n_sents': self.lemmaSFreqs[langID][lNum],
+                'n_docs': len(postings),
                 'freq_join': 'word',
                 'lex_profile': self.get_lex_profile(lID, langID)
             })
             for sub in self.subcorpora:
-                try:
-                    lemmaJson['freq_' + sub] = self.wordFreqsSub[langID][sub][lID]
-                    lemmaJson['lemma_freq_' + sub] = self.wordFreqsSub[langID][sub][lID]
-                except KeyError:
-                    lemmaJson['freq_' + sub] = 0
-                    lemmaJson['lemma_freq_' + sub] = 0
+                lemmaJson['freq_' + sub] = self.lemmaFreqsSub[langID][sub][lNum]
+                lemmaJson['lemma_freq_' + sub] = self.lemmaFreqsSub[langID][sub][lNum]
             curAction = {
-                '_index': self.name + '.words',
+                '_index': self.indexPrefix + '.words',
                 '_id': lID,
                 '_source': lemmaJson
             }
             iLemma += 1
             yield curAction
 
-            for docID in self.wordDIDs[langID][lID]:
+            for docID, freq in postings:
                 lfreqJson = {
                     'wtype': 'word_freq',
                     'l_id': lID,
                     'd_id': docID,
                     'l_order': lOrder,
-                    'freq': self.wordDocFreqs[langID][(lID, docID)],
+                    'freq': freq,
                     'freq_join': {
                         'name': 'word_freq',
                         'parent': lID
                     }
                 }
-                curAction = {'_index': self.name + '.words',
-                             '_id': 'lfreq' + str(self.lemmaFreqID),
+                curAction = {'_index': self.indexPrefix + '.words',
+                             '_id': 'lfreq' + lID[1:] + '_' + str(docID),
                              '_source': lfreqJson,
                              '_routing': lID}
-                self.lemmaFreqID += 1
                 yield curAction
 
-    def iterate_wfs(self, langID, wfsSorted, lemmataSorted, lemmaFreqToRank):
+    def iterate_wfs(self, langID, wfsSorted, lemmataSorted):
+        """
+        Iterate over all word forms for one language collected at the
+        word iteration stage. In incremental mode, skip the words that
+        have not changed since the previous run.
+        """
         print('Processing words in ' + self.languages[langID] + '...')
-        wFreqsSorted = [self.wordFreqs[langID][itemID]
-                        for itemID in self.wordFreqs[langID]
-                        if itemID.startswith('w')]
-        wFreqsSorted.sort(reverse=True)
-        wordFreqToRank, quantiles = self.get_freq_ranks(wFreqsSorted)
+        wordFreqToRank, quantiles, lemmaFreqToRank = self.freqRanks[langID][:3]
+        prevQuantiles = None
+        if self.indexedQuantiles is not None:
+            prevQuantiles = self.indexedQuantiles[langID][0]
         iWord = 0
-        for w, wID in self.tmpWordIDs[langID].items():
-            wID = 'w' + str(wID)
+        postingsReader = PostingsReader(self.wordPostings[langID])
+        for w, wNum in self.tmpWordIDs[langID].items():
+            wID = 'w' + str(wNum)
+            if wNum not in self.wordFreqs[langID]:
+                # Only possible in incremental mode if the word has been removed
+                continue
             if iWord % 500 == 0:
                 print('indexing word', iWord)
             try:
                 lIDs = self.word2lemma[langID][wID]
             except KeyError:
                 lIDs = 'l0'
+            if type(lIDs) is str:
+                lNums = int(lIDs[1:])
+            else:
+                lNums = [int(lID[1:]) for lID in lIDs]
 
             wJson = json.loads(w)
+            if self.generateDictionary:
+                self.add_dictionary_word(wJson, lNums, self.wordFreqs[langID][wNum])
             wJson['id'] = wID
             wfOrder = len(wfsSorted) + 1
             if 'wf' in wJson:
@@ -959,40 +1410,39 @@ class Indexator:
             wJson['wf_order'] = wfOrder
             wJson['l_order'] = lOrder
             wJson['l_id'] = lIDs
-            wJson['freq'] = self.wordFreqs[langID][wID]
+            wJson['freq'] = self.wordFreqs[langID][wNum]
+            for sub in self.subcorpora:
+                wJson['freq_' + sub] = self.wordFreqsSub[langID][sub][wNum]
+            wJson['rank_true'] = wordFreqToRank[wJson['freq']]  # for the calculations
+            if type(lNums) is int:
+                wJson['lemma_rank_true'] = lemmaFreqToRank[self.lemmaFreqs[langID][lNums]]  # for the calculations
+            else:
+                wJson['lemma_rank_true'] = max(lemmaFreqToRank[self.lemmaFreqs[langID][lNum]] for lNum in lNums)  # for the calculations
+            if self.incremental and self.unchanged_since_last_run(
+                    [wID] + ([lIDs] if type(lIDs) is str else lIDs), self.indexedWords, wNum,
+                    (wfOrder, lOrder, wJson['rank_true'], wJson['lemma_rank_true']),
+                    wJson['freq'], wJson['rank_true'], quantiles, prevQuantiles):
+                # The lexical profiles of the lemmata are built from all words
+                self.word_to_lex_profile(wJson, langID)
+                iWord += 1
+                self.wID += 1
+                continue
+            postings = postingsReader.get(wNum)
 
-            if type(lIDs) is str:
-                wJson['lemma_freq'] = self.wordFreqs[langID][lIDs]
+            if type(lNums) is int:
+                wJson['lemma_freq'] = self.lemmaFreqs[langID][lNums]
             else:
-                wJson['lemma_freq'] = max(self.wordFreqs[langID][lID] for lID in lIDs)
+                wJson['lemma_freq'] = max(self.lemmaFreqs[langID][lNum] for lNum in lNums)
 
             for sub in self.subcorpora:
-                try:
-                    wJson['freq_' + sub] = self.wordFreqsSub[langID][sub][wID]
-                except KeyError:
-                    wJson['freq_' + sub] = 0
-
-                if type(lIDs) is str:
-                    try:
-                        wJson['lemma_freq_' + sub] = self.wordFreqsSub[langID][sub][lIDs]
-                    except KeyError:
-                        wJson['lemma_freq_' + sub] = 0
+                if type(lNums) is int:
+                    wJson['lemma_freq_' + sub] = self.lemmaFreqsSub[langID][sub][lNums]
                 else:
-                    try:
-                        wJson['lemma_freq_' + sub] = max(self.wordFreqsSub[langID][sub][lID]
-                                                         for lID in lIDs if lID in self.wordFreqsSub[langID][sub])
-                    except:
-                        wJson['lemma_freq_' + sub] = 0
+                    wJson['lemma_freq_' + sub] = max(self.lemmaFreqsSub[langID][sub][lNum] for lNum in lNums)
             # wJson['sids'] = [sid for sid in sorted(self.wordSIDs[langID][wID])]
-            wJson['dids'] = [did for did in sorted(self.wordDIDs[langID][wID])]
-            wJson['n_sents'] = self.wordSFreqs[langID][wID]
+            wJson['dids'] = [did for did, freq in postings]
+            wJson['n_sents'] = self.wordSFreqs[langID][wNum]
             wJson['n_docs'] = len(wJson['dids'])
-            wJson['rank_true'] = wordFreqToRank[wJson['freq']]  # for the calculations
-
-            if type(lIDs) is str:
-                wJson['lemma_rank_true'] = lemmaFreqToRank[self.wordFreqs[langID][lIDs]]  # for the calculations
-            else:
-                wJson['lemma_rank_true'] = max(lemmaFreqToRank[self.wordFreqs[langID][lID]] for lID in lIDs)  # for the calculations
             wJson['rank'] = self.quantile_label(wJson['freq'],
                                                 wJson['rank_true'],
                                                 quantiles)  # for the user
@@ -1000,13 +1450,13 @@ class Indexator:
             wJson['wtype'] = 'word'
             self.word_to_lex_profile(wJson, langID)
             curAction = {
-                '_index': self.name + '.words',
+                '_index': self.indexPrefix + '.words',
                 '_id': wID,
                 '_source': wJson
             }
             yield curAction
 
-            for docID in wJson['dids']:
+            for docID, freq in postings:
                 wfreqJson = {
                     'wtype': 'word_freq',
                     'w_id': wID,
@@ -1014,217 +1464,388 @@ class Indexator:
                     'd_id': docID,
                     'wf_order': wfOrder,
                     'l_order': lOrder,
-                    'freq': self.wordDocFreqs[langID][(wID, docID)],
+                    'freq': freq,
                     'freq_join': {
                         'name': 'word_freq',
                         'parent': wID
                     }
                 }
-                curAction = {'_index': self.name + '.words',
-                             '_id': 'wfreq' + str(self.wordFreqID),
+                curAction = {'_index': self.indexPrefix + '.words',
+                             '_id': 'wfreq' + wID[1:] + '_' + str(docID),
                              '_source': wfreqJson,
                              '_routing': wID}
-                self.wordFreqID += 1
                 yield curAction
             iWord += 1
             self.wID += 1
 
-    def iterate_words(self):
-        """
-        Iterate through all words collected at the previous
-        stage. Return JSON objects with actions for bulk indexing
-        in Elasticsearch.
+    def sorted_positions(self, langID, sortedWords):
+        """
+        Return dictionaries with the positions of word forms and lemmata
+        in the lists sorted according to the alphabetical order of the
+        language. sortedWords is the result of sort_words(). Consecutive
+        languages with the same order share the dictionaries.
+        """
+        lexOrder = self.collation(self.languages[langID]).lexOrder
+        if self.sortedPositions is None or self.sortedPositions[0] != lexOrder:
+            self.sortedPositions = None     # free the memory before building new dictionaries
+            self.sortedPositions = (lexOrder,
+                                    {wf: i for i, wf in enumerate(sortedWords[lexOrder][0])},
+                                    {l: i for i, l in enumerate(sortedWords[lexOrder][1])})
+        return self.sortedPositions[1], self.sortedPositions[2]
+
+    def iterate_lang_words(self, langID, sortedWords):
+        """
+        Iterate over the actions for all word forms and lemmata
+        of one language, each followed by its word_freq objects.
+        """
+        wfsSorted, lemmataSorted = self.sorted_positions(langID, sortedWords)
+        for wAction in self.iterate_wfs(langID, wfsSorted, lemmataSorted):
+            yield wAction
+        for lAction in self.iterate_lemmata(langID, lemmataSorted):
+            yield lAction
+        if self.languages[langID] in self.lexProfiles:
+            # The profiles are only needed for the lemmata of this language
+            self.lexProfiles[self.languages[langID]].clear()
+        if self.generateDictionary:
+            with self.telemetry.stage('dictionary_' + self.languages[langID]) as counts:
+                counts['lemmata'] = self.write_dictionary(langID)
+
+    def iterate_words(self, sortedWords):
+        """
+        Return an iterator over all words collected at the previous
+        stage: JSON objects with actions for bulk indexing in
+        Elasticsearch. sortedWords is the result of sort_words().
+        If there are several languages and worker processes are allowed,
+        each language is processed in a separate forked process, which
+        has all the data collected so far.
         """
         self.wID = 0
-
+        if (self.workers > 1 and len(self.languages) > 1
+                and 'fork' in multiprocessing.get_all_start_methods()):
+            # The processes are started right away rather than when the
+            # first action is requested, because the bulk loader starts
+            # threads by then
+            langActions = self.iterate_words_parallel(*self.start_words_processes(sortedWords))
+        else:
+            langActions = (action for langID in range(len(self.languages))
+                           for action in self.iterate_lang_words(langID, sortedWords))
+        return self.finish_words(langActions)
+
+    def start_words_processes(self, sortedWords, batchSize=1000, maxBatches=100):
+        """
+        Start a process for each language that puts the actions for
+        its words and lemmata to a common queue in batches.
+        Return the list of processes and the queue.
+        """
+        for tables in (self.tmpWordIDs, self.tmpLemmaIDs, self.tmpID2lemma):
+            for table in tables:
+                table.commit()
+        ctx = multiprocessing.get_context('fork')
+        actionQueue = ctx.Queue(maxsize=maxBatches)
+        processes = []
         for langID in range(len(self.languages)):
-            wfsSorted, lemmataSorted = self.sort_words(self.languages[langID])
-            lFreqsSorted = [self.wordFreqs[langID][itemID]
-                            for itemID in self.wordFreqs[langID]
-                            if itemID.startswith('l')]
-            lFreqsSorted.sort(reverse=True)
-            lemmaFreqToRank, lemmaQuantiles = self.get_freq_ranks(lFreqsSorted)
-
-            for wAction in self.iterate_wfs(langID, wfsSorted, lemmataSorted, lemmaFreqToRank):
-                yield wAction
-            for lAction in self.iterate_lemmata(langID, lemmataSorted):
-                yield lAction
-        emptyLemmaJson = {
-            'wf': '',
-            'wtype': 'lemma',
-            'freq': 0,
-            'rank_true': -1
-        }
-        curAction = {
-            '_index': self.name + '.words',
-            '_id': 'l0',    # l prefix stands for "lemma"
-            '_source': emptyLemmaJson
-        }
-        yield curAction
-        self.wfs = None
-        self.lemmata = None
+            p = ctx.Process(target=words_worker, args=(self, langID, sortedWords, actionQueue, batchSize))
+            p.start()
+            processes.append(p)
+        return processes, actionQueue
 
-    def write_dictionary(self, langID, lexFreqs, lID2lex):
+    def iterate_words_parallel(self, processes, actionQueue):
         """
-        Write an HTML dictionary based on the frequency data gathered at a previous step.
+        Iterate over the actions received from the processes started
+        by start_words_processes() until all of them are finished.
+        """
+        nRunning = len(processes)
+        try:
+            while nRunning > 0:
+                try:
+                    langID, batch = actionQueue.get(timeout=10)
+                except queue.Empty:
+                    if any(p.exitcode not in (None, 0) for p in processes):
+                        raise RuntimeError('A process that processes words has stopped unexpectedly.')
+                    continue
+                if batch is None:
+                    nRunning -= 1
+                elif type(batch) is str:
+                    raise RuntimeError('Error while processing words in '
+                                       + self.languages[langID] + ':\n' + batch)
+                elif type(batch) is dict:
+                    self.telemetry.add_stages(batch['stages'], batch['events'])
+                else:
+                    for action in batch:
+                        yield action
+        finally:
+            for p in processes:
+                if nRunning > 0:
+                    p.terminate()
+                p.join()
+
+    def finish_words(self, langActions):
+        """
+        Pass on the actions for all languages and add the empty lemma
+        (unless it has been indexed in the previous run).
+        """
+        for action in langActions:
+            yield action
+        if self.indexedQuantiles is None:
+            emptyLemmaJson = {
+                'wf': '',
+                'wtype': 'lemma',
+                'freq': 0,
+                'rank_true': -1
+            }
+            curAction = {
+                '_index': self.indexPrefix + '.words',
+                '_id': 'l0',    # l prefix stands for "lemma"
+                '_source': emptyLemmaJson
+            }
+            yield curAction
+        self.sortedPositions = None
+        if not self.incremental:
+            # Word forms and lemmata are only needed for the next run in incremental mode
+            self.wfs = None
+            self.lemmata = None
+
+    def add_dictionary_word(self, wJson, lNums, wordFreq):
+        """
+        Add the frequency of a word (as stored in tmpWordIDs) to the
+        dictionary frequencies of its lemmata, unless it has no analyses
+        or is excluded from the dictionary by exclude_from_dict.
+        """
+        if 'ana' not in wJson or len(wJson['ana']) <= 0:
+            return
+        for ana in wJson['ana']:
+            if any(k in ana and ((type(ana[k]) == str and v.search(ana[k]) is not None)
+                                 or (type(ana[k]) == list and any(v.search(anaVPart) is not None for anaVPart in ana[k])))
+                   for k, v in self.excludeFromDict.items()):
+                return
+        if type(lNums) is int:
+            lNums = [lNums]
+        for lNum in lNums:
+            if lNum == 0:
+                continue
+            if lNum not in self.dictFreqs:
+                self.dictFreqs[lNum] = wordFreq
+            else:
+                self.dictFreqs[lNum] += wordFreq
+
+    def add_dictionary_lemma(self, lemmaJson, lNum):
+        """
+        Remember the lemma, its dictionary tags and additional fields
+        (as stored in tmpLemmaIDs) for the dictionary.
+        """
+        lemma = ''
+        grdic = ''
+        additionalFields = {}
+        for k, v in lemmaJson.items():
+            if k == 'wf':
+                lemma = v
+            elif k == 'grdic':
+                grdic = v
+            else:
+                additionalFields[k] = v
+        self.dictLexemes[lNum] = (lemma, grdic, additionalFields)
+
+    def dictionary_table_header(self, includeLexProfile):
+        header = ('<table class="dictionary_table">\n<thead>\n'
+                  '<th>{{ _(\'word_th_lemma\') }}</th>'
+                  '<th>{{ _(\'word_th_gr\') }}</th>')
+        for field in sorted(self.additionalLemmaFields):
+            header += '<th>{{ _(\'word_th_' + html.escape(field) + '\') }}</th>'
+        if len(self.subcorpora) > 0:
+            header += '<th>{{ _(\'Subcorpus\') }}</th>'
+        header += '<th>{{ _(\'word_th_frequency\') }}</th>'
+        if includeLexProfile:
+            header += '<th>{{ _(\'Profile\') }}</th>'
+        return header + '</thead>\n<tbody>\n'
+
+    def dictionary_row(self, langID, lNum, includeLexProfile):
+        lang = self.languages[langID]
+        lemma, grdic, additionalFields = self.dictLexemes[lNum]
+        curSubcorpora = [sub for sub in self.subcorpora
+                         if self.lemmaFreqsSub[langID][sub][lNum] > 0]
+        row = '<tr>\n<td class="dictionary_lemma">' + lemma + '</td><td>' + grdic + '</td>'
+        for field in sorted(self.additionalLemmaFields):
+            if field in additionalFields:
+                row += '<td>' + html.escape(additionalFields[field]) + '</td>'
+            else:
+                row += '<td></td>'
+        if len(self.subcorpora) > 0:
+            if len(curSubcorpora) == 1:
+                row += ('<td><div class="circle subcorpus_' + curSubcorpora[0]
+                        + '" data-tooltip="tooltip" data-placement="bottom" title="" '
+                          'data-bs-original-title="Subcorpus: metavalue_' + curSubcorpora[0]
+                        + '"> </div></td>')
+            else:
+                row += '<td></td>'
+        row += '<td>' + str(self.dictFreqs[lNum]) + '</td>'
+        if includeLexProfile:
+            row += ('<td><a class="bi bi-activity lex_profile_link"'
+                    ' href="get_lex_profile/' + lang + '/l' + str(lNum) + '"'
+                    ' target="_blank" title="{{ _(\'Lexical profile\') }}"> </a></td>')
+        return row + '</tr>\n'
+
+    def write_dictionary(self, langID):
+        """
+        Write an HTML dictionary of the language based on the lemmata
+        and frequencies collected while its words were being indexed.
+        The main page of the dictionary only contains the list of letters.
+        The lemmata are written to separate pages of at most DICT_PAGE_SIZE
+        lemmata (<letter number>_<page number>.html in a folder next to
+        the main page), which the web app loads when the user clicks
+        on a letter. Return the number of lemmata in the dictionary.
         """
         lang = self.languages[langID]
         includeLexProfile = ('lang_props' in self.settings and lang in self.settings['lang_props']
                              and 'lex_profile_categories' in self.settings['lang_props'][lang])
-        if not os.path.exists('../search/web_app/templates/dictionaries'):
-            os.makedirs('../search/web_app/templates/dictionaries')
-        with open(os.path.join('../search/web_app/templates/dictionaries',
-                               'dictionary_' + self.settings['corpus_name'] + '_' + lang + '.html'),
-                  'w', encoding='utf-8') as fOut:
+        dictName = 'dictionary_' + self.settings['corpus_name'] + '_' + lang
+        pagesDir = os.path.join(self.DICT_DIR, dictName)
+        if os.path.exists(pagesDir):
+            shutil.rmtree(pagesDir)
+        if len(self.dictLexemes) <= 0:
+            self.dictFreqs = {}
+            return 0
+        print('Writing dictionary for ' + lang + '...')
+        os.makedirs(pagesDir)
+        letters = []    # [letter, number of pages]
+        fOut = None
+        nLemmata = 0
+        sortingFunction = self.make_sorting_function_lex(lang, self.dictLexemes, self.dictFreqs)
+        for lNum in sorted(self.dictLexemes, key=sortingFunction):
+            lemma = self.dictLexemes[lNum][0]
+            if len(lemma) <= 0:
+                continue
+            mChar = self.character_regex(lang).search(lemma.lower())
+            if mChar is None:
+                curLetter = '*'
+            else:
+                curLetter = mChar.group(0)
+            if len(letters) <= 0 or curLetter != letters[-1][0] or nLemmata >= self.DICT_PAGE_SIZE:
+                if fOut is not None:
+                    fOut.write('</tbody>\n</table>\n')
+                    fOut.close()
+                if len(letters) <= 0 or curLetter != letters[-1][0]:
+                    letters.append([curLetter, 0])
+                fOut = open(os.path.join(pagesDir, str(len(letters) - 1) + '_' + str(letters[-1][1]) + '.html'),
+                            'w', encoding='utf-8')
+                letters[-1][1] += 1
+                nLemmata = 0
+                fOut.write('<h2 class="dictionary_letter">' + curLetter.upper() + '</h2>\n')
+                fOut.write(self.dictionary_table_header(includeLexProfile))
+            fOut.write(self.dictionary_row(langID, lNum, includeLexProfile))
+            nLemmata += 1
+        if fOut is not None:
+            fOut.write('</tbody>\n</table>\n')
+            fOut.close()
+        nEntries = len(self.dictLexemes)
+        self.dictFreqs = {}
+        self.dictLexemes = {}
+        with open(os.path.join(self.DICT_DIR, dictName + '.html'), 'w', encoding='utf-8') as fOut:
             fOut.write('<h1 class="dictionary_header"> {{ _(\'Dictionary_header\') }} '
                        '({{ _(\'langname_' + lang + '\') }})</h1>\n')
-            prevLetter = ''
-            sortingFunction = self.make_sorting_function_lex(lang, lID2lex, lexFreqs)
-            for lID in sorted(lexFreqs, key=sortingFunction):
-                lemma, grdic, additionalFields = lID2lex[lID]
-                if len(lemma) <= 0:
-                    continue
-                curSubcorpora = [sub for sub in self.subcorpora
-                                 if lID in self.wordFreqsSub[langID][sub] and self.wordFreqsSub[langID][sub][lID] > 0]
-                additionalFieldsJson = json.loads(additionalFields)
-                mChar = self.character_regex(lang).search(lemma.lower())
-                if mChar is None:
-                    curLetter = '*'
-                else:
-                    curLetter = mChar.group(0)
-                if curLetter != prevLetter:
-                    if prevLetter != '':
-                        fOut.write('</tbody>\n</table>\n')
-                    fOut.write('<h2 class="dictionary_letter">' + curLetter.upper() + '</h2>\n')
-                    fOut.write('<table class="dictionary_table">\n<thead>\n'
-                               '<th>{{ _(\'word_th_lemma\') }}</th>'
-                               '<th>{{ _(\'word_th_gr\') }}</th>')
-                    for field in sorted(self.additionalLemmaFields):
-                        fOut.write('<th>{{ _(\'word_th_' + html.escape(field) + '\') }}</th>')
-                    if len(self.subcorpora) > 0:
-                        fOut.write('<th>{{ _(\'Subcorpus\') }}</th>')
-                    fOut.write('<th>{{ _(\'word_th_frequency\') }}</th>')
-                    if includeLexProfile:
-                        fOut.write('<th>{{ _(\'Profile\') }}</th>')
-                    fOut.write('</thead>\n<tbody>\n')
-                    prevLetter = curLetter
-                fOut.write('<tr>\n<td class="dictionary_lemma">' + lemma + '</td><td>' + grdic + '</td>')
-                for field in sorted(self.additionalLemmaFields):
-                    if field in additionalFieldsJson:
-                        fOut.write('<td>' + html.escape(additionalFieldsJson[field]) + '</td>')
-                    else:
-                        fOut.write('<td></td>')
-                if len(self.subcorpora) > 0:
-                    if len(curSubcorpora) == 1:
-                        fOut.write('<td><div class="circle subcorpus_' + curSubcorpora[0]
-                                   + '" data-tooltip="tooltip" data-placement="bottom" title="" '
-                                     'data-bs-original-title="Subcorpus: metavalue_' + curSubcorpora[0]
-                                   + '"> </div></td>')
-                    else:
-                        fOut.write('<td></td>')
-                fOut.write('<td>' + str(lexFreqs[lID]) + '</td>')
-                if includeLexProfile:
-                    fOut.write('<td><a class="bi bi-activity lex_profile_link"'
-                               ' href="get_lex_profile/' + lang + '/' + lID + '"'
-                               ' target="_blank" title="{{ _(\'Lexical profile\') }}"> </a></td>')
-                fOut.write('</tr>\n')
-            if prevLetter != '':
-                fOut.write('</tbody>\n</table>\n')
-
-    def generate_dictionary(self):
-        """
-        For each language, save an HTML dictionary containing all lexemes of the corpus.
+            fOut.write('<div class="dictionary_letters">\n')
+            for iLetter in range(len(letters)):
+                fOut.write('<span class="dictionary_letter_link" data-lang="' + lang
+                           + '" data-letter="' + str(iLetter) + '" data-pages="' + str(letters[iLetter][1])
+                           + '">' + letters[iLetter][0].upper() + '</span>\n')
+            fOut.write('</div>\n<div id="dictionary_pages"></div>\n<div id="dictionary_letter_body"></div>\n')
+        return nEntries
+
+    def filter_changed_words(self, actions):
+        """
+        Incremental mode: yield delete actions for words and lemmata that
+        are no longer present in the corpus, then pass on the actions for
+        the words and lemmata that have changed since the previous run
+        (the others are not generated at all, see unchanged_since_last_run()),
+        remembering their positions in the sorted lists and ranks for
+        the next run.
         """
         for langID in range(len(self.languages)):
-            lang = self.languages[langID]
-            iWord = 0
-            print('Generating dictionary for ' + lang + '...')
-            lexFreqs = {}            # lemma ID -> its frequency
-            lID2lex = {}             # lemma ID -> its features as JSON
-            wFreqsSorted = [v for v in sorted(self.wordFreqs[langID].values(), reverse=True)]
-            freqToRank, quantiles = self.get_freq_ranks(wFreqsSorted)
-            # for wID in self.wordFreqs[langID]:
-            for w, wID in self.tmpWordIDs[langID].items():
-                wID = 'w' + str(wID)
-                if iWord % 1000 == 0:
-                    print('processing word', iWord, 'for the dictionary')
-                iWord += 1
-                wJson = json.loads(w)
-                if 'ana' not in wJson or len(wJson['ana']) <= 0:
+            for itemID in self.removedItems[langID]:
+                if ((itemID.startswith('w') and int(itemID[1:]) in self.wordFreqs[langID])
+                        or (itemID.startswith('l') and int(itemID[1:]) in self.lemmaFreqs[langID])):
+                    # Removed with a changed document, but then added again
                     continue
-                excludeWord = False
-                for ana in wJson['ana']:
-                    if any(k in ana and ((type(ana[k]) == str and v.search(ana[k]) is not None)
-                                           or (type(ana[k]) == list and any(v.search(anaVPart) is not None for anaVPart in ana[k])))
-                           for k, v in self.excludeFromDict.items()):
-                        excludeWord = True
-                        break
-                if excludeWord:
-                    continue
-                wordFreq = self.wordFreqs[langID][wID]
-
-                try:
-                    lIDs = self.word2lemma[langID][wID]
-                except KeyError:
-                    lIDs = 'l0'
-                if type(lIDs) is str:
-                    lIDs = [lIDs]
-                for lID in lIDs:
-                    if lID == 'l0':
-                        continue
-                    lemma = ''
-                    grdic = ''
-                    additionalFields = {}
-                    try:
-                        lexeme = json.loads(self.tmpID2lemma[langID][lID])
-                    except KeyError:
-                        # This should not happen
-                        continue
-                    for k, v in lexeme.items():
-                        if k == 'wf':
-                            lemma = v
-                        elif k == 'grdic':
-                            grdic = v
-                        else:
-                            additionalFields[k] = v
-                    lexTuple = (lemma, grdic,
-                                json.dumps(additionalFields, indent=0, ensure_ascii=False, sort_keys=True))
-                    lID2lex[lID] = lexTuple
-                    # Lexeme frequency
-                    if lID not in lexFreqs:
-                        lexFreqs[lID] = wordFreq
-                    else:
-                        lexFreqs[lID] += wordFreq
-            if len(lexFreqs) <= 0:
-                continue
-            self.write_dictionary(langID, lexFreqs, lID2lex)
+                if itemID.startswith('w'):
+                    del self.indexedWords[int(itemID[1:])]
+                else:
+                    del self.indexedLemmata[int(itemID[1:])]
+                yield {'_op_type': 'delete',
+                       '_index': self.indexPrefix + '.words',
+                       '_id': itemID}
+            self.removedItems[langID] = set()
+        for action in actions:
+            if '_routing' not in action and action['_id'] != 'l0':
+                s = action['_source']
+                if s['wtype'] == 'word':
+                    self.indexedWords[int(action['_id'][1:])] = (s['wf_order'], s['l_order'],
+                                                                 s['rank_true'], s['lemma_rank_true'])
+                else:
+                    self.indexedLemmata[int(action['_id'][1:])] = (s['l_order'], s['rank_true'])
+            yield action
 
     def index_words(self):
         """
         Index all words that have been collected at the previous stage
         in self.words (while the sentences were being indexed).
         """
-        bulk(self.es, self.iterate_words(), chunk_size=1000, request_timeout=120)
-        if 'generate_dictionary' in self.settings and self.settings['generate_dictionary']:
-            self.generate_dictionary()
+        # Sorting is done before any bulk requests are sent, because
+        # it can start new processes
+        with self.telemetry.stage('sorting') as counts:
+            sortedWords = self.sort_words()
+            counts['words'] = len(self.wfs) + len(self.lemmata)
+        with self.telemetry.stage('words') as counts:
+            self.calculate_freq_ranks()
+            actions = self.iterate_words(sortedWords)
+            if self.incremental:
+                actions = self.filter_changed_words(actions)
+            counts['actions'] = self.loader.load(actions)
+            counts['word_types'] = sum(len(self.wordFreqs[i]) + len(self.lemmaFreqs[i])
+                                       for i in range(len(self.languages)))
+        for collation in self.collations.values():
+            collation.cache = {}
+        if self.incremental:
+            self.indexedQuantiles = [(langRanks[1], langRanks[3]) for langRanks in self.freqRanks]
+        self.freqRanks = None
+
+    def collect_para_ids(self, fname):
+        """
+        In the parallel corpus, read the sentences of a document before
+        indexing it and return, for each language, a dictionary
+        {para_id -> list of IDs of the sentences aligned with it}.
+        The sentences are numbered in the same way as in
+        iterate_sentences(); only their languages and alignment are
+        read (see get_para_alignment() of the reader), so that nothing
+        has to be kept until the entire document has been processed.
+        """
+        paraIDs = [{} for i in range(len(self.languages))]
+        sID = self.sID
+        for langID, sentParaIDs in self.iterSent.get_para_alignment(fname):
+            for sentParaID in sentParaIDs:
+                paraID = str(self.dID) + '_' + str(sentParaID)
+                try:
+                    paraIDs[langID][paraID].append(self.randomize_id(sID))
+                except KeyError:
+                    paraIDs[langID][paraID] = [self.randomize_id(sID)]
+            sID += 1
+        return paraIDs
 
-    def add_parallel_sids(self, sentences, paraIDs):
+    def add_parallel_sids(self, s, paraIDs):
         """
         In the parallel corpus, add the IDs of aligned sentences in other languages
-        to each sentence that has a para_id.
+        to a sentence that has a para_id. paraIDs is what collect_para_ids()
+        returned for the document.
         """
-        for s in sentences:
-            if 'para_alignment' not in s['_source'] or 'lang' not in s['_source']:
-                continue
-            langID = s['_source']['lang']
-            for pa in s['_source']['para_alignment']:
-                paraID = pa['para_id']
-                pa['sent_ids'] = []
-                for i in range(len(self.languages)):
-                    if i == langID:
-                        continue
-                    if paraID in paraIDs[i]:
-                        pa['sent_ids'] += paraIDs[i][paraID]
+        if 'para_alignment' not in s or 'lang' not in s:
+            return
+        langID = s['lang']
+        for pa in s['para_alignment']:
+            paraID = pa['para_id']
+            pa['sent_ids'] = []
+            for i in range(len(self.languages)):
+                if i == langID:
+                    continue
+                if paraID in paraIDs[i]:
+                    pa['sent_ids'] += paraIDs[i][paraID]
 
     def which_subcorpora(self, meta):
         """
@@ -1248,6 +1869,18 @@ class Indexator:
                 subcorpora.append(sub)
         return subcorpora
 
+    def choose_partition(self, langID, nWords):
+        """
+        Choose the partition where the next sentence should go. A large
+        corpus can be split into partitions for faster (and less precise)
+        queries. Sentences are added to one of the two smallest partitions.
+        """
+        smallPartitions = [p for p in sorted(self.wordsByPartition[langID],
+                                             key=lambda x: self.wordsByPartition[langID][x])][:2]
+        iPart = random.choice(smallPartitions)
+        self.wordsByPartition[langID][iPart] += nWords
+        return iPart
+
     def iterate_sentences(self, fname):
         curSentID = 0
         docMeta = self.iterSent.get_metadata(fname)
@@ -1263,6 +1896,9 @@ class Indexator:
             bSentIDSortEnabled = True
 
         if 'doc_to_sentence_meta' in self.settings:
+            # The metadata dictionary is cached by the reader and will be
+            # used for the document itself, so it should not change here
+            docMeta = copy.deepcopy(docMeta)
             self.add_meta_keywords(docMeta)
             docMeta = {k: v for k, v in docMeta.items()
                        if (k in self.settings['doc_to_sentence_meta']
@@ -1271,9 +1907,9 @@ class Indexator:
             docMeta = {}
         self.numSents = 0
         prevLast = False
-        sentences = []
-        paraIDs = [{} for i in range(len(self.languages))]
-        self.curWordDocFreqs = [{} for i in range(len(self.languages))]
+        if len(self.languages) > 1:
+            paraIDs = self.collect_para_ids(fname)
+        self.clear_doc_counts()
         for s, bLast in self.iterSent.get_sentences(fname):
             sRandomID = self.randomize_id(self.sID)
 
@@ -1298,7 +1934,7 @@ class Indexator:
                         if k not in s['meta']:
                             s['meta'][k] = v
             if 'words' in s:
-                sentAnaMeta = self.process_sentence_words(s['words'], langID, subcorpora)
+                sentAnaMeta = self.process_sentence_words(s['words'], langID)
                 s['n_words'] = sum(1 for w in s['words'] if 'wtype' in w and w['wtype'] == 'word')
                 if 'meta' not in s:
                     s['meta'] = {}
@@ -1316,53 +1952,246 @@ class Indexator:
                 for metaField in [mf for mf in s['meta'].keys() if not (mf.startswith('year') or mf.endswith('_kw'))]:
                     s['meta'][metaField + '_kw'] = s['meta'][metaField]
 
-            indexName = self.name + '.sentences'
-            iPart = 0       # split a large corpus into partitions for faster (and less precise) queries
-            if 'partitions' in self.settings and self.settings['partitions'] > 1:
-                smallPartitions = [p for p in sorted(self.wordsByPartition[langID],
-                                                     key=lambda x: self.wordsByPartition[langID][x])][:2]
-                iPart = random.choice(smallPartitions)
-                self.wordsByPartition[langID][iPart] += s['n_words']
-                indexName += '.' + str(iPart)
+            indexName = self.indexPrefix + '.sentences'
+            if ('partitions' in self.settings and self.settings['partitions'] > 1
+                    and not self.isWorker):
+                indexName += '.' + str(self.choose_partition(langID, s['n_words']))
             curAction = {'_index': indexName,
                          '_id': sRandomID,
                          '_source': s}
-            if len(self.languages) <= 1:
-                yield curAction
-            else:
-                sentences.append(curAction)
-                if 'para_alignment' in s:
-                    s['para_ids'] = []
-                    for pa in s['para_alignment']:
-                        paraID = str(self.dID) + '_' + str(pa['para_id'])
-                        pa['para_id'] = paraID
-                        s['para_ids'].append(paraID)
-                        try:
-                            paraIDs[langID][paraID].append(self.randomize_id(self.sID))
-                        except KeyError:
-                            paraIDs[langID][paraID] = [self.randomize_id(self.sID)]
-            if self.sID % 500 == 0:
+            if len(self.languages) > 1 and 'para_alignment' in s:
+                s['para_ids'] = []
+                for pa in s['para_alignment']:
+                    paraID = str(self.dID) + '_' + str(pa['para_id'])
+                    pa['para_id'] = paraID
+                    s['para_ids'].append(paraID)
+                self.add_parallel_sids(s, paraIDs)
+            yield curAction
+            if self.sID % 500 == 0 and not self.isWorker:
                 print('Indexing sentence', self.sID, ',', self.totalNumWords, 'words so far.')
             self.numSents += 1
             self.numSentsLang[langID] += 1
             self.sID += 1
-        if len(self.languages) > 1:
-            self.add_parallel_sids(sentences, paraIDs)
-            for s in sentences:
-                yield s
+        if not self.isWorker:
+            self.add_doc_counts(subcorpora)
+            self.store_doc_freqs()
+
+    def clear_doc_counts(self):
+        """
+        Prepare the word and lemma counters for a new document.
+        """
         for langID in range(len(self.languages)):
-            for itemID, freq in self.curWordDocFreqs[langID].items():
-                try:
-                    self.wordDIDs[langID][itemID].add(self.dID)
-                except KeyError:
-                    self.wordDIDs[langID][itemID] = {self.dID}
-                self.wordDocFreqs[langID][(itemID, self.dID)] = freq
+            self.curWordDocFreqs[langID].clear()
+            self.curWordDocSFreqs[langID].clear()
+            self.curLemmaDocFreqs[langID].clear()
+            self.curLemmaDocSFreqs[langID].clear()
+
+    def add_doc_counts(self, subcorpora, sign=1):
+        """
+        Add word and lemma counts of the current document to the
+        corpus-wide frequency tables (or subtract them if sign is -1).
+        """
+        for langID in range(len(self.languages)):
+            for docFreqs, docSFreqs, freqs, sFreqs, freqsSub in (
+                    (self.curWordDocFreqs[langID], self.curWordDocSFreqs[langID],
+                     self.wordFreqs[langID], self.wordSFreqs[langID], self.wordFreqsSub[langID]),
+                    (self.curLemmaDocFreqs[langID], self.curLemmaDocSFreqs[langID],
+                     self.lemmaFreqs[langID], self.lemmaSFreqs[langID], self.lemmaFreqsSub[langID])):
+                for itemNum, freq in docFreqs.items():
+                    freqs.add(itemNum, sign * freq)
+                    sFreqs.add(itemNum, sign * docSFreqs[itemNum])
+                    for sub in subcorpora:
+                        freqsSub[sub].add(itemNum, sign * freq)
+
+    def store_doc_freqs(self):
+        """
+        Add the frequencies of words and lemmata in the current document
+        to their postings lists.
+        """
+        for langID in range(len(self.languages)):
+            for wNum, freq in self.curWordDocFreqs[langID].items():
+                self.wordPostings[langID].add(wNum, self.dID, freq)
+            for lNum, freq in self.curLemmaDocFreqs[langID].items():
+                self.lemmaPostings[langID].add(lNum, self.dID, freq)
+
+    def process_doc_local(self, fname, fulltextID=None):
+        """
+        Process one document in a worker process: read its metadata,
+        check if it should be excluded, generate the HTML for full-text
+        view and process all sentences. The file is parsed only once,
+        and the main process does not read it at all.
+        Word, lemma, sentence and document IDs in the output are local
+        to the document: they are replaced with global ones in
+        merge_doc_data(). If full-text IDs are not persistent, the
+        main process hands them out (fulltextID), so that they are
+        unique across workers.
+        Return the metadata and the sentence actions together with the
+        partial frequency and ID tables collected for this document.
+        """
+        self.init_word_tables()
+        self.wfs = set()
+        self.lemmata = set()
+        self.sID = 0
+        self.sentID = 0
+        self.dID = 0
+        self.totalNumWords = 0
+        self.numWords = 0
+        self.numWordsLang = [0] * len(self.languages)
+        self.numSentsLang = [0] * len(self.languages)
+        if fulltextID is not None:
+            self.iterSent.nonpersistentID = fulltextID
+        self.iterSent.open_doc(fname)
+        meta = self.iterSent.get_metadata(fname)
+        if self.exclude_text(meta):
+            self.iterSent.close_doc()
+            return {'fname': fname, 'meta': meta, 'excluded': True}
+        nFulltextDocs = self.telemetry.counters.get('fulltext_docs', 0)
+        self.generate_fulltext(fname)
+        sentences = [s for s in self.iterate_sentences(fname)]
+        subcorpora = self.which_subcorpora(meta)
+        self.iterSent.close_doc()
+        return {
+            'fname': fname,
+            'meta': meta,
+            'excluded': False,
+            'fulltext_docs': self.telemetry.counters.get('fulltext_docs', 0) - nFulltextDocs,
+            'sentences': sentences,
+            'word_ids': [[(k, v) for k, v in self.tmpWordIDs[i].items()]
+                         for i in range(len(self.languages))],
+            'lemma_ids': [[(k, v) for k, v in self.tmpLemmaIDs[i].items()]
+                          for i in range(len(self.languages))],
+            'word2lemma': self.word2lemma,
+            'subcorpora': subcorpora,
+            'word_doc_freqs': [list(self.curWordDocFreqs[i].items()) for i in range(len(self.languages))],
+            'word_doc_sfreqs': [list(self.curWordDocSFreqs[i].items()) for i in range(len(self.languages))],
+            'lemma_doc_freqs': [list(self.curLemmaDocFreqs[i].items()) for i in range(len(self.languages))],
+            'lemma_doc_sfreqs': [list(self.curLemmaDocSFreqs[i].items()) for i in range(len(self.languages))],
+            'wfs': self.wfs,
+            'lemmata': self.lemmata,
+            'n_words': self.numWords,
+            'n_sents': self.numSents,
+            'n_words_lang': self.numWordsLang,
+            'n_sents_lang': self.numSentsLang
+        }
 
-    def index_sentences(self, fname):
+    @staticmethod
+    def map_item_ids(itemIDs, idMap):
         """
-        Index all sentences in a text.
+        Replace local word/lemma IDs with global ones. itemIDs can
+        be either a string or a list of strings.
         """
-        bulk(self.es, self.iterate_sentences(fname), chunk_size=1000, request_timeout=120)
+        if type(itemIDs) is str:
+            return idMap[itemIDs]
+        return [idMap[itemID] for itemID in itemIDs]
+
+    def merge_doc_data(self, docData):
+        """
+        Merge the data collected for one document in a worker process
+        (see process_doc_local()) into the global tables. The document
+        gets the next document ID, and new words and lemmata get their
+        IDs in the same order in which they would have got them if all
+        documents had been processed in the main process, so the IDs
+        and frequencies do not depend on the number of workers.
+        Return the list of sentence actions with global IDs.
+        """
+        nLangs = len(self.languages)
+        idMap = {'l0': 'l0'}
+        lemmaNumMap = {0: 0}
+        for localID, langID, lCleanTxt in sorted((v, langID, k) for langID in range(nLangs)
+                                                 for k, v in docData['lemma_ids'][langID]):
+            try:
+                lNum = self.tmpLemmaIDs[langID][lCleanTxt]
+            except KeyError:
+                lNum = self.new_lemma_id()
+                self.tmpLemmaIDs[langID][lCleanTxt] = lNum
+                self.tmpID2lemma[langID]['l' + str(lNum)] = lCleanTxt
+            idMap['l' + str(localID)] = 'l' + str(lNum)
+            lemmaNumMap[localID] = lNum
+
+        wordNumMap = {}
+
+        for localID, langID, wCleanTxt in sorted((v, langID, k) for langID in range(nLangs)
+                                                 for k, v in docData['word_ids'][langID]):
+            if '"l_id"' in wCleanTxt:
+                # Analyses in the JSON representation of the word
+                # contain lemma IDs, which have to be replaced as well
+                wClean = json.loads(wCleanTxt)
+                if 'ana' in wClean:
+                    for ana in wClean['ana']:
+                        if 'l_id' in ana:
+                            ana['l_id'] = idMap[ana['l_id']]
+                wCleanTxt = json.dumps(wClean, ensure_ascii=False, sort_keys=True)
+            if wCleanTxt in self.tmpWordIDs[langID]:
+                wNum = self.tmpWordIDs[langID][wCleanTxt]
+            else:
+                wNum = self.new_word_id()
+                self.tmpWordIDs[langID][wCleanTxt] = wNum
+            idMap['w' + str(localID)] = 'w' + str(wNum)
+            wordNumMap[localID] = wNum
+
+        self.clear_doc_counts()
+        for langID in range(nLangs):
+            for wID, lIDs in docData['word2lemma'][langID].items():
+                self.word2lemma[langID][idMap[wID]] = self.map_item_ids(lIDs, idMap)
+            for docCounts, counter, numMap in (
+                    (docData['word_doc_freqs'], self.curWordDocFreqs, wordNumMap),
+                    (docData['word_doc_sfreqs'], self.curWordDocSFreqs, wordNumMap),
+                    (docData['lemma_doc_freqs'], self.curLemmaDocFreqs, lemmaNumMap),
+                    (docData['lemma_doc_sfreqs'], self.curLemmaDocSFreqs, lemmaNumMap)):
+                for itemNum, freq in docCounts[langID]:
+                    counter[langID].add(numMap[itemNum], freq)
+        self.add_doc_counts(docData['subcorpora'])
+        self.store_doc_freqs()
+        self.wfs |= docData['wfs']
+        self.lemmata |= docData['lemmata']
+
+        bSentIDSortEnabled = ('sent_id_sort_enabled' in self.settings
+                              and self.settings['sent_id_sort_enabled'])
+        bPartitions = 'partitions' in self.settings and self.settings['partitions'] > 1
+        sentences = docData['sentences']
+        for curAction in sentences:
+            s = curAction['_source']
+            curAction['_id'] = self.randomize_id(self.sID + curAction['_id'])
+            for k in ('prev_id', 'next_id'):
+                if k in s:
+                    s[k] = self.randomize_id(self.sID + s[k])
+            s['doc_id'] = self.dID
+            if bSentIDSortEnabled:
+                s['sent_id'] += self.sentID
+            if nLangs > 1 and 'para_alignment' in s:
+                # Paragraph IDs start with the document ID, which is 0 in the worker
+                s['para_ids'] = [str(self.dID) + paraID[1:] for paraID in s['para_ids']]
+                for pa in s['para_alignment']:
+                    pa['para_id'] = str(self.dID) + pa['para_id'][1:]
+                    if 'sent_ids' in pa:
+                        pa['sent_ids'] = [self.randomize_id(self.sID + sID) for sID in pa['sent_ids']]
+            if 'words' in s:
+                for w in s['words']:
+                    if w['wtype'] != 'word':
+                        continue
+                    w['w_id'] = idMap[w['w_id']]
+                    w['l_id'] = self.map_item_ids(w['l_id'], idMap)
+                    if 'ana' in w:
+                        for ana in w['ana']:
+                            if 'l_id' in ana:
+                                ana['l_id'] = idMap[ana['l_id']]
+            if bPartitions:
+                curAction['_index'] = self.indexPrefix + '.sentences.' + str(self.choose_partition(s['lang'],
+                                                                                                   s['n_words']))
+            else:
+                curAction['_index'] = self.indexPrefix + '.sentences'
+        if (self.sID + len(sentences)) // 500 > self.sID // 500:
+            print('Indexing sentence', self.sID + len(sentences), ',',
+                  self.totalNumWords + docData['n_words'], 'words so far.')
+        self.sID += len(sentences)
+        if bSentIDSortEnabled:
+            self.sentID += len(sentences)
+        self.totalNumWords += docData['n_words']
+        self.numWords = docData['n_words']
+        self.numSents = docData['n_sents']
+        self.numWordsLang = docData['n_words_lang']
+        self.numSentsLang = docData['n_sents_lang']
+        return sentences
 
     def add_meta_keywords(self, meta):
         """
@@ -1375,13 +2204,140 @@ class Indexator:
                                   and meta in self.settings['integer_meta_fields']))]:
             meta[field + '_kw'] = meta[field]
 
-    def index_doc(self, fname):
+    def start_fulltext(self):
+        """
+        If full-text view is enabled, start the pool of processes that
+        generate the HTML, so that it is done in parallel with indexing.
+        The pool has to be started before any threads are, because the
+        processes are forked. For the same reason, no other processes
+        may be forked until finish_fulltext() is called, which is done
+        before the words are indexed. If the documents are processed by
+        several workers, they generate the HTML themselves, and no pool
+        is started, so that the workers are not forked while it is alive.
+        """
+        if (self.fulltextWorkers <= 0 or self.workers > 1 or self.fulltextPool is not None
+                or not ('fulltext_view_enabled' in self.settings
+                        and self.settings['fulltext_view_enabled'])):
+            return
+        self.fulltextPool = multiprocessing.Pool(processes=self.fulltextWorkers,
+                                                 initializer=init_fulltext_worker)
+        self.fulltextResults = []
+
+    def finish_fulltext(self):
+        """
+        Wait until the HTML for all documents has been generated
+        and stop the pool.
+        """
+        if self.fulltextPool is None:
+            return
+        print('Waiting for the full-text HTML generation to finish...')
+        with self.telemetry.stage('fulltext_wait') as counts:
+            self.fulltextPool.close()
+            self.fulltextPool.join()
+            self.wait_fulltext()
+            counts['docs'] = self.telemetry.counters.get('fulltext_docs', 0)
+        self.fulltextPool = None
+
+    def wait_fulltext(self):
+        """
+        Wait until the HTML for all documents queued so far has been
+        generated.
+        """
+        for result in self.fulltextResults:
+            # Raise the exceptions that occurred in the worker processes, if any
+            result.get()
+        self.fulltextResults = []
+
+    def fulltext_up_to_date(self, fname, fnameOut):
+        """
+        Check if the HTML for a document has been generated after the
+        document and the corpus settings were last changed.
+        """
+        if ('use_nonpersistent_fulltext_id' in self.settings
+                and self.settings['use_nonpersistent_fulltext_id']):
+            # Full-text IDs change with each run, so the old file may belong to a different document
+            return False
+        if not os.path.exists(fnameOut):
+            return False
+        tOut = os.path.getmtime(fnameOut)
+        return all(os.path.getmtime(f) < tOut
+                   for f in (fname,
+                             os.path.join(self.SETTINGS_DIR, 'corpus.json'),
+                             os.path.join(self.SETTINGS_DIR, 'categories.json')))
+
+    def generate_fulltext(self, fname):
+        """
+        If full-text view is enabled for the document, generate its HTML,
+        unless it is already up to date. If there is a pool of processes
+        for that, only add the document to its queue. Otherwise, this
+        has to be done before its metadata is stored, because the
+        metadata is shared with the indexator and changed in the process.
+        The HTML generator copies the sentences before changing them.
+        """
+        if not ('fulltext_view_enabled' in self.settings
+                and self.settings['fulltext_view_enabled']):
+            return
+        if self.fulltextPool is None:
+            # Does nothing if the file has already been parsed
+            self.iterSent.open_doc(fname)
+        meta = self.iterSent.get_metadata(fname)
+        if 'fulltext_id' not in meta:
+            return
+        fnameOut = os.path.join(self.fulltextDir, self.name, meta['fulltext_id'] + '.json')
+        if self.fulltext_up_to_date(fname, fnameOut):
+            return
+        self.telemetry.add('fulltext_docs')
+        if self.fulltextPool is not None:
+            self.fulltextResults.append(self.fulltextPool.apply_async(process_fulltext_worker,
+                                                                      ((fname, fnameOut),)))
+        else:
+            t1 = time.time()
+            self.j2h.process_file(fname, fnameOut)
+            self.telemetry.add('fulltext_seconds_in_main_process', time.time() - t1)
+
+    def generate_fulltext_only(self):
+        """
+        Only generate the HTML for full-text view for all documents whose
+        HTML is missing or out of date, without indexing anything.
+        """
+        if not ('fulltext_view_enabled' in self.settings
+                and self.settings['fulltext_view_enabled']):
+            print('Full-text view is not enabled for this corpus.')
+            return
+        if ('use_nonpersistent_fulltext_id' in self.settings
+                and self.settings['use_nonpersistent_fulltext_id']):
+            print('Full-text IDs are assigned anew at each indexation (use_nonpersistent_fulltext_id), '
+                  'so the HTML cannot be generated without indexing the corpus.')
+            return
+        t1 = time.time()
+        self.analyze_dir()
+        with self.telemetry.stage('fulltext') as counts:
+            self.start_fulltext()
+            for fname, fsize in sorted(self.filenames, key=lambda p: -p[1]):
+                meta = self.iterSent.get_metadata(fname)
+                if self.exclude_text(meta):
+                    continue
+                self.generate_fulltext(fname)
+                self.iterSent.close_doc()
+            self.finish_fulltext()
+            counts['docs'] = self.telemetry.counters.get('fulltext_docs', 0)
+        t2 = time.time()
+        print('Full-text HTML generated in', t2 - t1, 'seconds.')
+        self.write_telemetry('fulltext_only')
+
+    def index_doc(self, fname, meta=None):
         """
-        Store the metadata of the source file.
+        Store the metadata of the source file. If it has been read
+        in a worker process, it is passed as meta.
         """
         if self.dID % 100 == 0:
             print('Indexing document', self.dID)
-        meta = self.iterSent.get_metadata(fname)
+        if meta is None:
+            meta = self.iterSent.get_metadata(fname)
+        if self.incremental:
+            self.record_doc(fname, meta)
+        if self.checkpointInterval > 0:
+            self.processedFiles.add(fname)
         self.add_meta_keywords(meta)
         meta['n_words'] = self.numWords
         meta['n_sents'] = self.numSents
@@ -1394,16 +2350,7 @@ class Indexator:
         self.numSents = 0
         self.numWordsLang = [0] * len(self.languages)
         self.numSentsLang = [0] * len(self.languages)
-
-        if ('fulltext_view_enabled' in self.settings
-                and self.settings['fulltext_view_enabled']
-                and 'fulltext_id' in meta):
-            fnameOut = meta['fulltext_id'] + '.json'
-            self.j2h.process_file(fname,
-                                  os.path.join(self.fulltextDir,
-                                               self.name,
-                                               fnameOut))
-        curAction = {'_index': self.name + '.docs',
+        curAction = {'_index': self.indexPrefix + '.docs',
                      '_id': self.dID,
                      '_source': meta}
         # try:
@@ -1425,18 +2372,66 @@ class Indexator:
         return curAction
 
     def iterate_docs(self):
+        """
+        Iterate over the actions for all documents: the sentences
+        of each document are followed by its metadata.
+        """
+        if self.workers > 1:
+            for docAction in self.iterate_docs_parallel():
+                yield docAction
+            return
         for fname, fsize in sorted(self.filenames, key=lambda p: -p[1]):
             # print(fname, fsize)
             if 'sample_size' in self.settings and 0 < self.settings['sample_size'] < 1:
                 # Only take a random sample of the source files (for test purposes)
                 if random.random() > self.settings['sample_size']:
                     continue
+            # The file is read and parsed once: its metadata and
+            # sentences are kept by the reader until close_doc()
+            self.iterSent.open_doc(fname)
             meta = self.iterSent.get_metadata(fname)
             if self.exclude_text(meta):
                 print('Document excluded by meta:', fname)
+                self.iterSent.close_doc()
                 continue
-            self.index_sentences(fname)
+            self.generate_fulltext(fname)
+            for sentAction in self.iterate_sentences(fname):
+                yield sentAction
             yield self.index_doc(fname)
+            self.iterSent.close_doc()
+
+    def iterate_docs_parallel(self):
+        """
+        Same as iterate_docs(), but the documents are read and processed
+        in a pool of worker processes, which also generate the HTML for
+        full-text view. The results are merged in the main process in
+        the same order in which the documents would have been processed
+        sequentially. The main process does not read the files.
+        """
+        bNonpersistentFulltextID = ('use_nonpersistent_fulltext_id' in self.settings
+                                    and self.settings['use_nonpersistent_fulltext_id'])
+        tasks = []
+        for fname, fsize in sorted(self.filenames, key=lambda p: -p[1]):
+            if 'sample_size' in self.settings and 0 < self.settings['sample_size'] < 1:
+                # Only take a random sample of the source files (for test purposes)
+                if random.random() > self.settings['sample_size']:
+                    continue
+            fulltextID = None
+            if bNonpersistentFulltextID:
+                # Used by the worker if the document has no fulltext_id
+                fulltextID = self.iterSent.nonpersistentID
+                self.iterSent.nonpersistentID += random.randint(1, 100)
+            tasks.append((fname, fulltextID))
+        with multiprocessing.Pool(processes=self.workers, initializer=init_worker,
+                                  initargs=(self.sinkType,)) as pool:
+            for docData in pool.imap(process_doc_worker, tasks):
+                if docData['excluded']:
+                    print('Document excluded by meta:', docData['fname'])
+                    continue
+                self.telemetry.add('fulltext_docs', docData['fulltext_docs'])
+                for sentAction in self.merge_doc_data(docData):
+                    yield sentAction
+                yield self.index_doc(docData['fname'], docData['meta'])
 
     def exclude_text(self, meta):
         """
@@ -1457,17 +2452,22 @@ class Indexator:
         """
         self.filenames = []
         self.corpusSizeInBytes = 0
-        for root, dirs, files in os.walk(self.corpus_dir):
-            for fname in files:
-                if (not ((self.settings['input_format'] == 'json'
-                          and fname.lower().endswith('.json'))
-                         or (self.settings['input_format'] == 'json-gzip'
-                             and fname.lower().endswith('.json.gz')))):
-                    continue
-                fnameFull = os.path.join(root, fname)
-                fileSize = os.path.getsize(fnameFull)
-                self.corpusSizeInBytes += fileSize
-                self.filenames.append((fnameFull, fileSize))
+        with self.telemetry.stage('scan') as counts:
+            for root, dirs, files in os.walk(self.corpus_dir):
+                for fname in files:
+                    if (not ((self.settings['input_format'] == 'json'
+                              and fname.lower().endswith('.json'))
+                             or (self.settings['input_format'] == 'json-gzip'
+                                 and fname.lower().endswith('.json.gz'))
+                             or (self.settings['input_format'] == 'msgpack'
+                                 and fname.lower().endswith('.msgpack')))):
+                        continue
+                    fnameFull = os.path.join(root, fname)
+                    fileSize = os.path.getsize(fnameFull)
+                    self.corpusSizeInBytes += fileSize
+                    self.filenames.append((fnameFull, fileSize))
+            counts['files'] = len(self.filenames)
+            counts['megabytes'] = round(self.corpusSizeInBytes / 1048576, 1)
 
     def index_dir(self):
         """
@@ -1477,14 +2477,54 @@ class Indexator:
         when indexing large corpora, as the default behavior is to load
         the whole file is into memory, and there is more free memory
         in the beginning of the process. If MemoryError occurs, the
-        iterative JSON parser is used, which works much slower.
+        iterative JSON parser is used. With stream_json in the settings,
+        it is always used, and the size of the files does not matter.
         """
-        if len(self.filenames) <= 0:
+        if len(self.filenames) <= 0 and self.dID <= 0:
             print('There are no files in this corpus.')
             return
-        bulk(self.es, self.iterate_docs(), chunk_size=200, request_timeout=60)
+        self.start_fulltext()
+        dID, sID, nWords = self.dID, self.sID, self.totalNumWords
+        with self.telemetry.stage('sentences') as counts:
+            docActions = self.iterate_docs()
+            self.loader.load(self.iterate_until_checkpoint(docActions))
+            while self.checkpointDue:
+                self.save_checkpoint()
+                self.loader.load(self.iterate_until_checkpoint(docActions))
+            counts['docs'] = self.dID - dID
+            counts['sentences'] = self.sID - sID
+            counts['tokens'] = self.totalNumWords - nWords
+        # The words stage forks processes, which must not happen while
+        # the pool and its threads are alive
+        self.finish_fulltext()
+        if self.checkpoints_enabled():
+            # Only the words have to be indexed if the process stops after this
+            with self.telemetry.stage('checkpoint'):
+                self.save_checkpoint()
         self.index_words()
 
+    def checkpoints_enabled(self):
+        """
+        Checkpoints are only made when the corpus is indexed from scratch
+        into new versioned indices.
+        """
+        return self.checkpointInterval > 0 and self.indexPrefix != self.name
+
+    def iterate_until_checkpoint(self, actions):
+        """
+        Pass on the actions from an iterator until a checkpoint is due.
+        Stop after the metadata of a document, so that all actions
+        sent by then belong to completely processed documents.
+        """
+        self.checkpointDue = False
+        docIndex = self.indexPrefix + '.docs'
+        for action in actions:
+            yield action
+            if (action['_index'] == docIndex and self.checkpoints_enabled()
+                    and time.time() - self.tLastCheckpoint >= self.checkpointInterval):
+                self.checkpointDue = True
+                return
+
     def compile_translations(self):
         """
         Compile flask_babel translations in ../search/web_app.
@@ -1516,25 +2556,546 @@ class Indexator:
                 shutil.rmtree(self.fulltextDir)
             os.makedirs(self.fulltextDir)
 
-    def load_corpus(self):
+    def settings_hash(self):
         """
-        Drop the current database, if any, and load the entire corpus.
+        Return a hash of the corpus settings. An incremental update
+        is only possible if the settings have not changed since the
+        previous run.
+        """
+        h = hashlib.md5()
+        for fname in ('corpus.json', 'categories.json'):
+            with open(os.path.join(self.SETTINGS_DIR, fname), 'rb') as fIn:
+                h.update(fIn.read())
+        return h.hexdigest()
+
+    @staticmethod
+    def file_state(fname):
+        """
+        Return a tuple that changes whenever the file changes.
+        """
+        fileStat = os.stat(fname)
+        return fileStat.st_size, fileStat.st_mtime
+
+    @staticmethod
+    def dump_table(table, fOut, chunkSize=10000):
+        """
+        Write the contents of a (DB)dictionary to an open file in
+        chunks, so that large tables do not have to be copied in memory.
+        Frequency arrays and row arrays are pickled as a whole, which
+        stores the arrays as bytes.
+        """
+        if type(table) in (FreqArray, RowArray):
+            pickle.dump(table.__dict__, fOut, protocol=pickle.HIGHEST_PROTOCOL)
+            return
+        chunk = []
+        for k, v in table.items():
+            chunk.append((k, v))
+            if len(chunk) >= chunkSize:
+                pickle.dump(chunk, fOut)
+                chunk = []
+        pickle.dump(chunk, fOut)
+        pickle.dump(None, fOut)
+
+    @staticmethod
+    def load_table(table, fIn):
+        """
+        Read the contents of a (DB)dictionary written by dump_table().
+        """
+        if type(table) in (FreqArray, RowArray):
+            table.__dict__.update(pickle.load(fIn))
+            return
+        while True:
+            chunk = pickle.load(fIn)
+            if chunk is None:
+                return
+            for k, v in chunk:
+                table[k] = v
+
+    def state_tables(self):
+        """
+        Return all tables that have to be saved between runs in
+        incremental mode, in a fixed order.
+        """
+        tables = []
+        for langID in range(len(self.languages)):
+            tables += [self.tmpWordIDs[langID], self.tmpLemmaIDs[langID], self.tmpID2lemma[langID],
+                       self.word2lemma[langID], self.wordFreqs[langID], self.wordSFreqs[langID],
+                       self.lemmaFreqs[langID], self.lemmaSFreqs[langID]]
+            tables += [self.wordFreqsSub[langID][sub] for sub in sorted(self.subcorpora)]
+            tables += [self.lemmaFreqsSub[langID][sub] for sub in sorted(self.subcorpora)]
+        tables += [self.indexedWords, self.indexedLemmata]
+        return tables
+
+    def postings_stores(self):
+        """
+        Return all postings stores in a fixed order. They are saved
+        separately from the other tables (see PostingsStore.save()).
+        """
+        return self.wordPostings + self.lemmaPostings
+
+    def remove_unused_runs(self, postingsDir, savedStores):
+        """
+        Remove the runs of postings stores saved in postingsDir that
+        are not referred to by savedStores any more.
+        """
+        usedRuns = PostingsStore.saved_files(savedStores)
+        for fname in os.listdir(postingsDir):
+            if fname not in usedRuns:
+                os.remove(os.path.join(postingsDir, fname))
+
+    def start_doc_log(self):
+        """
+        Open a new file where word frequencies of each indexed document
+        are stored, so that they can be subtracted later if the document
+        changes or is deleted.
+        """
+        if not os.path.exists(self.stateDir):
+            os.makedirs(self.stateDir)
+        self.fDocLog = open(os.path.join(self.stateDir, 'docs.pickle.tmp'), 'wb')
+
+    def record_doc(self, fname, meta):
+        """
+        Incremental mode: store the contribution of the current document
+        to the word and lemma frequencies.
+        """
+        docRecord = {
+            'fname': fname,
+            'd_id': self.dID,
+            'subcorpora': self.which_subcorpora(meta),
+            'n_words': self.numWords,
+            'words': [[(wNum, freq, self.curWordDocSFreqs[langID][wNum])
+                       for wNum, freq in self.curWordDocFreqs[langID].items()]
+                      for langID in range(len(self.languages))],
+            'lemmata': [[(lNum, freq, self.curLemmaDocSFreqs[langID][lNum])
+                         for lNum, freq in self.curLemmaDocFreqs[langID].items()]
+                        for langID in range(len(self.languages))]
+        }
+        if 'fulltext_id' in meta:
+            docRecord['fulltext_id'] = meta['fulltext_id']
+        pickle.dump(docRecord, self.fDocLog)
+        self.docStates[fname] = self.file_state(fname)
+        for langID in range(len(self.languages)):
+            self.touchedItems |= set('w' + str(wNum) for wNum in self.curWordDocFreqs[langID])
+            self.touchedItems |= set('l' + str(lNum) for lNum in self.curLemmaDocFreqs[langID])
+
+    def remove_doc(self, docRecord):
+        """
+        Incremental mode: subtract the contribution of a document indexed
+        during a previous run from the word and lemma frequencies.
+        """
+        dID = docRecord['d_id']
+        self.clear_doc_counts()
+        for langID in range(len(self.languages)):
+            for wNum, freq, sFreq in docRecord['words'][langID]:
+                self.curWordDocFreqs[langID].add(wNum, freq)
+                self.curWordDocSFreqs[langID].add(wNum, sFreq)
+            for lNum, freq, sFreq in docRecord['lemmata'][langID]:
+                self.curLemmaDocFreqs[langID].add(lNum, freq)
+                self.curLemmaDocSFreqs[langID].add(lNum, sFreq)
+        self.add_doc_counts(docRecord['subcorpora'], sign=-1)
+        for langID in range(len(self.languages)):
+            self.wordPostings[langID].remove_doc(dID)
+            self.lemmaPostings[langID].remove_doc(dID)
+            for prefix, docFreqs, freqs in (('w', self.curWordDocFreqs[langID], self.wordFreqs[langID]),
+                                            ('l', self.curLemmaDocFreqs[langID], self.lemmaFreqs[langID])):
+                for itemNum in docFreqs:
+                    itemID = prefix + str(itemNum)
+                    self.touchedItems.add(itemID)
+                    if itemNum not in freqs:
+                        self.removedItems[langID].add(itemID)
+        self.clear_doc_counts()
+        self.totalNumWords -= docRecord['n_words']
+        if 'fulltext_id' in docRecord:
+            fnameHtml = os.path.join(self.fulltextDir, self.name, docRecord['fulltext_id'] + '.json')
+            if os.path.exists(fnameHtml):
+                os.remove(fnameHtml)
+
+    def delete_docs(self, docIDs, chunkSize=1000):
+        """
+        Incremental mode: delete documents indexed during a previous run,
+        together with their sentences and word_freq objects, from the database.
+        """
+        for iStart in range(0, len(docIDs), chunkSize):
+            curDocIDs = docIDs[iStart:iStart + chunkSize]
+            self.loader.delete_by_query(self.indexPrefix + '.sentences*',
+                                        {'query': {'terms': {'doc_id': curDocIDs}}})
+            self.loader.delete_by_query(self.indexPrefix + '.words',
+                                        {'query': {'bool': {'must': [
+                                            {'term': {'wtype': 'word_freq'}},
+                                            {'terms': {'d_id': curDocIDs}}
+                                        ]}}})
+        self.loader.load(({'_op_type': 'delete',
+                           '_index': self.indexPrefix + '.docs',
+                           '_id': dID} for dID in docIDs))
+
+    def save_state(self):
+        """
+        Incremental mode: save word and lemma IDs, frequency tables and
+        counters after indexing, so that the next run could only index
+        new and changed files.
+        """
+        if not os.path.exists(self.stateDir):
+            os.makedirs(self.stateDir)
+        print('Saving indexing state to ' + self.stateDir + '...')
+        fnameState = os.path.join(self.stateDir, 'state.pickle')
+        postingsDir = os.path.join(self.stateDir, 'postings')
+        with open(fnameState + '.tmp', 'wb') as fOut:
+            savedStores = self.dump_state(fOut, postingsDir)
+        self.fDocLog.close()
+        self.fDocLog = None
+        os.replace(os.path.join(self.stateDir, 'docs.pickle.tmp'),
+                   os.path.join(self.stateDir, 'docs.pickle'))
+        os.replace(fnameState + '.tmp', fnameState)
+        self.remove_unused_runs(postingsDir, savedStores)
+
+    def load_state(self):
+        """
+        Incremental mode: load the state saved after the previous run.
+        Return False if there is no usable state or no existing corpus
+        to update, True otherwise.
+        """
+        fnameState = os.path.join(self.stateDir, 'state.pickle')
+        if not os.path.exists(fnameState) or not os.path.exists(os.path.join(self.stateDir, 'docs.pickle')):
+            print('No saved state found in ' + self.stateDir + ', indexing the entire corpus.')
+            return False
+        if not self.loader.index_exists(self.name + '.words'):
+            print('The corpus database does not exist, indexing the entire corpus.')
+            return False
+        with open(fnameState, 'rb') as fIn:
+            state = pickle.load(fIn)
+            if state['settings_hash'] != self.settings_hash():
+                print('Corpus settings have changed since the previous run, indexing the entire corpus.')
+                return False
+            if any(k not in state for k in ('id_seed', 'postings', 'indexedQuantiles')):
+                print('The state was saved by an older version of the indexator, indexing the entire corpus.')
+                return False
+            print('Loading indexing state from ' + self.stateDir + '...')
+            self.restore_state(state, fIn, os.path.join(self.stateDir, 'postings'))
+        return True
+
+    def dump_state(self, fOut, postingsDir, extraState=None):
+        """
+        Write the counters, word and lemma IDs and frequency tables
+        to an open file. Values from the extraState dictionary are
+        stored together with the counters. The runs of the postings
+        stores are linked into postingsDir, so that only the new ones
+        are written. Return the list of dictionaries describing the
+        saved postings stores (see PostingsStore.save()).
+        """
+        state = {
+            'settings_hash': self.settings_hash(),
+            'sID': self.sID,
+            'dID': self.dID,
+            'sentID': self.sentID,
+            'totalNumWords': self.totalNumWords,
+            'id_seed': self.idPermutation.seed,
+            'wordsByPartition': self.wordsByPartition,
+            'docStates': self.docStates,
+            'wfs': self.wfs,
+            'lemmata': self.lemmata,
+            'indexedQuantiles': self.indexedQuantiles
+        }
+        if extraState is not None:
+            state.update(extraState)
+        state['postings'] = [store.save(postingsDir) for store in self.postings_stores()]
+        pickle.dump(state, fOut)
+        for table in self.state_tables():
+            self.dump_table(table, fOut)
+        return state['postings']
+
+    def restore_state(self, state, fIn, postingsDir):
+        """
+        Restore the counters from a dictionary written by dump_state()
+        and read the tables that follow it in the file. The postings
+        stores are restored from the runs saved in postingsDir.
+        """
+        for k in ('sID', 'dID', 'sentID', 'totalNumWords', 'wordsByPartition',
+                  'docStates', 'wfs', 'lemmata', 'indexedQuantiles'):
+            setattr(self, k, state[k])
+        self.idPermutation = IDPermutation(state['id_seed'])
+        for table in self.state_tables():
+            self.load_table(table, fIn)
+        for store, savedStore in zip(self.postings_stores(), state['postings']):
+            store.load(postingsDir, savedStore)
+        self.nWordIDs = sum(len(self.tmpWordIDs[i]) for i in range(len(self.languages)))
+        self.nLemmaIDs = sum(len(self.tmpLemmaIDs[i]) for i in range(len(self.languages)))
+
+    def save_checkpoint(self):
+        """
+        Save everything needed to continue indexing from the current
+        document if the process stops: the state saved in incremental
+        mode, the list of files that have already been sent and the
+        names of the indices. This is only called when all actions sent
+        so far have been acknowledged by Elasticsearch.
         """
         t1 = time.time()
-        # self.compile_translations()
-        indicesDeleted = self.delete_indices()
-        if not indicesDeleted:
+        if not os.path.exists(self.stateDir):
+            os.makedirs(self.stateDir)
+        # Files whose HTML is not ready yet would not be processed again
+        self.wait_fulltext()
+        docLogSize = None
+        if self.fDocLog is not None:
+            self.fDocLog.flush()
+            docLogSize = self.fDocLog.tell()
+        fnameCheckpoint = os.path.join(self.stateDir, 'checkpoint.pickle')
+        postingsDir = os.path.join(self.stateDir, 'checkpoint_postings')
+        with open(fnameCheckpoint + '.tmp', 'wb') as fOut:
+            savedStores = self.dump_state(fOut, postingsDir, {
+                'index_prefix': self.indexPrefix,
+                'query_settings': self.querySettings,
+                'processed_files': self.processedFiles,
+                'random_state': random.getstate(),
+                'doc_log_size': docLogSize
+            })
+        os.replace(fnameCheckpoint + '.tmp', fnameCheckpoint)
+        self.remove_unused_runs(postingsDir, savedStores)
+        self.tLastCheckpoint = time.time()
+        print('Checkpoint saved after', self.dID, 'documents in',
+              round(self.tLastCheckpoint - t1, 1), 'seconds.')
+
+    def load_checkpoint(self):
+        """
+        Load the last checkpoint of an interrupted indexation. Return
+        False if there is no usable checkpoint, True otherwise.
+        """
+        fnameCheckpoint = os.path.join(self.stateDir, 'checkpoint.pickle')
+        if not os.path.exists(fnameCheckpoint):
+            print('No checkpoint found in ' + self.stateDir + ', indexing the entire corpus.')
+            return False
+        with open(fnameCheckpoint, 'rb') as fIn:
+            state = pickle.load(fIn)
+            if state['settings_hash'] != self.settings_hash():
+                print('Corpus settings have changed since the checkpoint, indexing the entire corpus.')
+                return False
+            if any(k not in state for k in ('id_seed', 'postings', 'indexedQuantiles')):
+                print('The checkpoint was made by an older version of the indexator, indexing the entire corpus.')
+                return False
+            if (state['doc_log_size'] is not None) != self.incremental:
+                print('The checkpoint was made with a different --incremental option, '
+                      'indexing the entire corpus.')
+                return False
+            if not (self.loader.index_exists(state['index_prefix'] + '.docs')
+                    and self.loader.index_exists(state['index_prefix'] + '.words')):
+                print('The indices the checkpoint refers to do not exist, indexing the entire corpus.')
+                return False
+            print('Loading the checkpoint from ' + self.stateDir + '...')
+            self.restore_state(state, fIn, os.path.join(self.stateDir, 'checkpoint_postings'))
+        self.indexPrefix = state['index_prefix']
+        self.querySettings = state['query_settings']
+        self.processedFiles = state['processed_files']
+        random.setstate(state['random_state'])
+        if self.incremental:
+            # Discard the records of the documents processed after the checkpoint
+            self.fDocLog = open(os.path.join(self.stateDir, 'docs.pickle.tmp'), 'r+b')
+            self.fDocLog.truncate(state['doc_log_size'])
+            self.fDocLog.seek(state['doc_log_size'])
+        return True
+
+    def remove_checkpoint(self):
+        fnameCheckpoint = os.path.join(self.stateDir, 'checkpoint.pickle')
+        if os.path.exists(fnameCheckpoint):
+            os.remove(fnameCheckpoint)
+        shutil.rmtree(os.path.join(self.stateDir, 'checkpoint_postings'), ignore_errors=True)
+
+    def resume_corpus(self):
+        """
+        Continue an interrupted indexation from the last checkpoint:
+        index the files that had not been sent by then into the same
+        indices, then index the words and switch the aliases.
+        """
+        self.analyze_dir()
+        nFiles = len(self.filenames)
+        self.filenames = [(fname, fsize) for fname, fsize in self.filenames
+                          if fname not in self.processedFiles]
+        print(nFiles - len(self.filenames), 'files were indexed before the checkpoint,',
+              len(self.filenames), 'files remain.')
+        self.tBulkLoadStart = time.time()
+        self.index_dir()
+        self.finish_bulk_load()
+        self.warm_up()
+        self.switch_aliases()
+        self.remove_checkpoint()
+
+    def remove_state(self):
+        """
+        Remove the state saved after the previous run, which becomes
+        obsolete as soon as the corpus is indexed anew.
+        """
+        for fname in ('state.pickle', 'docs.pickle'):
+            if os.path.exists(os.path.join(self.stateDir, fname)):
+                os.remove(os.path.join(self.stateDir, fname))
+        shutil.rmtree(os.path.join(self.stateDir, 'postings'), ignore_errors=True)
+
+    def write_telemetry(self, mode):
+        """
+        Write the telemetry report of the run. Unless a filename was given,
+        it is stored next to the saved state of the corpus, with the time
+        when the run started as its name, so that the reports of
+        different runs can be compared.
+        """
+        fname = self.telemetryFile
+        if fname is None:
+            fname = os.path.join(self.stateDir, 'telemetry',
+                                 time.strftime('%Y%m%d-%H%M%S', time.localtime(self.telemetry.tStart)) + '.json')
+        info = {
+            'corpus_name': self.name,
+            'index_prefix': self.indexPrefix,
+            'mode': mode,
+            'workers': self.workers,
+            'fulltext_workers': self.fulltextWorkers,
+            'docs': self.dID,
+            'sentences': self.sID,
+            'tokens': self.totalNumWords,
+            'bulk': {k: {'actions': v[0], 'megabytes': round(v[1] / 1048576, 1), 'seconds': round(v[2], 3),
+                         'action_sizes': self.loader.actionSizes[k].summary()}
+                     for k, v in self.loader.stats.items()}
+        }
+        self.telemetry.write_report(fname, info)
+
+    def update_corpus(self):
+        """
+        Incremental mode: remove the data of changed and deleted files,
+        index new and changed files and update the words index.
+        """
+        self.analyze_dir()
+        changedFiles = set(fname for fname, fsize in self.filenames
+                           if fname in self.docStates and self.docStates[fname] != self.file_state(fname))
+        removedFiles = changedFiles | (set(self.docStates) - set(fname for fname, fsize in self.filenames))
+        self.filenames = [(fname, fsize) for fname, fsize in self.filenames
+                          if fname not in self.docStates or fname in changedFiles]
+        print(len(self.filenames) - len(changedFiles), 'new files,',
+              len(changedFiles), 'changed files,',
+              len(removedFiles) - len(changedFiles), 'deleted files.')
+
+        # Records of unchanged documents are copied to the new log
+        self.start_doc_log()
+        removedDocIDs = []
+        with open(os.path.join(self.stateDir, 'docs.pickle'), 'rb') as fIn:
+            while True:
+                try:
+                    docRecord = pickle.load(fIn)
+                except EOFError:
+                    break
+                if docRecord['fname'] in removedFiles:
+                    self.remove_doc(docRecord)
+                    removedDocIDs.append(docRecord['d_id'])
+                else:
+                    pickle.dump(docRecord, self.fDocLog)
+        for fname in removedFiles:
+            del self.docStates[fname]
+        if len(removedDocIDs) > 0:
+            self.delete_docs(removedDocIDs)
+        if len(self.filenames) > 0:
+            self.index_dir()
+        else:
+            self.index_words()
+
+    def export_corpus(self):
+        """
+        Process the entire corpus and write all bulk actions, together
+        with the index mappings, to the export directory instead of
+        sending them to Elasticsearch. The result can be loaded later
+        with load_export().
+        """
+        t1 = time.time()
+        if self.incremental:
+            print('Incremental indexing is not possible when exporting to files.')
+            return
+        if os.path.exists(self.exportDir) and len(os.listdir(self.exportDir)) > 0:
+            print('The directory ' + self.exportDir + ' is not empty.')
             return
         self.analyze_dir()
         self.create_indices()
         self.clean_dirs()
         self.index_dir()
+        self.loader.write_manifest(self.name, self.index_mappings())
+        t2 = time.time()
+        print('Corpus exported to', self.exportDir, 'in', t2 - t1, 'seconds:',
+              self.dID, 'documents,',
+              self.sID, 'sentences,',
+              self.totalNumWords, 'words.')
+        self.loader.print_action_sizes()
+        self.write_telemetry('export')
+
+    def load_export(self, dirName):
+        """
+        Load bulk actions written by export_corpus() into new versioned
+        indices and switch the aliases to them, without processing
+        the corpus files again.
+        """
+        t1 = time.time()
+        manifest = BulkArchiveWriter.read_manifest(dirName)
+        if manifest['corpus_name'] != self.name:
+            print('The directory ' + dirName + ' contains the corpus "' + manifest['corpus_name']
+                  + '", but the corpus in the settings is "' + self.name + '".')
+            return
+        if not self.delete_indices():
+            return
+        self.indexPrefix = self.new_index_version()
+        if set(self.corpus_indices()) != set(self.indexPrefix + '.' + index for index in manifest['indices']):
+            print('The number of partitions in the settings differs from that in ' + dirName + '.')
+            return
+        for index, mapping in manifest['indices'].items():
+            self.loader.create_index(self.indexPrefix + '.' + index,
+                                     mappings=mapping['mappings'],
+                                     settings=mapping['settings'])
+        self.start_bulk_load()
+        with self.telemetry.stage('load_export') as counts:
+            counts['actions'] = self.loader.load_shards([(self.indexPrefix + '.' + index, fname)
+                                                         for index, fname in BulkArchiveWriter.list_shards(dirName)],
+                                                        BulkArchiveWriter.iterate_shard)
+        self.finish_bulk_load()
+        self.warm_up()
+        self.switch_aliases()
+        t2 = time.time()
+        print('Corpus loaded from', dirName, 'in', t2 - t1, 'seconds.')
+        self.loader.print_action_sizes()
+        self.write_telemetry('load_export')
+
+    def load_corpus(self):
+        """
+        Drop the current database, if any, and load the entire corpus.
+        In incremental mode, if there is a saved state from a previous
+        run, only index new and changed files instead.
+        """
+        t1 = time.time()
+        # self.compile_translations()
+        if self.resume and self.load_checkpoint():
+            mode = 'resume'
+            self.resume_corpus()
+        elif self.incremental and self.load_state():
+            mode = 'incremental'
+            self.update_corpus()
+        else:
+            mode = 'full'
+            indicesDeleted = self.delete_indices()
+            if not indicesDeleted:
+                return
+            self.remove_state()
+            self.remove_checkpoint()
+            self.analyze_dir()
+            self.indexPrefix = self.new_index_version()
+            self.create_indices()
+            self.start_bulk_load()
+            self.clean_dirs()
+            if self.incremental:
+                self.start_doc_log()
+            self.index_dir()
+            self.finish_bulk_load()
+            self.warm_up()
+            self.switch_aliases()
+            self.remove_checkpoint()
+        if self.incremental:
+            self.save_state()
         t2 = time.time()
         print('Corpus indexed in', t2-t1, 'seconds:',
               self.dID, 'documents,',
               self.sID, 'sentences,',
               self.totalNumWords, 'words,',
-              sum(len(self.wordFreqs[i]) for i in range(len(self.languages))), 'word types (different words).')
+              sum(len(self.wordFreqs[i]) + len(self.lemmaFreqs[i]) for i in range(len(self.languages))),
+              'word types (different words).')
+        self.loader.print_action_sizes()
+        self.write_telemetry(mode)
         if DEBUG:
             print('*** Memory usage: ***')
             for k, v in sorted(self.__dict__.items(), key=lambda x: (-asizeof.asizeof(x[1]), x[0])):
@@ -1542,12 +3103,147 @@ class Indexator:
                     print(k + ': ' + sizeof_fmt(asizeof.asizeof(v)))
 
 
+workerIndexator = None     # Indexator instance used in a worker process
+
+
+def init_worker(sink):
+    """
+    Initialize a worker process for parallel document processing.
+    Workers send nothing to the sink, but its type tells them whether
+    the Elasticsearch settings have to be checked.
+    """
+    global workerIndexator
+    workerIndexator = Indexator(isWorker=True, sink=sink)
+
+
+def process_doc_worker(task):
+    """
+    Process one document in a worker process. task is a tuple
+    (filename, full-text ID or None).
+    """
+    fname, fulltextID = task
+    return workerIndexator.process_doc_local(fname, fulltextID)
+
+
+def words_worker(indexator, langID, sortedWords, actionQueue, batchSize):
+    """
+    Put the actions for the words and lemmata of one language to
+    the queue in batches in a forked process. A batch never separates
+    a word or lemma from its word_freq objects. After the last batch,
+    the telemetry of the process is put as a dictionary, followed by None.
+    The traceback is put instead if an error occurs.
+    """
+    try:
+        for tables in (indexator.tmpWordIDs, indexator.tmpLemmaIDs, indexator.tmpID2lemma):
+            tables[langID].reopen()
+        nStages = len(indexator.telemetry.stages)
+        nEvents = len(indexator.telemetry.events)
+        with indexator.telemetry.stage('words_' + indexator.languages[langID]) as counts:
+            batch = []
+            nActions = 0
+            for action in indexator.iterate_lang_words(langID, sortedWords):
+                if len(batch) >= batchSize and '_routing' not in action:
+                    actionQueue.put((langID, batch))
+                    batch = []
+                batch.append(action)
+                nActions += 1
+            actionQueue.put((langID, batch))
+            counts['actions'] = nActions
+        actionQueue.put((langID, {'stages': indexator.telemetry.stages[nStages:],
+                                  'events': indexator.telemetry.events[nEvents:]}))
+        actionQueue.put((langID, None))
+    except Exception:
+        actionQueue.put((langID, traceback.format_exc()))
+
+
+workerJ2H = None     # JSON2HTML instance used in a worker process
+
+
+def init_fulltext_worker():
+    """
+    Initialize a worker process for full-text HTML generation.
+    """
+    global workerJ2H
+    with open(os.path.join(Indexator.SETTINGS_DIR, 'corpus.json'),
+              'r', encoding='utf-8') as fSettings:
+        settings = json.load(fSettings)
+    workerJ2H = JSON2HTML(settings=settings)
+
+
+def process_fulltext_worker(task):
+    """
+    Generate the HTML for one document in a worker process. task is
+    a tuple (source filename, output filename).
+    """
+    fnameIn, fnameOut = task
+    workerJ2H.iterSent.open_doc(fnameIn)
+    workerJ2H.process_file(fnameIn, fnameOut)
+    workerJ2H.iterSent.close_doc()
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Index corpus in Elasticsearch 7.x.')
     parser.add_argument('-y', help='overwrite existing database without asking first')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of processes that read and process the documents')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only index new and changed files, using the state saved after the previous run')
+    parser.add_argument('--fulltext-workers', type=int, default=2,
+                        help='number of processes that generate the HTML for full-text view '
+                             '(0 to do it in the main process)')
+    parser.add_argument('--fulltext-only', action='store_true',
+                        help='only generate the HTML for full-text view for documents where it is missing or out of date')
+    parser.add_argument('--max-segments', type=int, default=1,
+                        help='number of segments each index is force-merged to after indexing (0 to skip force merge)')
+    parser.add_argument('--warmup-queries',
+                        help='JSON file with the queries sent to the new indices before they replace the old ones')
+    parser.add_argument('--export',
+                        help='write all bulk actions as compressed NDJSON files to this directory '
+                             'instead of loading them into Elasticsearch')
+    parser.add_argument('--sink', choices=['es', 'null'], default='es',
+                        help='where the data goes: Elasticsearch (es) or nowhere (null, for measuring '
+                             'how fast the data is prepared without Elasticsearch)')
+    parser.add_argument('--load-export',
+                        help='load bulk actions previously written with --export from this directory')
+    parser.add_argument('--checkpoint-minutes', type=float, default=30,
+                        help='save a checkpoint of a full indexation this often (0 to switch checkpoints off)')
+    parser.add_argument('--resume', action='store_true',
+                        help='continue an interrupted indexation from the last checkpoint')
+    parser.add_argument('--telemetry',
+                        help='write the report with the time and memory spent at each stage to this JSON file '
+                             '(by default, it is written to /index_state/<corpus_name>/telemetry)')
+    parser.add_argument('--bulk-threads', type=int, default=2,
+                        help='number of bulk requests sent to Elasticsearch concurrently')
+    parser.add_argument('--bulk-chunk-size', type=int, default=1000,
+                        help='maximum number of actions in one bulk request')
+    parser.add_argument('--bulk-chunk-mb', type=float, default=10,
+                        help='maximum size of one bulk request in megabytes')
+    parser.add_argument('--bulk-retries', type=int, default=5,
+                        help='number of times a request rejected by an overloaded Elasticsearch is sent again')
     args = parser.parse_args()
     overwrite = False
     if args.y is not None:
         overwrite = True
-    x = Indexator(overwrite)
-    x.load_corpus()
+    bulkOptions = {
+        'nThreads': args.bulk_threads,
+        'chunkSize': args.bulk_chunk_size,
+        'maxChunkBytes': int(args.bulk_chunk_mb * 1024 * 1024),
+        'maxRetries': args.bulk_retries
+    }
+    warmupQueries = None
+    if args.warmup_queries is not None:
+        with open(args.warmup_queries, 'r', encoding='utf-8') as fWarmup:
+            warmupQueries = json.load(fWarmup)
+    x = Indexator(overwrite, workers=args.workers, incremental=args.incremental,
+                  bulkOptions=bulkOptions, fulltextWorkers=args.fulltext_workers,
+                  maxSegments=args.max_segments, warmupQueries=warmupQueries,
+                  exportDir=args.export, checkpointMinutes=args.checkpoint_minutes,
+                  resume=args.resume, telemetryFile=args.telemetry, sink=args.sink)
+    if args.fulltext_only:
+        x.generate_fulltext_only()
+    elif args.export is not None:
+        x.export_corpus()
+    elif args.load_export is not None:
+        x.load_export(args.load_export)
+    else:
+        x.load_corpus()
@@ -1,9 +1,11 @@
 import os
 import sys
+import copy
 import json
 import re
 from werkzeug.utils import secure_filename
 from json_doc_reader import JSONDocReader
+from msgpack_doc_reader import MsgpackDocReader
 
 sys.path.insert(0, '../search/web_app')
 from corpus_settings import CorpusSettings
@@ -27,7 +29,11 @@ class JSON2HTML:
         if self.settings.input_format in ['json', 'json-gzip']:
             self.iterSent = JSONDocReader(format=self.settings.input_format,
                                           settings=settings)
-        self.lastSentNum = 0  # for the IDs in the HTML
+        elif self.settings.input_format == 'msgpack':
+            self.iterSent = MsgpackDocReader(format=self.settings.input_format,
+                                             settings=settings)
+        self.lastSentNum = 0  # for the IDs in the HTML, unique within a document
+        self.copySentences = False  # whether the reader is shared, so that the sentences must not be changed
 
     def finalize_html_sentence(self, sent):
         """
@@ -73,8 +79,15 @@ class JSON2HTML:
         """
         htmlByTier = [[]]
         nTier = 0
+        # Sentences are numbered within the document, so that the
+        # documents can be processed independently of each other
+        self.lastSentNum = 0
         paraIDsByTier = [set()]
         for s, bLast in self.iterSent.get_sentences(fnameIn):
+            if self.copySentences:
+                # The reader keeps the sentences for the indexator,
+                # but they are changed when the HTML is generated
+                s = copy.deepcopy(s)
             if 'lang' in s:
                 langID = s['lang']
             else:
@@ -157,8 +170,8 @@ class JSON2HTML:
             dataFinal['rows'].append(self.finalize_html_paragraph(curParagraph, colClass, curSentID))
             curPointers[0] += 1
 
-        if not os.path.exists(os.path.dirname(fnameOut)):
-            os.makedirs(os.path.dirname(fnameOut))
+        # Several processes can generate the HTML at the same time
+        os.makedirs(os.path.dirname(fnameOut), exist_ok=True)
         with open(fnameOut, 'w', encoding='utf-8') as fOut:
             json.dump(dataFinal, fOut, indent=1, ensure_ascii=False)
 
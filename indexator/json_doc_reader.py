@@ -10,6 +10,10 @@ class JSONDocReader:
     An instance of this class is used by the indexator to iterate
     through sentences read from corpus files in tsakorpus native
     JSON format.
+    By default, each file is parsed as a whole. If stream_json is
+    set in the settings, the sentences are always read one by one with
+    an iterative parser, so that the memory used does not depend on
+    the size of the documents.
     """
     def __init__(self, format, settings):
         self.filesize_limit = -1
@@ -17,8 +21,14 @@ class JSONDocReader:
         self.format = format
         self.lastDocMeta = None         # for lazy calculations
         self.settings = settings
+        self.streaming = ('stream_json' in settings and settings['stream_json'])
+        if self.streaming and ijson.backend not in ('yajl2_c', 'yajl2_cffi'):
+            print('Warning: the C backend of ijson is not available, '
+                  'reading sentences iteratively will be slow.')
         self.nonpersistentID = random.randint(1, 100)
         self.sentID = 0
+        self.docFileName = ''           # name of the file parsed by open_doc()
+        self.docSentences = None        # its sentences
 
     @staticmethod
     def insert_meta_year(metadata):
@@ -44,6 +54,91 @@ class JSONDocReader:
             if 'year_to' not in metadata:
                 metadata['year_to'] = metadata['year']
 
+    def open_file(self, fname):
+        """
+        Open a corpus file for reading, decompressing it if needed.
+        Return None if the format is not supported.
+        """
+        if self.format == 'json':
+            return open(fname, 'r', encoding='utf-8-sig')
+        elif self.format == 'json-gzip':
+            return gzip.open(fname, 'rt', encoding='utf-8-sig')
+        return None
+
+    def open_file_binary(self, fname):
+        """
+        Open a corpus file for reading with the iterative parser, which
+        works faster with bytes, and skip the byte order mark, if any.
+        Return None if the format is not supported.
+        """
+        if self.format == 'json':
+            fIn = open(fname, 'rb')
+        elif self.format == 'json-gzip':
+            fIn = gzip.open(fname, 'rb')
+        else:
+            return None
+        if fIn.read(3) != b'\xef\xbb\xbf':
+            fIn.seek(0)
+        return fIn
+
+    def finalize_metadata(self, metadata):
+        """
+        Add the fields calculated from the metadata of a newly read
+        document and remember it as the metadata of the current document.
+        """
+        if ('fulltext_id' not in metadata
+                and 'use_nonpersistent_fulltext_id' in self.settings
+                and self.settings['use_nonpersistent_fulltext_id']):
+            metadata['fulltext_id'] = str(self.nonpersistentID)
+            self.nonpersistentID += random.randint(1, 100)
+        self.lastDocMeta = metadata
+        self.insert_meta_year(metadata)
+
+    def open_doc(self, fname):
+        """
+        Start a parse session for one document: read, decompress and
+        parse the file once and keep it in memory until close_doc() is
+        called. Until then, get_metadata() and get_sentences() return
+        the data of this document without reading the file again, so
+        that the indexator and the full-text HTML generator can share it.
+        If the file is too large or does not fit in memory, or if the
+        sentences are always read iteratively, do nothing: it will be
+        read by get_sentences() as before.
+        """
+        if fname == self.docFileName:
+            return
+        self.close_doc()
+        if self.streaming or os.stat(fname).st_size > self.filesize_limit > 0:
+            return
+        fIn = self.open_file(fname)
+        if fIn is None:
+            return
+        try:
+            doc = json.load(fIn)
+        except MemoryError:
+            print('Memory error when reading', fname, ', trying iterative JSON parser (will work slowly).')
+            return
+        finally:
+            fIn.close()
+        self.docFileName = fname
+        self.docSentences = doc.get('sentences', [])
+        if fname == self.lastFileName and self.lastDocMeta is not None:
+            # The metadata has already been read by get_metadata()
+            return
+        self.lastFileName = fname
+        # Non-scalar values are replaced with None, the same
+        # way as when the metadata is read by get_metadata()
+        metadata = {k: (None if type(v) in (list, dict) else v)
+                    for k, v in doc.get('meta', {}).items()}
+        self.finalize_metadata(metadata)
+
+    def close_doc(self):
+        """
+        End the parse session started by open_doc() and free the memory.
+        """
+        self.docFileName = ''
+        self.docSentences = None
+
     def get_metadata(self, fname):
         """
         If the file is not too large, return its metadata.
@@ -53,11 +148,8 @@ class JSONDocReader:
         if fname == self.lastFileName and self.lastDocMeta is not None:
             return self.lastDocMeta
         self.lastFileName = fname
-        if self.format == 'json':
-            fIn = open(fname, 'r', encoding='utf-8-sig')
-        elif self.format == 'json-gzip':
-            fIn = gzip.open(fname, 'rt', encoding='utf-8-sig')
-        else:
+        fIn = self.open_file_binary(fname)
+        if fIn is None:
             return {}
         metadata = {}
         curMetaField = ''
@@ -69,14 +161,8 @@ class JSONDocReader:
                 metadata[curMetaField] = value
             elif (prefix, event) == ('meta', 'end_map'):
                 break
-        if ('fulltext_id' not in metadata
-                and 'use_nonpersistent_fulltext_id' in self.settings
-                and self.settings['use_nonpersistent_fulltext_id']):
-            metadata['fulltext_id'] = str(self.nonpersistentID)
-            self.nonpersistentID += random.randint(1, 100)
-        self.lastDocMeta = metadata
         fIn.close()
-        self.insert_meta_year(metadata)
+        self.finalize_metadata(metadata)
         return metadata
 
     def insert_doc_level_meta(self, sentence):
@@ -103,48 +189,105 @@ class JSONDocReader:
         self.sentID += 1
         sentence['sent_id_local'] = self.sentID
 
+    def iterate_doc_sentences(self, sentences):
+        """
+        Iterate through a list of sentences of the current document.
+        """
+        for i in range(len(sentences)):
+            self.insert_doc_level_meta(sentences[i])
+            self.insert_local_sent_id(sentences[i])
+            if i < len(sentences) - 1:
+                yield sentences[i], False
+            else:
+                yield sentences[i], True
+                return
+
+    def stream_doc_sentences(self, fname):
+        """
+        Iterate through the sentences of a file with the iterative parser,
+        keeping only two of them in memory. Each sentence is returned
+        once the next one has been read, so that it is known whether
+        it is the last one.
+        """
+        fIn = self.open_file_binary(fname)
+        if fIn is None:
+            return
+        with fIn:
+            prevSent = None
+            for sentence in ijson.items(fIn, 'sentences.item', use_float=True):
+                self.insert_doc_level_meta(sentence)
+                self.insert_local_sent_id(sentence)
+                if prevSent is not None:
+                    yield prevSent, False
+                prevSent = sentence
+            if prevSent is not None:
+                yield prevSent, True
+
+    def get_para_alignment(self, fname):
+        """
+        If the file is not too large, iterate through its sentences
+        and return, for each of them, a tuple (language ID, list of
+        its para_ids), which is all that is needed to align the
+        sentences of a parallel corpus. If a parse session has been
+        started for this file with open_doc(), take them from memory.
+        Otherwise, the file is read with the iterative parser, but no
+        sentences are built, so this is much faster than get_sentences().
+        """
+        if os.stat(fname).st_size > self.filesize_limit > 0:
+            return
+        if fname == self.docFileName:
+            for s in self.docSentences:
+                yield (s['lang'] if 'lang' in s else 0,
+                       [pa['para_id'] for pa in s['para_alignment'] if 'para_id' in pa]
+                       if 'para_alignment' in s else [])
+            return
+        fIn = self.open_file_binary(fname)
+        if fIn is None:
+            return
+        with fIn:
+            langID = 0
+            paraIDs = []
+            for prefix, event, value in ijson.parse(fIn, use_float=True):
+                if prefix == 'sentences.item.para_alignment.item.para_id':
+                    paraIDs.append(value)
+                elif prefix == 'sentences.item.lang':
+                    langID = value
+                elif prefix == 'sentences.item' and event == 'end_map':
+                    yield langID, paraIDs
+                    langID = 0
+                    paraIDs = []
+
     def get_sentences(self, fname):
         """
         If the file is not too large, iterate through its
-        sentences.
+        sentences. If a parse session has been started for this
+        file with open_doc(), take them from memory.
         """
         if os.stat(fname).st_size > self.filesize_limit > 0:
             return
         self.sentID = 0
         self.get_metadata(fname)
-        if self.format == 'json':
-            fIn = open(fname, 'r', encoding='utf-8-sig')
-        elif self.format == 'json-gzip':
-            fIn = gzip.open(fname, 'rt', encoding='utf-8-sig')
-        else:
+        if fname == self.docFileName:
+            for s, bLast in self.iterate_doc_sentences(self.docSentences):
+                yield s, bLast
+            return
+        if self.streaming:
+            for s, bLast in self.stream_doc_sentences(fname):
+                yield s, bLast
+            return
+        fIn = self.open_file(fname)
+        if fIn is None:
             return {}, True
         try:
             doc = json.load(fIn)
-            fIn.close()
-            for i in range(len(doc['sentences'])):
-                self.insert_doc_level_meta(doc['sentences'][i])
-                self.insert_local_sent_id(doc['sentences'][i])
-                if i < len(doc['sentences']) - 1:
-                    yield doc['sentences'][i], False
-                else:
-                    yield doc['sentences'][i], True
-                    return
         except MemoryError:
             print('Memory error when reading', fname, ', trying iterative JSON parser (will work slowly).')
+            doc = None
+        finally:
             fIn.close()
-            if self.format == 'json':
-                fIn = open(fname, 'r', encoding='utf-8-sig')
-            elif self.format == 'json-gzip':
-                fIn = gzip.open(fname, 'rt', encoding='utf-8-sig')
-            else:
-                return {}, True
-            prevSent = {}
-            for sentence in ijson.items(fIn, 'sentences.item'):
-                self.insert_doc_level_meta(sentence)
-                self.insert_local_sent_id(sentence)
-                if prevSent != {}:
-                    yield prevSent, False
-                prevSent = sentence
-            fIn.close()
-            yield prevSent, True
+        if doc is None:
+            for s, bLast in self.stream_doc_sentences(fname):
+                yield s, bLast
             return
+        for s, bLast in self.iterate_doc_sentences(doc['sentences']):
+            yield s, bLast
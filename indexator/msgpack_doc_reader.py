@@ -0,0 +1,227 @@
+"""
+Binary corpus format (input_format "msgpack") and its reader.
+A file contains one document:
+    bytes 0-7     the signature (MsgpackDocReader.SIGNATURE);
+    bytes 8-15    the offset of the sentence table (unsigned, little-endian);
+    then records, each of them a 4-byte length followed by a msgpack-encoded
+    object: first the document without its sentences (i.e. {"meta": ...}),
+    then the sentences in their original order;
+    the sentence table: the number of sentences (4 bytes) and the offset
+    of each sentence record (8 bytes each).
+The sentences are the same dictionaries as in the JSON format. Files are
+read through mmap, and any sentence can be read without reading the
+preceding ones. Usage (from the indexator directory), to convert JSON
+files to this format:
+    python3 msgpack_doc_reader.py ../corpus/my_corpus_json ../corpus/my_corpus
+"""
+import os
+import re
+import sys
+import json
+import gzip
+import mmap
+import struct
+try:
+    import msgpack
+except ImportError:
+    # Only needed for the msgpack input format
+    msgpack = None
+from json_doc_reader import JSONDocReader
+
+
+def write_msgpack_doc(fname, doc):
+    """
+    Write a document (a dictionary with the metadata and the sentences,
+    as in the JSON format) to a file in the binary format.
+    """
+    if msgpack is None:
+        raise ImportError('The msgpack module is needed for writing binary corpus files.')
+    header = {k: v for k, v in doc.items() if k != 'sentences'}
+    sentences = doc.get('sentences', [])
+    offsets = []
+    with open(fname, 'wb') as fOut:
+        fOut.write(MsgpackDocReader.SIGNATURE + struct.pack('<Q', 0))
+        for obj in [header] + sentences:
+            offsets.append(fOut.tell())
+            record = msgpack.packb(obj, use_bin_type=True)
+            fOut.write(struct.pack('<I', len(record)))
+            fOut.write(record)
+        tableOffset = fOut.tell()
+        fOut.write(struct.pack('<I', len(sentences)))
+        fOut.write(struct.pack('<' + str(len(sentences)) + 'Q', *offsets[1:]))
+        fOut.seek(len(MsgpackDocReader.SIGNATURE))
+        fOut.write(struct.pack('<Q', tableOffset))
+
+
+class MsgpackDocReader(JSONDocReader):
+    """
+    Iterates through sentences read from corpus files in the binary
+    format, like JSONDocReader does for JSON files. The file of the
+    current document stays memory-mapped until close_doc() is called
+    or another file is read, so that its sentences can also be
+    accessed by their number with get_sentence().
+    """
+    SIGNATURE = b'TSAKMP01'
+
+    def __init__(self, format, settings):
+        if msgpack is None:
+            raise ImportError('The msgpack module is needed for reading binary corpus files.')
+        super().__init__(format, settings)
+        self.mappedFileName = ''    # name of the memory-mapped file
+        self.fMapped = None
+        self.mm = None
+        self.tableOffset = 0
+        self.nSentences = 0
+
+    def open_doc(self, fname):
+        """
+        Map the file to memory and read its metadata. Unlike JSON files,
+        the sentences are only deserialized when they are needed.
+        """
+        self.map_file(fname)
+        if fname == self.lastFileName and self.lastDocMeta is not None:
+            return
+        self.get_metadata(fname)
+
+    def close_doc(self):
+        if self.mm is not None:
+            self.mm.close()
+            self.fMapped.close()
+        self.mappedFileName = ''
+        self.fMapped = None
+        self.mm = None
+
+    def map_file(self, fname):
+        if fname == self.mappedFileName:
+            return
+        self.close_doc()
+        self.fMapped = open(fname, 'rb')
+        self.mm = mmap.mmap(self.fMapped.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.mm[:len(self.SIGNATURE)] != self.SIGNATURE:
+            self.close_doc()
+            raise ValueError(fname + ' is not a binary corpus file.')
+        self.mappedFileName = fname
+        self.tableOffset = struct.unpack_from('<Q', self.mm, len(self.SIGNATURE))[0]
+        self.nSentences = struct.unpack_from('<I', self.mm, self.tableOffset)[0]
+
+    def read_record(self, offset):
+        length = struct.unpack_from('<I', self.mm, offset)[0]
+        return msgpack.unpackb(self.mm[offset + 4:offset + 4 + length], raw=False, strict_map_key=False)
+
+    def get_metadata(self, fname):
+        """
+        If the file is not too large, return its metadata.
+        """
+        if os.stat(fname).st_size > self.filesize_limit > 0:
+            return
+        if fname == self.lastFileName and self.lastDocMeta is not None:
+            return self.lastDocMeta
+        self.map_file(fname)
+        self.lastFileName = fname
+        header = self.read_record(len(self.SIGNATURE) + 8)
+        # Non-scalar values are replaced with None, as in JSON files
+        metadata = {k: (None if type(v) in (list, dict) else v)
+                    for k, v in header.get('meta', {}).items()}
+        self.finalize_metadata(metadata)
+        return metadata
+
+    def get_sentence(self, fname, iSent):
+        """
+        Return the sentence number iSent of the file. Document-level
+        metadata and local sentence IDs are added to it in the same way
+        as when the sentences are read one after another.
+        """
+        self.get_metadata(fname)
+        self.map_file(fname)
+        if not 0 <= iSent < self.nSentences:
+            raise IndexError('Sentence ' + str(iSent) + ' not found in ' + fname + '.')
+        offset = struct.unpack_from('<Q', self.mm, self.tableOffset + 4 + 8 * iSent)[0]
+        sentence = self.read_record(offset)
+        self.insert_doc_level_meta(sentence)
+        if 'fulltext_id' in self.lastDocMeta:
+            sentence['sent_id_local'] = iSent + 1
+        return sentence
+
+    def get_para_alignment(self, fname):
+        """
+        If the file is not too large, iterate through its sentences
+        and return, for each of them, a tuple (language ID, list of
+        its para_ids). The sentence records are found through the
+        table, and only these two keys are deserialized.
+        """
+        if os.stat(fname).st_size > self.filesize_limit > 0:
+            return
+        self.map_file(fname)
+        offsets = struct.unpack_from('<' + str(self.nSentences) + 'Q', self.mm, self.tableOffset + 4)
+        for offset in offsets:
+            length = struct.unpack_from('<I', self.mm, offset)[0]
+            unpacker = msgpack.Unpacker(raw=False, strict_map_key=False)
+            unpacker.feed(self.mm[offset + 4:offset + 4 + length])
+            langID = 0
+            paraIDs = []
+            for i in range(unpacker.read_map_header()):
+                key = unpacker.unpack()
+                if key == 'lang':
+                    langID = unpacker.unpack()
+                elif key == 'para_alignment':
+                    paraIDs = [pa['para_id'] for pa in unpacker.unpack() if 'para_id' in pa]
+                else:
+                    unpacker.skip()
+            yield langID, paraIDs
+
+    def get_sentences(self, fname, iStart=0, iEnd=None):
+        """
+        If the file is not too large, iterate through its sentences,
+        starting from iStart and ending before iEnd (if given). The
+        sentences are read one after another, without using the table.
+        """
+        if os.stat(fname).st_size > self.filesize_limit > 0:
+            return
+        self.get_metadata(fname)
+        self.map_file(fname)
+        if iEnd is None or iEnd > self.nSentences:
+            iEnd = self.nSentences
+        if iStart >= iEnd:
+            return
+        offset = struct.unpack_from('<Q', self.mm, self.tableOffset + 4 + 8 * iStart)[0]
+        self.sentID = iStart
+        for iSent in range(iStart, iEnd):
+            length = struct.unpack_from('<I', self.mm, offset)[0]
+            sentence = msgpack.unpackb(self.mm[offset + 4:offset + 4 + length], raw=False, strict_map_key=False)
+            offset += 4 + length
+            self.insert_doc_level_meta(sentence)
+            self.insert_local_sent_id(sentence)
+            yield sentence, iSent == iEnd - 1
+
+
+def convert_dir(dirIn, dirOut):
+    """
+    Convert all JSON and gzipped JSON files in a directory tree to the
+    binary format, keeping the structure of subdirectories.
+    """
+    rxExt = re.compile('\\.json(\\.gz)?$', flags=re.I)
+    nFiles = 0
+    for root, dirs, files in os.walk(dirIn):
+        for fname in files:
+            if rxExt.search(fname) is None:
+                continue
+            fnameIn = os.path.join(root, fname)
+            fnameOut = os.path.join(dirOut, os.path.relpath(fnameIn, dirIn))
+            fnameOut = rxExt.sub('.msgpack', fnameOut)
+            os.makedirs(os.path.dirname(fnameOut), exist_ok=True)
+            if fname.lower().endswith('.gz'):
+                fIn = gzip.open(fnameIn, 'rt', encoding='utf-8-sig')
+            else:
+                fIn = open(fnameIn, 'r', encoding='utf-8-sig')
+            with fIn:
+                doc = json.load(fIn)
+            write_msgpack_doc(fnameOut, doc)
+            nFiles += 1
+    print(nFiles, 'files converted.')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print('Usage: python3 msgpack_doc_reader.py <directory with JSON files> <output directory>')
+        sys.exit(1)
+    convert_dir(sys.argv[1], sys.argv[2])
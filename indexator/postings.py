@@ -0,0 +1,315 @@
+import os
+import heapq
+import pickle
+import shutil
+from array import array
+
+
+class PostingsStore:
+    """
+    Postings lists of words or lemmata: for each item (integer ID),
+    the IDs of the documents where it occurs, in increasing order, and
+    its frequencies in these documents. For each item, the postings
+    have to be added in the order of document IDs, which is the case
+    when the documents are indexed one after another.
+    New postings are kept in memory in three flat arrays until there
+    are maxCount of them. After that, they are grouped by item and written
+    to disk as a run. Runs are stored in columnar form: for each block of
+    items, there are arrays of item IDs, numbers of postings, delta-encoded
+    document IDs and frequencies. When the words index is built, the runs
+    are read sequentially and merged item by item.
+    Runs never change once they have been written, so the store can be
+    saved between runs (see save()) by linking them rather than copying.
+    """
+    MAX_RUNS = 64           # number of runs after which they are merged into one
+    BLOCK_SIZE = 10000      # approximate number of postings pickled together
+    TYPECODES = [(tc, 256 ** array(tc).itemsize) for tc in ('B', 'H', 'I', 'Q')]
+
+    def __init__(self, maxCount=1000000, dbName='tmp'):
+        self.itemIDs = array('I')
+        self.docIDs = array('I')
+        self.freqs = array('I')
+        self.maxCount = maxCount
+        self.dbName = dbName
+        self.runs = []              # filenames of the runs, oldest first
+        self.nRunsWritten = 0
+        self.removedDocs = set()    # IDs of documents whose postings should be ignored
+        self.l = 0
+        self.savedRuns = set()      # paths of the runs already saved by save() or read by load()
+
+    def __len__(self):
+        """
+        Return the number of postings added (including removed ones).
+        """
+        return self.l
+
+    def add(self, itemID, docID, freq):
+        self.itemIDs.append(itemID)
+        self.docIDs.append(docID)
+        self.freqs.append(freq)
+        self.l += 1
+        if len(self.itemIDs) >= self.maxCount:
+            self.flush()
+
+    def __setitem__(self, key, freq):
+        """
+        Add a posting with a key (itemID, docID), the way the pairs
+        are read from items().
+        """
+        self.add(key[0], key[1], freq)
+
+    def remove_doc(self, docID):
+        """
+        Ignore all postings of a document from now on.
+        """
+        self.removedDocs.add(docID)
+
+    def compact_array(self, values):
+        """
+        Store non-negative integers in an array of the smallest type they fit in.
+        """
+        maxValue = max(values, default=0)
+        for typecode, limit in self.TYPECODES:
+            if maxValue < limit:
+                return array(typecode, values)
+        raise ValueError('Integer too large: ' + str(maxValue))
+
+    def write_block(self, block, fOut):
+        """
+        Write a list of (itemID, docIDs, freqs) tuples as one
+        pickled block of columns.
+        """
+        itemIDs = []
+        counts = []
+        deltas = []
+        freqs = []
+        for itemID, itemDocIDs, itemFreqs in block:
+            itemIDs.append(itemID)
+            counts.append(len(itemDocIDs))
+            prevDocID = 0
+            for docID in itemDocIDs:
+                deltas.append(docID - prevDocID)
+                prevDocID = docID
+            freqs += itemFreqs
+        pickle.dump((self.compact_array(itemIDs), self.compact_array(counts),
+                     self.compact_array(deltas), self.compact_array(freqs)),
+                    fOut, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def write_run(self, groups, fname):
+        """
+        Write (itemID, docIDs, freqs) tuples sorted by item ID to a run file.
+        """
+        with open(fname, 'wb') as fOut:
+            block = []
+            blockSize = 0
+            for group in groups:
+                block.append(group)
+                blockSize += len(group[1])
+                if blockSize >= self.BLOCK_SIZE:
+                    self.write_block(block, fOut)
+                    block = []
+                    blockSize = 0
+            if len(block) > 0:
+                self.write_block(block, fOut)
+
+    @staticmethod
+    def read_run(fname):
+        """
+        Iterate over (itemID, docIDs, freqs) tuples stored in a run file.
+        """
+        with open(fname, 'rb') as fIn:
+            while True:
+                try:
+                    itemIDs, counts, deltas, freqs = pickle.load(fIn)
+                except EOFError:
+                    return
+                iPosting = 0
+                for iItem in range(len(itemIDs)):
+                    docIDs = []
+                    docID = 0
+                    for delta in deltas[iPosting:iPosting + counts[iItem]]:
+                        docID += delta
+                        docIDs.append(docID)
+                    yield itemIDs[iItem], docIDs, freqs[iPosting:iPosting + counts[iItem]].tolist()
+                    iPosting += counts[iItem]
+
+    def new_run_name(self):
+        self.nRunsWritten += 1
+        return self.dbName + '_' + str(self.nRunsWritten) + '.postings'
+
+    def iterate_buffer(self):
+        """
+        Iterate over (itemID, docIDs, freqs) tuples kept in memory,
+        sorted by item ID.
+        """
+        # The sort is stable, so the postings of each item stay
+        # in the order of document IDs
+        order = sorted(range(len(self.itemIDs)), key=self.itemIDs.__getitem__)
+        group = None
+        for i in order:
+            if group is None or group[0] != self.itemIDs[i]:
+                if group is not None:
+                    yield group
+                group = (self.itemIDs[i], [], [])
+            group[1].append(self.docIDs[i])
+            group[2].append(self.freqs[i])
+        if group is not None:
+            yield group
+
+    def flush(self):
+        """
+        Write the postings kept in memory to disk as a new run.
+        """
+        if len(self.itemIDs) <= 0:
+            return
+        fname = self.new_run_name()
+        self.write_run(self.iterate_buffer(), fname)
+        self.runs.append(fname)
+        self.itemIDs = array('I')
+        self.docIDs = array('I')
+        self.freqs = array('I')
+        if len(self.runs) >= self.MAX_RUNS:
+            self.merge_runs()
+
+    def merge_groups(self, groupIterators):
+        """
+        Merge iterators over (itemID, docIDs, freqs) tuples, oldest first,
+        joining the postings of each item and leaving out removed documents.
+        """
+        curGroup = None
+        # heapq.merge is stable: of the groups with equal item IDs,
+        # those from earlier (older) iterators come first
+        for itemID, docIDs, freqs in heapq.merge(*groupIterators, key=lambda g: g[0]):
+            if curGroup is None or curGroup[0] != itemID:
+                if curGroup is not None and len(curGroup[1]) > 0:
+                    yield curGroup
+                curGroup = (itemID, [], [])
+            if len(self.removedDocs) <= 0:
+                curGroup[1].extend(docIDs)
+                curGroup[2].extend(freqs)
+                continue
+            for docID, freq in zip(docIDs, freqs):
+                if docID not in self.removedDocs:
+                    curGroup[1].append(docID)
+                    curGroup[2].append(freq)
+        if curGroup is not None and len(curGroup[1]) > 0:
+            yield curGroup
+
+    def merge_runs(self):
+        """
+        Merge all runs written so far into one.
+        """
+        fname = self.new_run_name()
+        self.write_run(self.merge_groups([self.read_run(run) for run in self.runs]), fname)
+        for run in self.runs:
+            os.remove(run)
+        self.runs = [fname]
+
+    def iterate_groups(self):
+        """
+        Iterate over (itemID, docIDs, freqs) tuples for all items
+        in the order of item IDs.
+        """
+        return self.merge_groups([self.read_run(run) for run in self.runs] + [self.iterate_buffer()])
+
+    def items(self):
+        """
+        Iterate over all ((itemID, docID), freq) pairs in the order
+        of item IDs.
+        """
+        for itemID, docIDs, freqs in self.iterate_groups():
+            for docID, freq in zip(docIDs, freqs):
+                yield (itemID, docID), freq
+
+    @staticmethod
+    def link_file(fnameSrc, fnameDst):
+        """
+        Make a hard link to a file, or copy it if that is impossible
+        (e.g. the files are on different devices).
+        """
+        if os.path.exists(fnameDst):
+            os.remove(fnameDst)
+        try:
+            os.link(fnameSrc, fnameDst)
+        except OSError:
+            shutil.copyfile(fnameSrc, fnameDst)
+
+    def save(self, dirName):
+        """
+        Write the postings kept in memory to disk as a new run and link
+        all runs into dirName. Runs linked there earlier are not linked
+        again. Return a dictionary with everything load() needs.
+        The caller has to remove the files that are no longer needed
+        (see saved_files()) once the dictionary has been stored.
+        """
+        self.flush()
+        os.makedirs(dirName, exist_ok=True)
+        for run in self.runs:
+            fnameSaved = os.path.join(dirName, os.path.basename(run))
+            if fnameSaved not in self.savedRuns or not os.path.exists(fnameSaved):
+                self.link_file(run, fnameSaved)
+                self.savedRuns.add(fnameSaved)
+        return {
+            'runs': [os.path.basename(run) for run in self.runs],
+            'n_runs_written': self.nRunsWritten,
+            'removed_docs': self.removedDocs,
+            'len': self.l
+        }
+
+    @staticmethod
+    def saved_files(savedStores):
+        """
+        Return the set of filenames of the runs the dictionaries returned
+        by save() refer to.
+        """
+        return set(run for savedStore in savedStores for run in savedStore['runs'])
+
+    def load(self, dirName, savedStore):
+        """
+        Replace the contents of the store with the one saved by save()
+        to dirName.
+        """
+        self.clear()
+        for run in savedStore['runs']:
+            fnameSaved = os.path.join(dirName, run)
+            fname = os.path.join(os.path.dirname(self.dbName), run)
+            self.link_file(fnameSaved, fname)
+            self.savedRuns.add(fnameSaved)
+            self.runs.append(fname)
+        self.nRunsWritten = savedStore['n_runs_written']
+        self.removedDocs = savedStore['removed_docs']
+        self.l = savedStore['len']
+
+    def clear(self):
+        """
+        Remove all data, including the run files.
+        """
+        for run in self.runs:
+            if os.path.exists(run):
+                os.remove(run)
+        self.runs = []
+        self.itemIDs = array('I')
+        self.docIDs = array('I')
+        self.freqs = array('I')
+        self.removedDocs = set()
+        self.l = 0
+
+
+class PostingsReader:
+    """
+    Reads the postings from a PostingsStore sequentially. The items
+    have to be requested in increasing order of their IDs.
+    """
+    def __init__(self, store):
+        self.groups = store.iterate_groups()
+        self.nextGroup = next(self.groups, None)
+
+    def get(self, itemID):
+        """
+        Return the list of (docID, freq) pairs for the item.
+        """
+        while self.nextGroup is not None and self.nextGroup[0] < itemID:
+            self.nextGroup = next(self.groups, None)
+        if self.nextGroup is None or self.nextGroup[0] != itemID:
+            return []
+        return list(zip(self.nextGroup[1], self.nextGroup[2]))
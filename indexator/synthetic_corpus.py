@@ -0,0 +1,260 @@
+"""
+Generate a synthetic corpus in the tsakorpus JSON format, together
+with the corpus.json and categories.json needed to index it. The
+corpus is meant for measuring the performance of the indexator:
+its size, the number of languages, the share of ambiguous words,
+the number of analyses per word and parallel alignment can be set,
+and the same parameters and seed always produce the same corpus.
+Word frequencies follow Zipf's law, like in natural texts.
+Usage (from the indexator directory):
+    python3 synthetic_corpus.py ../benchmark_work --docs 200 --languages 2 --parallel
+The documents are written to <dir>/corpus/<corpus name> and the
+settings to <dir>/conf.
+"""
+import os
+import json
+import gzip
+import random
+import argparse
+from itertools import accumulate
+
+
+class SyntheticCorpus:
+    """
+    Generates documents with random words. Each language has its own
+    vocabulary of lexemes, each with a part of speech, a translation
+    and a set of inflected forms; inflected forms of different lexemes
+    may coincide, which, together with lexemes that share their lemma,
+    makes some words ambiguous.
+    """
+    SYLLABLES = ['ka', 'to', 'mi', 'ra', 'ne', 'su', 'lo', 'vi', 'de', 'pu',
+                 'sha', 'gu', 'ny', 'zo', 'che', 'li', 'bo', 'em', 'ar', 'ut']
+    POS = ['N', 'V', 'A', 'ADV', 'PRO']
+    CASES = ['nom', 'gen', 'acc', 'dat', 'loc', 'ins']
+    NUMBERS = ['sg', 'pl']
+    TENSES = ['prs', 'pst', 'fut']
+    PERSONS = ['1', '2', '3']
+
+    def __init__(self, corpusName='synthetic', nDocs=100, sentsPerDoc=50, wordsPerSent=10,
+                 nLanguages=1, vocabularySize=20000, ambiguity=0.3, maxAnalyses=3,
+                 unanalyzed=0.05, parallel=False, gzipped=False, seed=42):
+        self.corpusName = corpusName
+        self.nDocs = nDocs
+        self.sentsPerDoc = sentsPerDoc      # sentences per document in each language
+        self.wordsPerSent = wordsPerSent    # average number of words in a sentence
+        self.languages = ['lang' + str(i) for i in range(nLanguages)]
+        self.vocabularySize = vocabularySize    # number of lexemes in each language
+        self.ambiguity = ambiguity          # share of word forms with more than one analysis
+        self.maxAnalyses = maxAnalyses      # maximum number of analyses of an ambiguous word form
+        self.unanalyzed = unanalyzed        # share of word forms without analyses
+        self.parallel = parallel and nLanguages > 1
+        self.gzipped = gzipped
+        self.seed = seed
+        self.rand = random.Random(seed)
+        self.vocabularies = [self.generate_vocabulary() for lang in self.languages]
+        # Cumulative Zipfian weights of the word forms, most frequent first
+        self.cumWeights = [list(accumulate(1 / (i + 1) for i in range(len(vocabulary))))
+                           for vocabulary in self.vocabularies]
+
+    def random_stem(self):
+        return ''.join(self.rand.choice(self.SYLLABLES) for i in range(self.rand.randint(1, 3)))
+
+    def inflections(self, pos):
+        """
+        Return a list of (suffix, grammatical tags) for a part of speech.
+        """
+        if pos in ('N', 'PRO'):
+            return [(c[:2] + ('' if n == 'sg' else 'ti'), {'gr.case': c, 'gr.number': n})
+                    for c in self.CASES for n in self.NUMBERS]
+        if pos == 'A':
+            return [('', {}), ('ez', {'gr.degree': 'comp'})]
+        if pos == 'V':
+            return [(t[0] + p, {'gr.tense': t, 'gr.person': p})
+                    for t in self.TENSES for p in self.PERSONS]
+        return [('', {})]
+
+    def generate_vocabulary(self):
+        """
+        Generate the word forms of one language, each with its list
+        of analyses, in a random order (the order determines their
+        frequencies).
+        """
+        lexemes = []
+        for i in range(self.vocabularySize):
+            pos = self.rand.choice(self.POS)
+            lemma = self.random_stem()
+            if pos == 'V':
+                lemma += 'ny'
+            lexemes.append({'lex': lemma, 'gr.pos': pos, 'trans': 'tr_' + lemma})
+        wordforms = {}
+        for lexeme in lexemes:
+            for suffix, tags in self.inflections(lexeme['gr.pos']):
+                ana = dict(lexeme)
+                ana.update(tags)
+                wf = lexeme['lex'] + suffix
+                if wf not in wordforms:
+                    wordforms[wf] = []
+                wordforms[wf].append(ana)
+        vocabulary = []
+        wfs = list(wordforms)
+        self.rand.shuffle(wfs)
+        for wf in wfs:
+            analyses = wordforms[wf]
+            r = self.rand.random()
+            if r < self.unanalyzed:
+                analyses = []
+            elif r < self.unanalyzed + self.ambiguity:
+                # Add analyses of random lexemes, as if the
+                # analyzer could not choose between them
+                while len(analyses) < self.maxAnalyses and self.rand.random() < 0.7:
+                    ana = dict(self.rand.choice(lexemes))
+                    analyses.append(ana)
+                analyses = analyses[:self.maxAnalyses]
+            else:
+                analyses = analyses[:1]
+            vocabulary.append((wf, analyses))
+        return vocabulary
+
+    def generate_sentence(self, langID, paraID=None):
+        words = []
+        text = ''
+        nWords = max(1, int(self.rand.gauss(self.wordsPerSent, self.wordsPerSent / 3)))
+        for wf, analyses in self.rand.choices(self.vocabularies[langID],
+                                              cum_weights=self.cumWeights[langID], k=nWords):
+            if len(words) == 0:
+                wf = wf.capitalize()
+            else:
+                text += ' '
+            word = {'wf': wf, 'wtype': 'word', 'off_start': len(text), 'off_end': len(text) + len(wf),
+                    'next_word': len(words) + 1, 'sentence_index': len(words),
+                    'sentence_index_neg': nWords - len(words)}
+            if len(analyses) > 0:
+                word['ana'] = [dict(ana) for ana in analyses]
+            words.append(word)
+            text += wf
+        words.append({'wf': '.', 'wtype': 'punct', 'off_start': len(text), 'off_end': len(text) + 1})
+        text += '.'
+        sentence = {'text': text, 'words': words, 'lang': langID,
+                    'meta': {'speaker': 'S' + str(self.rand.randint(1, 5))}}
+        if paraID is not None:
+            sentence['para_alignment'] = [{'off_start': 0, 'off_end': len(text), 'para_id': paraID}]
+        return sentence
+
+    def generate_doc(self, dID):
+        sentences = []
+        for langID in range(len(self.languages)):
+            for iSent in range(self.sentsPerDoc):
+                sentences.append(self.generate_sentence(langID, paraID=iSent if self.parallel else None))
+            sentences[-1]['last'] = True
+        meta = {
+            'filename': 'doc' + str(dID),
+            'title': 'Document ' + str(dID),
+            'author': 'Author ' + str(dID % 50),
+            'genre': self.rand.choice(['fiction', 'press', 'speech']),
+            'year': str(1950 + dID % 70),
+            'fulltext_id': 'doc' + str(dID)
+        }
+        return {'meta': meta, 'sentences': sentences}
+
+    def settings(self):
+        """
+        Return the corpus.json for the corpus.
+        """
+        return {
+            'corpus_name': self.corpusName,
+            'input_format': 'json-gzip' if self.gzipped else 'json',
+            'languages': self.languages,
+            'lang_props': {lang: {'dictionary_categories': ['pos']} for lang in self.languages},
+            'interface_languages': ['en'],
+            'viewable_meta': ['filename', 'title', 'author', 'genre', 'year'],
+            'sentence_meta': ['speaker'],
+            'search_meta': {'stat_options': ['genre', 'author', 'year', 'speaker']},
+            'doc_to_sentence_meta': ['genre', 'year'],
+            'word_fields': ['trans'],
+            'word_table_fields': ['trans'],
+            'lemma_table_fields': ['trans'],
+            'ambiguous_analyses': True,
+            'generate_dictionary': True,
+            'fulltext_view_enabled': True,
+            'use_nonpersistent_fulltext_id': False
+        }
+
+    def categories(self):
+        """
+        Return the categories.json for the corpus.
+        """
+        tags = {pos: 'pos' for pos in self.POS}
+        tags.update({c: 'case' for c in self.CASES})
+        tags.update({n: 'number' for n in self.NUMBERS})
+        tags.update({t: 'tense' for t in self.TENSES})
+        tags.update({p: 'person' for p in self.PERSONS})
+        tags['comp'] = 'degree'
+        return {lang: tags for lang in self.languages}
+
+    def write(self, dirName):
+        """
+        Write the documents to <dirName>/corpus/<corpus name> and the
+        settings to <dirName>/conf. Return the number of tokens.
+        """
+        confDir = os.path.join(dirName, 'conf')
+        corpusDir = os.path.join(dirName, 'corpus', self.corpusName)
+        os.makedirs(confDir, exist_ok=True)
+        os.makedirs(corpusDir, exist_ok=True)
+        with open(os.path.join(confDir, 'corpus.json'), 'w', encoding='utf-8') as fOut:
+            json.dump(self.settings(), fOut, ensure_ascii=False, indent=2)
+        with open(os.path.join(confDir, 'categories.json'), 'w', encoding='utf-8') as fOut:
+            json.dump(self.categories(), fOut, ensure_ascii=False, indent=2)
+        nTokens = 0
+        for dID in range(self.nDocs):
+            doc = self.generate_doc(dID)
+            nTokens += sum(len(s['words']) - 1 for s in doc['sentences'])
+            # Several subdirectories, like in real corpora
+            subdir = os.path.join(corpusDir, 'part' + str(dID % 10))
+            os.makedirs(subdir, exist_ok=True)
+            fname = os.path.join(subdir, 'doc' + str(dID) + '.json')
+            if self.gzipped:
+                with gzip.open(fname + '.gz', 'wt', encoding='utf-8') as fOut:
+                    json.dump(doc, fOut, ensure_ascii=False)
+            else:
+                with open(fname, 'w', encoding='utf-8') as fOut:
+                    json.dump(doc, fOut, ensure_ascii=False)
+        return nTokens
+
+
+def add_corpus_arguments(parser):
+    """
+    Add the parameters of the synthetic corpus to a command line parser.
+    """
+    parser.add_argument('--docs', type=int, default=100, help='number of documents')
+    parser.add_argument('--sentences', type=int, default=50,
+                        help='number of sentences per document in each language')
+    parser.add_argument('--words', type=int, default=10, help='average number of words in a sentence')
+    parser.add_argument('--languages', type=int, default=1, help='number of languages')
+    parser.add_argument('--vocabulary', type=int, default=20000, help='number of lexemes in each language')
+    parser.add_argument('--ambiguity', type=float, default=0.3,
+                        help='share of word forms with several analyses')
+    parser.add_argument('--analyses', type=int, default=3,
+                        help='maximum number of analyses of an ambiguous word form')
+    parser.add_argument('--parallel', action='store_true',
+                        help='align the sentences in different languages with each other')
+    parser.add_argument('--gzip', action='store_true', help='write gzipped JSON files')
+    parser.add_argument('--seed', type=int, default=42, help='random seed')
+
+
+def corpus_from_arguments(args, corpusName='synthetic'):
+    return SyntheticCorpus(corpusName=corpusName, nDocs=args.docs, sentsPerDoc=args.sentences,
+                           wordsPerSent=args.words, nLanguages=args.languages,
+                           vocabularySize=args.vocabulary, ambiguity=args.ambiguity,
+                           maxAnalyses=args.analyses, parallel=args.parallel,
+                           gzipped=args.gzip, seed=args.seed)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a synthetic corpus for benchmarking.')
+    parser.add_argument('dir', help='directory where the conf and corpus folders are created')
+    parser.add_argument('--name', default='synthetic', help='corpus name')
+    add_corpus_arguments(parser)
+    args = parser.parse_args()
+    corpus = corpus_from_arguments(args, corpusName=args.name)
+    nTokens = corpus.write(args.dir)
+    print('Corpus written to', args.dir + ':', args.docs, 'documents,', nTokens, 'tokens.')
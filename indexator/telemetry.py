@@ -0,0 +1,244 @@
+import os
+import sys
+import json
+import time
+from contextlib import contextmanager
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+
+class Telemetry:
+    """
+    Collects performance figures for the stages of indexation (scanning
+    the corpus directory, indexing sentences, sorting, indexing words etc.)
+    and writes them to a JSON report, so that different runs can be
+    compared. For each stage, it records wall and CPU time (of this
+    process and of the child processes that have finished during the
+    stage), resident memory, throughput for the counts provided by the
+    caller (documents, tokens etc.), the number of temporary tables that
+    were moved to disk and the latencies of bulk requests.
+    Stages can be nested. On Linux, the peak resident memory is measured
+    for each stage separately; elsewhere, the peak of the whole process
+    so far is reported.
+    """
+    def __init__(self):
+        self.tStart = time.time()
+        self.cpuStart = time.process_time()
+        self.loader = None      # BulkLoader whose request latencies are reported
+        self.stages = []        # finished stages in the order they finished
+        self.openStages = []    # stack of stages that have not finished yet
+        self.events = []        # notable events, such as tables moved to disk
+        self.counters = {}      # name -> number accumulated over the whole run
+        self.perStagePeak = self.reset_peak_rss()
+
+    @staticmethod
+    def read_proc_status(field):
+        """
+        Return a memory figure from /proc/self/status in bytes,
+        or None if it is not available.
+        """
+        try:
+            with open('/proc/self/status', 'r', encoding='utf-8') as fIn:
+                for line in fIn:
+                    if line.startswith(field + ':'):
+                        return int(line.split()[1]) * 1024
+        except (OSError, ValueError, IndexError):
+            pass
+        return None
+
+    @staticmethod
+    def reset_peak_rss():
+        """
+        Reset the peak resident memory of the process (Linux only).
+        Return True if it worked.
+        """
+        try:
+            with open('/proc/self/clear_refs', 'w') as fOut:
+                fOut.write('5')
+            return True
+        except OSError:
+            return False
+
+    def peak_rss(self):
+        """
+        Return the peak resident memory of the process in bytes: since
+        the last reset, if possible, or since the process started.
+        """
+        if self.perStagePeak:
+            peak = self.read_proc_status('VmHWM')
+            if peak is not None:
+                return peak
+        if resource is None:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == 'darwin':
+            return peak
+        return peak * 1024
+
+    @staticmethod
+    def children_usage():
+        """
+        Return the CPU time of the finished child processes and
+        the peak resident memory of the largest of them in bytes.
+        """
+        if resource is None:
+            return 0, None
+        usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+        peak = usage.ru_maxrss
+        if sys.platform != 'darwin':
+            # Kilobytes everywhere except macOS
+            peak *= 1024
+        return usage.ru_utime + usage.ru_stime, peak
+
+    def latencies(self):
+        if self.loader is None or not hasattr(self.loader, 'latencies'):
+            return []
+        return self.loader.latencies
+
+    @staticmethod
+    def percentiles(values):
+        """
+        Return the distribution of bulk request latencies in milliseconds.
+        """
+        if len(values) <= 0:
+            return None
+        values = sorted(values)
+        result = {'requests': len(values)}
+        for p in (50, 90, 99):
+            result['p' + str(p)] = round(values[min(len(values) - 1, len(values) * p // 100)] * 1000, 1)
+        result['max'] = round(values[-1] * 1000, 1)
+        return result
+
+    @staticmethod
+    def mb(nBytes):
+        if nBytes is None:
+            return None
+        return round(nBytes / 1048576, 1)
+
+    def update_open_peaks(self, peak):
+        for stage in self.openStages:
+            if peak is not None and peak > stage['peak']:
+                stage['peak'] = peak
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Measure a stage of indexation. Yields a dictionary where the caller
+        can put counts (e.g. {'docs': 100, 'tokens': 20000}); the number
+        of items per second is calculated for each of them.
+        """
+        if self.perStagePeak:
+            # The peak of the outer stages must not be lost when it is reset
+            self.update_open_peaks(self.peak_rss())
+            self.reset_peak_rss()
+        childrenCpu, childrenPeak = self.children_usage()
+        stage = {
+            'name': name,
+            'counts': {},
+            'start': time.time(),
+            'cpu': time.process_time(),
+            'children_cpu': childrenCpu,
+            'rss': self.read_proc_status('VmRSS'),
+            'peak': 0,
+            'n_events': len(self.events),
+            'n_latencies': len(self.latencies())
+        }
+        self.openStages.append(stage)
+        try:
+            yield stage['counts']
+        finally:
+            self.openStages.pop()
+            self.finish_stage(stage)
+
+    def finish_stage(self, stage):
+        wallTime = time.time() - stage['start']
+        childrenCpu, childrenPeak = self.children_usage()
+        peak = self.peak_rss()
+        if peak is not None:
+            peak = max(peak, stage['peak'])
+            self.update_open_peaks(peak)
+        result = {
+            'stage': stage['name'],
+            'start': round(stage['start'] - self.tStart, 3),
+            'wall_seconds': round(wallTime, 3),
+            'cpu_seconds': round(time.process_time() - stage['cpu'], 3),
+            'children_cpu_seconds': round(childrenCpu - stage['children_cpu'], 3),
+            'rss_start_mb': self.mb(stage['rss']),
+            'rss_end_mb': self.mb(self.read_proc_status('VmRSS')),
+            'peak_rss_mb': self.mb(peak),
+            'children_peak_rss_mb': self.mb(childrenPeak),
+            'tables_moved_to_disk': sum(1 for e in self.events[stage['n_events']:]
+                                        if e['event'] == 'table_moved_to_disk')
+        }
+        for k, v in stage['counts'].items():
+            result[k] = v
+            if type(v) in (int, float):
+                result[k + '_per_second'] = round(v / max(wallTime, 1e-6), 1)
+        latencies = self.percentiles(self.latencies()[stage['n_latencies']:])
+        if latencies is not None:
+            result['bulk_latency_ms'] = latencies
+        self.stages.append(result)
+
+    def add_stages(self, stages, events):
+        """
+        Add the stages and events recorded in another process.
+        """
+        self.stages += stages
+        self.events += events
+
+    def event(self, event, **details):
+        """
+        Record an event that may explain a slowdown, e.g. a temporary
+        table that was moved to disk.
+        """
+        curEvent = {
+            'event': event,
+            'time': round(time.time() - self.tStart, 3),
+            'stage': self.openStages[-1]['name'] if len(self.openStages) > 0 else None
+        }
+        curEvent.update(details)
+        self.events.append(curEvent)
+
+    def add(self, counter, value=1):
+        if counter not in self.counters:
+            self.counters[counter] = 0
+        self.counters[counter] += value
+
+    def report(self, info=None):
+        """
+        Return the report as a dictionary. info contains general
+        information about the run, such as the corpus name.
+        """
+        childrenCpu, childrenPeak = self.children_usage()
+        if self.perStagePeak:
+            self.update_open_peaks(self.peak_rss())
+        peaks = [s['peak_rss_mb'] for s in self.stages if s['peak_rss_mb'] is not None]
+        report = {
+            'info': info or {},
+            'total': {
+                'wall_seconds': round(time.time() - self.tStart, 3),
+                'cpu_seconds': round(time.process_time() - self.cpuStart, 3),
+                'children_cpu_seconds': round(childrenCpu, 3),
+                'peak_rss_mb': max(peaks + [self.mb(self.peak_rss()) or 0]),
+                'children_peak_rss_mb': self.mb(childrenPeak),
+                'bulk_latency_ms': self.percentiles(self.latencies())
+            },
+            'counters': self.counters,
+            'stages': self.stages,
+            'events': self.events
+        }
+        return report
+
+    def write_report(self, fname, info=None):
+        """
+        Write the report to a JSON file.
+        """
+        dirName = os.path.dirname(fname)
+        if len(dirName) > 0:
+            os.makedirs(dirName, exist_ok=True)
+        with open(fname, 'w', encoding='utf-8') as fOut:
+            json.dump(self.report(info), fOut, ensure_ascii=False, indent=1)
+        print('Telemetry report written to', fname)
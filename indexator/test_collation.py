@@ -0,0 +1,102 @@
+"""
+Tests of the alphabetical order of word forms and lemmata: sorting
+with the byte keys of Collation must give the same order as the
+sorting function that the indexator used before (make_sorting_function(),
+reproduced below), which compared lists of (position, letter) tuples.
+Usage (from the indexator directory):
+    python3 -m pytest test_collation.py
+"""
+import re
+import random
+import unittest
+from collation import Collation, sort_words_worker
+
+
+def make_sorting_function(lexOrder):
+    """
+    The sorting function of the earlier versions of the indexator.
+    """
+    if lexOrder is None:
+        return lambda x: x
+    rxChars = '(' + '|'.join(re.escape(c.lower())
+                             for c in sorted(lexOrder, key=lambda x: (-len(x), x))
+                             if len(c) > 1)
+    if len(rxChars) > 1:
+        rxChars += '|'
+    rxChars += '.)'
+    rxChars = re.compile(rxChars)
+    dictSort = {lexOrder[i]: (i, lexOrder[i]) for i in range(len(lexOrder))}
+    maxIndex = len(dictSort)
+
+    def charReplaceFunction(c):
+        if c in dictSort:
+            return dictSort[c]
+        return (maxIndex, c)
+
+    return lambda x: [charReplaceFunction(c) for c in rxChars.findall(x.lower())]
+
+
+class TestCollation(unittest.TestCase):
+    # Alphabets with digraphs and trigraphs, a digraph listed with
+    # a capital letter (which never matches a lowercased word), and
+    # no alphabet at all
+    LEX_ORDERS = [
+        ['a', 'b', 'c', 'ch', 'd', 'dz', 'dzh', 'e', 'h', 'z'],
+        ['z', 'e', 'd', 'c', 'b', 'a', 'sh'],
+        ['a', 'Ch', 'c', 'h', 'ä'],
+        None
+    ]
+    # Characters of the words: letters, their capital versions, and
+    # characters that are not in the alphabets (including ones outside
+    # the Basic Multilingual Plane)
+    CHARACTERS = 'abcdehszCHDZäöя-\'1 \U0001F600'
+
+    def random_words(self, rnd, n):
+        words = [''.join(rnd.choice(self.CHARACTERS) for _ in range(rnd.randint(0, 6)))
+                 for _ in range(n)]
+        return words + ['', 'c', 'ch', 'cha', 'chh', 'dz', 'dzh', 'd', 'dž', 'z', 'zz']
+
+    def test_same_order(self):
+        rnd = random.Random(5)
+        words = self.random_words(rnd, 3000)
+        for lexOrder in self.LEX_ORDERS:
+            with self.subTest(lexOrder=lexOrder):
+                expected = sorted(words, key=make_sorting_function(lexOrder))
+                collation = Collation(lexOrder)
+                self.assertEqual(collation.sort(words), expected)
+                self.assertEqual(collation.sort(words, cache=True), expected)
+                # Lemmata were sorted in lower case
+                self.assertEqual(sorted(words, key=collation.cached_key),
+                                 sorted(words, key=lambda x: make_sorting_function(lexOrder)(x.lower())))
+                wfsSorted, lemmataSorted, cache = sort_words_worker((lexOrder, words, words))
+                self.assertEqual(wfsSorted, expected)
+                self.assertEqual(lemmataSorted, expected)
+
+    def test_keys(self):
+        """
+        Keys are equal if and only if the old sorting function
+        returned equal values.
+        """
+        rnd = random.Random(6)
+        words = self.random_words(rnd, 500)
+        for lexOrder in self.LEX_ORDERS[:-1]:
+            with self.subTest(lexOrder=lexOrder):
+                oldKey = make_sorting_function(lexOrder)
+                collation = Collation(lexOrder)
+                for w1, w2 in zip(words, words[1:] + words[:1]):
+                    self.assertEqual(collation.key(w1) < collation.key(w2), oldKey(w1) < oldKey(w2))
+                    self.assertEqual(collation.key(w1) == collation.key(w2), oldKey(w1) == oldKey(w2))
+
+    def test_repeated_letters(self):
+        """
+        Characters that are not in the alphabet go after all letters even
+        if some letter is listed twice. The old sorting function put them
+        among the last letters in this case.
+        """
+        collation = Collation(['z', 'e', 'd', 'c', 'b', 'e', 'a', 'sh'])
+        self.assertEqual(collation.sort(['-', 'x', 'sh', 's', 'a', 'e', 'z']),
+                         ['z', 'e', 'a', 'sh', '-', 's', 'x'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+"""
+Tests of the readers of the corpus files: whatever way a document is
+read in (parsed as a whole, kept in memory by open_doc(), read
+iteratively with stream_json, or read from the binary format), the
+reader should return the same metadata and sentences.
+Usage (from the indexator directory):
+    python3 -m pytest test_doc_readers.py
+"""
+import os
+import json
+import shutil
+import tempfile
+import unittest
+from synthetic_corpus import SyntheticCorpus
+from json_doc_reader import JSONDocReader
+from msgpack_doc_reader import MsgpackDocReader, write_msgpack_doc
+
+
+class TestDocReaders(unittest.TestCase):
+    def setUp(self):
+        self.workDir = tempfile.mkdtemp(prefix='tsakorpus_test_')
+
+    def tearDown(self):
+        shutil.rmtree(self.workDir, ignore_errors=True)
+
+    def write_corpus(self, gzipped=False):
+        """
+        Write a small synthetic parallel corpus and return the sorted
+        list of its files.
+        """
+        corpus = SyntheticCorpus(corpusName='test', nDocs=4, sentsPerDoc=5, wordsPerSent=6,
+                                 nLanguages=2, vocabularySize=300, parallel=True,
+                                 gzipped=gzipped, seed=3)
+        corpus.write(self.workDir)
+        corpusDir = os.path.join(self.workDir, 'corpus', 'test')
+        return sorted(os.path.join(root, fname)
+                      for root, dirs, files in os.walk(corpusDir)
+                      for fname in files)
+
+    @staticmethod
+    def read_doc(reader, fname, openDoc=False):
+        """
+        Return the metadata and the list of (sentence, whether it is the
+        last one) of a document, read with a new reader.
+        """
+        if openDoc:
+            reader.open_doc(fname)
+        sentences = [(s, bLast) for s, bLast in reader.get_sentences(fname)]
+        meta = reader.get_metadata(fname)
+        reader.close_doc()
+        return meta, sentences
+
+    def test_json_readers(self):
+        """
+        Plain JSON, gzipped JSON and binary files give the same
+        documents with all ways of reading them.
+        """
+        for gzipped in (False, True):
+            fmt = 'json-gzip' if gzipped else 'json'
+            shutil.rmtree(os.path.join(self.workDir, 'corpus'), ignore_errors=True)
+            for fname in self.write_corpus(gzipped=gzipped):
+                with self.subTest(format=fmt, fname=os.path.basename(fname)):
+                    meta, sentences = self.read_doc(JSONDocReader(fmt, {}), fname)
+                    self.assertEqual(len(sentences), 10)
+                    self.assertEqual(meta['year'], meta['year_from'])
+                    self.assertEqual([bLast for s, bLast in sentences], [False] * 9 + [True])
+                    self.assertEqual(self.read_doc(JSONDocReader(fmt, {}), fname, openDoc=True),
+                                     (meta, sentences))
+                    self.assertEqual(self.read_doc(JSONDocReader(fmt, {'stream_json': True}), fname),
+                                     (meta, sentences))
+                    if gzipped:
+                        continue
+                    fnameBinary = fname[:-len('.json')] + '.msgpack'
+                    with open(fname, 'r', encoding='utf-8') as fIn:
+                        write_msgpack_doc(fnameBinary, json.load(fIn))
+                    self.assertEqual(self.read_doc(MsgpackDocReader('msgpack', {}), fnameBinary),
+                                     (meta, sentences))
+                    self.assertEqual(self.read_doc(MsgpackDocReader('msgpack', {}), fnameBinary, openDoc=True),
+                                     (meta, sentences))
+
+    def test_para_alignment(self):
+        """
+        All readers return the same languages and para_ids of the
+        sentences as can be found in the sentences themselves.
+        """
+        for fname in self.write_corpus():
+            with open(fname, 'r', encoding='utf-8') as fIn:
+                doc = json.load(fIn)
+            expected = [(s.get('lang', 0), [pa['para_id'] for pa in s.get('para_alignment', [])])
+                        for s in doc['sentences']]
+            self.assertTrue(any(len(paraIDs) > 0 for langID, paraIDs in expected))
+            self.assertEqual(set(langID for langID, paraIDs in expected), {0, 1})
+            fnameBinary = fname[:-len('.json')] + '.msgpack'
+            write_msgpack_doc(fnameBinary, doc)
+            for reader, readerFname, openDoc in ((JSONDocReader('json', {}), fname, False),
+                                                 (JSONDocReader('json', {}), fname, True),
+                                                 (JSONDocReader('json', {'stream_json': True}), fname, True),
+                                                 (MsgpackDocReader('msgpack', {}), fnameBinary, False)):
+                with self.subTest(reader=type(reader).__name__, streaming=reader.streaming, openDoc=openDoc):
+                    if openDoc:
+                        reader.open_doc(readerFname)
+                    self.assertEqual(list(reader.get_para_alignment(readerFname)), expected)
+                    reader.close_doc()
+
+    def test_msgpack_sentence_access(self):
+        """
+        A sentence of a binary file read by its number is the same
+        as when the sentences are read one after another.
+        """
+        fname = self.write_corpus()[0]
+        fnameBinary = fname[:-len('.json')] + '.msgpack'
+        with open(fname, 'r', encoding='utf-8') as fIn:
+            write_msgpack_doc(fnameBinary, json.load(fIn))
+        reader = MsgpackDocReader('msgpack', {})
+        sentences = [s for s, bLast in reader.get_sentences(fnameBinary)]
+        for iSent in (0, 4, 9):
+            self.assertEqual(reader.get_sentence(fnameBinary, iSent), sentences[iSent])
+        self.assertEqual([s for s, bLast in reader.get_sentences(fnameBinary, iStart=4, iEnd=7)],
+                         sentences[4:7])
+        reader.close_doc()
+
+
+if __name__ == '__main__':
+    unittest.main()
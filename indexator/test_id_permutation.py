@@ -0,0 +1,63 @@
+"""
+Tests of the permutation used for randomizing sentence IDs.
+Usage (from the indexator directory):
+    python3 -m pytest test_id_permutation.py
+"""
+import unittest
+from id_permutation import IDPermutation
+
+
+class SmallIDPermutation(IDPermutation):
+    """
+    The same permutation with blocks of 2^12 instead of 2^31, small
+    enough to check entire blocks.
+    """
+    BLOCK_BITS = 12
+    BLOCK_MASK = (1 << BLOCK_BITS) - 1
+
+
+class TestIDPermutation(unittest.TestCase):
+    def test_bijection(self):
+        """
+        Each block is mapped onto itself one-to-one.
+        """
+        for seed in (0, 1, 12345):
+            with self.subTest(seed=seed):
+                p = SmallIDPermutation(seed)
+                blockSize = 1 << p.BLOCK_BITS
+                for iBlock in range(3):
+                    ids = range(iBlock * blockSize, (iBlock + 1) * blockSize)
+                    self.assertEqual(sorted(p.permute(i) for i in ids), list(ids))
+
+    def test_no_collisions(self):
+        """
+        IDs of a large corpus stay distinct and in the first block.
+        """
+        p = IDPermutation(12345)
+        permuted = [p.permute(i) for i in range(200000)]
+        self.assertEqual(len(set(permuted)), len(permuted))
+        self.assertTrue(all(0 <= i <= p.BLOCK_MASK for i in permuted))
+        self.assertNotEqual(permuted[1:100], list(range(1, 100)))
+
+    def test_fixed_points(self):
+        """
+        0 and the first ID of every block do not change.
+        """
+        for p in (IDPermutation(7), SmallIDPermutation(7)):
+            self.assertEqual(p.permute(0), 0)
+            for iBlock in range(1, 4):
+                self.assertEqual(p.permute(iBlock << p.BLOCK_BITS), iBlock << p.BLOCK_BITS)
+
+    def test_seed(self):
+        """
+        The same seed always gives the same permutation, and different
+        seeds give different ones.
+        """
+        ids = list(range(1, 1000)) + [(1 << 31) + 5, (3 << 31) + 17]
+        p1, p2, p3 = IDPermutation(42), IDPermutation(42), IDPermutation(43)
+        self.assertEqual([p1.permute(i) for i in ids], [p2.permute(i) for i in ids])
+        self.assertNotEqual([p1.permute(i) for i in ids], [p3.permute(i) for i in ids])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,362 @@
+"""
+Tests of the indexator on a small synthetic parallel corpus (see
+synthetic_corpus.py). The corpus is indexed into a MemorySink, and the
+documents it ends up with are compared between different ways of
+indexing the same corpus, which should all give the same result.
+As with benchmark_indexing.py, the corpus, its settings and all
+files produced by the indexator are kept in a temporary working
+directory. Usage (from the indexator directory):
+    python3 -m pytest test_indexator.py
+"""
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import unittest
+from synthetic_corpus import add_corpus_arguments
+from benchmark_indexing import prepare_work_dir, CORPUS_NAME
+from bulk_sinks import MemorySink
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+CORPUS_ARGUMENTS = ['--docs', '6', '--sentences', '4', '--words', '5', '--languages', '2',
+                    '--parallel', '--vocabulary', '300', '--seed', '7']
+ID_SEED = 12345     # seed of the sentence ID permutation, the same in all runs
+# Fields that contain document, sentence, word or lemma IDs
+ID_FIELDS = {'id', 'w_id', 'l_id', 'd_id', 'doc_id', 'dids', 'prev_id', 'next_id',
+             'para_id', 'para_ids', 'sent_ids'}
+
+workDir = None
+srcDir = None       # the directory of this file, to return to after the tests
+indexator = None    # the indexator module, imported in the working directory
+IDPermutation = None
+
+
+def setUpModule():
+    global workDir, srcDir, indexator, IDPermutation
+    parser = argparse.ArgumentParser()
+    add_corpus_arguments(parser)
+    args = parser.parse_args(CORPUS_ARGUMENTS)
+    workDir = tempfile.mkdtemp(prefix='tsakorpus_test_')
+    prepare_work_dir(workDir, args)
+    shutil.copytree(os.path.join(workDir, 'conf'), os.path.join(workDir, 'conf_orig'))
+    shutil.copytree(os.path.join(workDir, 'corpus'), os.path.join(workDir, 'corpus_orig'))
+    os.makedirs(os.path.join(workDir, 'indexator'))
+    srcDir = os.getcwd()
+    # The indexator and the HTML generator use paths relative
+    # to the indexator directory, so they are imported there
+    os.chdir(os.path.join(workDir, 'indexator'))
+    sys.path.insert(0, SRC_DIR)
+    import indexator as indexatorModule
+    from id_permutation import IDPermutation as IDPermutationClass
+    indexator = indexatorModule
+    IDPermutation = IDPermutationClass
+
+
+def tearDownModule():
+    os.chdir(srcDir)
+    shutil.rmtree(workDir, ignore_errors=True)
+
+
+class InterruptedSink(MemorySink):
+    """
+    A MemorySink that fails, as if the indexator were stopped, when
+    it receives the metadata of a document after that of maxDocs
+    documents.
+    """
+    def __init__(self, maxDocs):
+        super().__init__()
+        self.maxDocs = maxDocs
+        self.nDocs = 0
+
+    def count_docs(self, actions):
+        for action in actions:
+            if self.maxDocs is not None and action['_index'].endswith('.docs'):
+                if self.nDocs >= self.maxDocs:
+                    raise InterruptedError('Indexation stopped after ' + str(self.nDocs) + ' documents.')
+                self.nDocs += 1
+            yield action
+
+    def load(self, actions, verbose=True):
+        return super().load(self.count_docs(actions), verbose=verbose)
+
+
+class IndexatorTestCase(unittest.TestCase):
+    """
+    Restores the original corpus and settings before each test and
+    removes everything the indexator wrote during the previous one.
+    """
+    def setUp(self):
+        os.chdir(os.path.join(workDir, 'indexator'))
+        for dirName in ('conf', 'corpus', 'index_state', 'export', os.path.join('search', 'corpus_html'),
+                        os.path.join('search', 'web_app', 'templates', 'dictionaries')):
+            shutil.rmtree(os.path.join(workDir, dirName), ignore_errors=True)
+        shutil.copytree(os.path.join(workDir, 'conf_orig'), os.path.join(workDir, 'conf'))
+        shutil.copytree(os.path.join(workDir, 'corpus_orig'), os.path.join(workDir, 'corpus'))
+        for fname in os.listdir('.'):
+            os.remove(fname)
+
+    @staticmethod
+    def change_settings(**kwargs):
+        """
+        Change some values in corpus.json.
+        """
+        fname = os.path.join(workDir, 'conf', 'corpus.json')
+        with open(fname, 'r', encoding='utf-8') as fIn:
+            settings = json.load(fIn)
+        settings.update(kwargs)
+        with open(fname, 'w', encoding='utf-8') as fOut:
+            json.dump(settings, fOut, ensure_ascii=False, indent=2)
+
+    @staticmethod
+    def corpus_file(docNum):
+        """
+        Return the path of a file of the synthetic corpus.
+        """
+        return os.path.join(workDir, 'corpus', CORPUS_NAME, 'part' + str(docNum % 10),
+                            'doc' + str(docNum) + '.json')
+
+    @staticmethod
+    def new_indexator(sink=None, **kwargs):
+        """
+        Create an indexator that sends its data to a MemorySink (a new one
+        or the one given) and randomizes sentence IDs with a fixed seed,
+        so that the results of different runs can be compared.
+        """
+        x = indexator.Indexator(overwrite=True, sink='memory',
+                                checkpointMinutes=kwargs.pop('checkpointMinutes', 0), **kwargs)
+        x.idPermutation = IDPermutation(ID_SEED)
+        if sink is not None:
+            x.loader = sink
+            x.telemetry.loader = sink
+        return x
+
+    def index_corpus(self, sink=None, **kwargs):
+        """
+        Index the entire corpus and return the sink.
+        """
+        x = self.new_indexator(sink=sink, **kwargs)
+        x.load_corpus()
+        return x.loader
+
+    @staticmethod
+    def documents(sink):
+        """
+        Return the documents in the indices of the corpus, as they
+        are available to the search engine through the aliases.
+        """
+        return {index: sink.documents(CORPUS_NAME + '.' + index)
+                for index in ('sentences', 'words', 'docs')}
+
+    @classmethod
+    def strip_ids(cls, value):
+        """
+        Remove the fields with IDs from a document, at any depth.
+        """
+        if type(value) is dict:
+            return {k: cls.strip_ids(v) for k, v in value.items() if k not in ID_FIELDS}
+        if type(value) is list:
+            return [cls.strip_ids(v) for v in value]
+        return value
+
+    @classmethod
+    def content(cls, docs):
+        """
+        Return what is stored in the indices regardless of the IDs that
+        the documents, sentences, words and lemmata got: the documents by
+        file name, and sorted lists of JSON representations of sentences
+        (with the file names), words and lemmata, and of frequencies of
+        words and lemmata in the documents. Only the relative order of the
+        positions in the sorted lists of word forms and lemmata (wf_order,
+        l_order) is kept, since word forms and lemmata that are no longer
+        in the corpus may leave gaps there.
+        """
+        fileNames = {docID: doc['filename'] for docID, doc in docs['docs'].items()}
+        docs = dict(docs)
+        docs['words'] = {docID: dict(w) for docID, w in docs['words'].items()}
+        for k in ('wf_order', 'l_order'):
+            ranks = {v: i for i, v in enumerate(sorted(set(w[k] for w in docs['words'].values() if k in w)))}
+            for w in docs['words'].values():
+                if k in w:
+                    w[k] = ranks[w[k]]
+        result = {
+            'docs': {doc['filename']: cls.strip_ids(doc) for doc in docs['docs'].values()},
+            'sentences': sorted(json.dumps([fileNames[s['doc_id']], cls.strip_ids(s)], sort_keys=True)
+                                for s in docs['sentences'].values())
+        }
+        words = {docID: json.dumps(cls.strip_ids(w), sort_keys=True)
+                 for docID, w in docs['words'].items() if w['wtype'] != 'word_freq'}
+        result['words'] = sorted(words.values())
+        result['word_freqs'] = sorted((words[w['freq_join']['parent']], fileNames[w['d_id']], w['freq'])
+                                      for w in docs['words'].values() if w['wtype'] == 'word_freq')
+        return result
+
+    def assert_same_documents(self, docs1, docs2):
+        for index in docs1:
+            self.assertEqual(set(docs1[index]), set(docs2[index]), index + ': different IDs')
+            for docID in docs1[index]:
+                self.assertEqual(docs1[index][docID], docs2[index][docID], index + ', ' + str(docID))
+
+
+class TestWordSignatures(unittest.TestCase):
+    def test_freeze_value(self):
+        """
+        Values that json.dumps() serializes differently are frozen
+        to different hashable values.
+        """
+        values = [{'a': 1}, [['a', 1]], ['a', 1], True, 1, 1.0, '1', None,
+                  [1], [True], {'a': True}, {'a': [1]}, {'a': {'b': 1}}]
+        frozen = set(indexator.Indexator.freeze_value(v) for v in values)
+        self.assertEqual(len(frozen), len(values))
+        self.assertEqual(indexator.Indexator.freeze_value({'a': 1, 'b': [2]}),
+                         indexator.Indexator.freeze_value({'b': [2], 'a': 1}))
+
+
+class TestFulltext(IndexatorTestCase):
+    def test_fulltext_does_not_change_index(self):
+        """
+        Generating the full-text HTML in the main process, from the
+        sentences the reader keeps for the indexator, does not change
+        what is indexed.
+        """
+        self.change_settings(fulltext_view_enabled=False)
+        docsWithout = self.documents(self.index_corpus())
+        self.setUp()
+        docsWith = self.documents(self.index_corpus(fulltextWorkers=0))
+        fulltextDir = os.path.join(workDir, 'search', 'corpus_html', CORPUS_NAME)
+        self.assertEqual(len(os.listdir(fulltextDir)), 6)
+        self.assert_same_documents(docsWithout, docsWith)
+
+
+class TestParallelIndexing(IndexatorTestCase):
+    def test_workers(self):
+        """
+        Documents processed in worker processes give the same indices
+        as when they are processed in the main process.
+        """
+        docsSequential = self.documents(self.index_corpus())
+        self.assertEqual(len(docsSequential['docs']), 6)
+        self.assertEqual(len(docsSequential['sentences']), 6 * 4 * 2)
+        self.setUp()
+        docsParallel = self.documents(self.index_corpus(workers=2))
+        self.assert_same_documents(docsSequential, docsParallel)
+
+    def test_workers_read_documents(self):
+        """
+        Workers check which documents are excluded and generate their
+        HTML for full-text view, so that the main process does not read
+        the files, and the result is the same as without workers.
+        """
+        self.change_settings(exclude_by_meta=[{'title': 'Document 2'}])
+        docsSequential = self.documents(self.index_corpus(fulltextWorkers=0))
+        self.assertEqual(len(docsSequential['docs']), 5)
+        fulltextDir = os.path.join(workDir, 'search', 'corpus_html', CORPUS_NAME)
+        htmlSequential = {fname: os.path.getsize(os.path.join(fulltextDir, fname))
+                          for fname in os.listdir(fulltextDir)}
+        self.assertEqual(len(htmlSequential), 5)
+        self.setUp()
+        self.change_settings(exclude_by_meta=[{'title': 'Document 2'}])
+
+        def read_file(*args, **kwargs):
+            raise AssertionError('The file is read in the main process.')
+
+        x = self.new_indexator(workers=2, fulltextWorkers=0)
+        for method in ('open_doc', 'get_metadata', 'get_sentences'):
+            setattr(x.iterSent, method, read_file)
+        x.load_corpus()
+        self.assert_same_documents(docsSequential, self.documents(x.loader))
+        self.assertEqual({fname: os.path.getsize(os.path.join(fulltextDir, fname))
+                          for fname in os.listdir(fulltextDir)}, htmlSequential)
+
+
+class TestIncrementalIndexing(IndexatorTestCase):
+    def test_update(self):
+        """
+        After a file is added, a file is changed and a file is deleted,
+        an incremental update gives the same indices as indexing the
+        entire corpus again, except for the IDs.
+        """
+        shutil.move(self.corpus_file(5), os.path.join(workDir, 'doc5.json'))
+        sink = self.index_corpus(incremental=True)
+        shutil.move(os.path.join(workDir, 'doc5.json'), self.corpus_file(5))
+        os.remove(self.corpus_file(4))
+        with open(self.corpus_file(1), 'r', encoding='utf-8') as fIn:
+            doc = json.load(fIn)
+        with open(self.corpus_file(2), 'r', encoding='utf-8') as fIn:
+            doc['sentences'][0] = json.load(fIn)['sentences'][0]
+        doc['meta']['title'] = 'Changed document'
+        with open(self.corpus_file(1), 'w', encoding='utf-8') as fOut:
+            json.dump(doc, fOut, ensure_ascii=False)
+        docsIncremental = self.documents(self.index_corpus(sink=sink, incremental=True))
+        docsFull = self.documents(self.index_corpus())
+        self.assertEqual(len(docsFull['docs']), 5)
+        contentIncremental = self.content(docsIncremental)
+        contentFull = self.content(docsFull)
+        for k in contentFull:
+            self.assertEqual(contentIncremental[k], contentFull[k], k)
+
+    def test_no_changes(self):
+        """
+        If nothing has changed, an incremental update sends no words or
+        lemmata to the index and leaves the indices as they were.
+        """
+        sink = self.index_corpus(incremental=True)
+        docsBefore = self.documents(sink)
+        wordActions = []
+        load = sink.load
+
+        def load_counting(actions, verbose=True):
+            def count(actions):
+                for action in actions:
+                    if action['_index'].endswith('.words'):
+                        wordActions.append(action)
+                    yield action
+            return load(count(actions), verbose=verbose)
+
+        sink.load = load_counting
+        docsAfter = self.documents(self.index_corpus(sink=sink, incremental=True))
+        self.assertEqual(wordActions, [])
+        self.assert_same_documents(docsBefore, docsAfter)
+
+
+class TestExport(IndexatorTestCase):
+    def test_load_export(self):
+        """
+        Loading the bulk actions written with --export gives the same
+        indices as indexing the corpus directly.
+        """
+        docsDirect = self.documents(self.index_corpus())
+        self.setUp()
+        exportDir = os.path.join(workDir, 'export')
+        x = self.new_indexator(exportDir=exportDir)
+        x.export_corpus()
+        self.assertGreater(len(os.listdir(exportDir)), 1)
+        x = self.new_indexator()
+        x.load_export(exportDir)
+        self.assert_same_documents(docsDirect, self.documents(x.loader))
+
+
+class TestCheckpoints(IndexatorTestCase):
+    def test_resume(self):
+        """
+        An indexation that stops in the middle and is resumed from the
+        last checkpoint gives the same indices as an uninterrupted one.
+        """
+        docsFull = self.documents(self.index_corpus())
+        self.setUp()
+        # A checkpoint is made after each document
+        sink = InterruptedSink(maxDocs=3)
+        with self.assertRaises(InterruptedError):
+            self.index_corpus(sink=sink, checkpointMinutes=1e-9)
+        # The sentences of the fourth document have been sent, but not its metadata
+        self.assertEqual(len(self.documents(sink)['sentences']), 0)
+        self.assertEqual(len(sink.documents(CORPUS_NAME + '.v1.sentences')), 4 * 4 * 2)
+        sink.maxDocs = None
+        x = self.new_indexator(sink=sink, checkpointMinutes=1e-9, resume=True)
+        x.load_corpus()
+        self.assert_same_documents(docsFull, self.documents(sink))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+"""
+Tests of the postings lists kept on disk by PostingsStore: whatever
+runs are written and merged, the store returns the same postings as
+a dictionary in memory.
+Usage (from the indexator directory):
+    python3 -m pytest test_postings.py
+"""
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from postings import PostingsStore, PostingsReader
+
+
+class CountingPostingsStore(PostingsStore):
+    """
+    A PostingsStore that counts how many times its runs were merged.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.nMerges = 0
+
+    def merge_runs(self):
+        self.nMerges += 1
+        super().merge_runs()
+
+
+class TestPostingsStore(unittest.TestCase):
+    def setUp(self):
+        self.workDir = tempfile.mkdtemp(prefix='tsakorpus_test_')
+
+    def tearDown(self):
+        shutil.rmtree(self.workDir, ignore_errors=True)
+
+    def run_files(self):
+        return sorted(fname for fname in os.listdir(self.workDir) if fname.endswith('.postings'))
+
+    def test_runs(self):
+        """
+        Postings written to several runs, merged at MAX_RUNS, and
+        partly kept in memory are returned in the order of item IDs,
+        without the postings of removed documents.
+        """
+        rnd = random.Random(11)
+        store = CountingPostingsStore(maxCount=7, dbName=os.path.join(self.workDir, 'words'))
+        store.MAX_RUNS = 4
+        store.BLOCK_SIZE = 5
+        expected = {}
+        # Removed documents have postings in runs merged after their
+        # removal (3), in a run merged before it (57, 58), in the last
+        # run, which is not merged (58), and in memory (59)
+        removedDocs = {3, 57, 58, 59}
+        nAdded = 0
+        for docID in range(60):
+            for itemID in sorted(rnd.sample(range(40), rnd.randint(1, 6))):
+                freq = rnd.randint(1, 1000)
+                store.add(itemID, docID, freq)
+                nAdded += 1
+                if docID not in removedDocs:
+                    expected[(itemID, docID)] = freq
+            if docID in removedDocs:
+                store.remove_doc(docID)
+        self.assertGreater(store.nMerges, 1)
+        self.assertGreater(len(store.runs), 1)
+        self.assertGreater(len(store.itemIDs), 0)
+        self.assertEqual(len(store), nAdded)
+        self.assertEqual(self.run_files(), sorted(os.path.basename(run) for run in store.runs))
+        self.assertEqual(list(store.items()), sorted(expected.items()))
+
+        reader = PostingsReader(store)
+        for itemID in range(0, 45, 2):
+            self.assertEqual(reader.get(itemID),
+                             sorted((docID, freq) for (i, docID), freq in expected.items() if i == itemID))
+
+        store.clear()
+        self.assertEqual(self.run_files(), [])
+        self.assertEqual(list(store.items()), [])
+
+    def test_save(self):
+        """
+        A saved store can be loaded elsewhere, and saving it again only
+        links the runs written since then.
+        """
+        savedDir = os.path.join(self.workDir, 'saved')
+        store = PostingsStore(maxCount=5, dbName=os.path.join(self.workDir, 'words'))
+        for docID in range(12):
+            store.add(docID % 4, docID, docID + 1)
+        savedStore = store.save(savedDir)
+        savedRuns = {run: os.stat(os.path.join(savedDir, run)).st_ino for run in savedStore['runs']}
+        self.assertEqual(len(savedRuns), 3)
+        store.remove_doc(2)
+        for docID in range(12, 15):
+            store.add(docID % 4, docID, docID + 1)
+        savedStore = store.save(savedDir)
+        self.assertEqual(len(savedStore['runs']), 4)
+        for run, inode in savedRuns.items():
+            self.assertEqual(os.stat(os.path.join(savedDir, run)).st_ino, inode)
+        self.assertEqual(PostingsStore.saved_files([savedStore]), set(savedStore['runs']))
+
+        loadDir = os.path.join(self.workDir, 'loaded')
+        os.makedirs(loadDir)
+        storeLoaded = PostingsStore(maxCount=5, dbName=os.path.join(loadDir, 'words'))
+        storeLoaded.load(savedDir, savedStore)
+        self.assertEqual(len(storeLoaded), 15)
+        self.assertEqual(list(storeLoaded.items()), list(store.items()))
+        self.assertNotIn((2, 2), dict(storeLoaded.items()))
+        # The saved runs do not change when the loaded store is changed
+        storeLoaded.add(0, 15, 1)
+        storeLoaded.merge_runs()
+        store.clear()
+        storeLoaded = PostingsStore(maxCount=5, dbName=os.path.join(loadDir, 'words'))
+        storeLoaded.load(savedDir, savedStore)
+        self.assertEqual(len(list(storeLoaded.items())), 14)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -52,6 +52,7 @@ class CorpusSettings:
         # Indexation and search options
         self.debug = False
         self.sample_size = 1.0
+        self.stream_json = False
         self.partitions = 0
         self.all_language_search_enabled = True
         self.fulltext_search_enabled = True
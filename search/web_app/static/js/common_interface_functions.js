@@ -66,6 +66,42 @@ function show_dictionary(e) {
 				$('#dictionary_dialogue_body').html(result);
 				$('#dictionary_dialogue').modal('show');
 				assign_dictionary_events();
+				$('.dictionary_letter_link').first().click();
+			},
+			error: function(errorThrown) {
+			}
+		});
+}
+
+function show_dictionary_letter(e) {
+	// Show the first page of the lemmata starting with the letter
+	// and the links to the other pages, if any.
+	var letterLink = $(e.target);
+	$('.dictionary_letter_link').removeClass('dictionary_letter_selected');
+	letterLink.addClass('dictionary_letter_selected');
+	var nPages = parseInt(letterLink.attr('data-pages'));
+	var pages = '';
+	if (nPages > 1) {
+		for (var i = 0; i < nPages; i++) {
+			pages += '<span class="dictionary_page_link" data-page="' + i + '">' + (i + 1) + '</span> ';
+		}
+	}
+	$('#dictionary_pages').html(pages);
+	$('.dictionary_page_link').click(function(e) {
+		load_dictionary_page(letterLink.attr('data-lang'), letterLink.attr('data-letter'), $(e.target).attr('data-page'));
+	});
+	load_dictionary_page(letterLink.attr('data-lang'), letterLink.attr('data-letter'), 0);
+}
+
+function load_dictionary_page(lang, letter, page) {
+	$('.dictionary_page_link').removeClass('dictionary_letter_selected');
+	$('.dictionary_page_link[data-page="' + page + '"]').addClass('dictionary_letter_selected');
+	$.ajax({
+			url: "dictionary/" + lang + "/" + letter + "/" + page,
+			type: "GET",
+			success: function(result) {
+				$('#dictionary_letter_body').html(result);
+				assign_dictionary_events();
 			},
 			error: function(errorThrown) {
 			}
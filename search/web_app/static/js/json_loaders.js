@@ -595,6 +595,8 @@ function assign_dictionary_events() {
 	$(".lex_profile_l").click(show_lex_profile);
 	$(".paradigm_l").unbind("click");
 	$(".paradigm_l").click(show_paradigm);
+	$(".dictionary_letter_link").unbind("click");
+	$(".dictionary_letter_link").click(show_dictionary_letter);
 }
 
 function input_lemma(e) {
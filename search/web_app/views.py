@@ -1073,6 +1073,24 @@ def get_dictionary(lang):
         return ''
 
 
+@app.route('/docs/dictionary/<lang>/<int:letter>/<int:page>')
+@app.route('/dictionary/<lang>/<int:letter>/<int:page>')
+@gzipped
+def get_dictionary_page(lang, letter, page):
+    """
+    Return one page of the lemmata starting with one letter. The main
+    page of the dictionary only contains the list of letters.
+    """
+    if not settings.generate_dictionary:
+        return ''
+    dictFilename = 'dictionaries/dictionary_' + settings.corpus_name + '_' + lang \
+                   + '/' + str(letter) + '_' + str(page) + '.html'
+    try:
+        return render_template(dictFilename)
+    except:
+        return ''
+
+
 @app.route('/config')
 def setup_corpus():
     if not request.host.strip('/').endswith(('0.0.0.0:7342', '127.0.0.1:7342')):
@@ -1,5 +1,6 @@
 import os
 import re
+import sys
 import json
 import gzip
 import time
@@ -19,6 +20,7 @@ class Txt2JSON:
     rxStripExt = re.compile('\\.[^.]*$')
     rxGoodTag = re.compile('^\\w[\\w_-]*$')
     rxEmptyValueComa = re.compile('^[ \t.?()]*$')
+    rxJsonExt = re.compile('\\.json(\\.gz)?$')
 
     def __init__(self, settingsDir='conf_conversion'):
         """
@@ -299,8 +301,16 @@ class Txt2JSON:
     def write_output(self, fnameTarget, textJSON):
         """
         Write the JSON text to fnameTarget either as plain text
-        or as gzipped text, depending on the settings.
+        or as gzipped text, depending on the settings. If output_format
+        is msgpack, write it in the binary format instead, replacing
+        the extension with .msgpack.
         """
+        if 'output_format' in self.corpusSettings and self.corpusSettings['output_format'] == 'msgpack':
+            # The format is defined in the indexator, which reads it
+            sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'indexator'))
+            from msgpack_doc_reader import write_msgpack_doc
+            write_msgpack_doc(self.rxJsonExt.sub('.msgpack', fnameTarget), textJSON)
+            return
         if self.corpusSettings['gzip']:
             fTarget = gzip.open(fnameTarget, 'wt', encoding='utf-8')
         else: